@@ -0,0 +1,140 @@
+import numpy as np
+
+import machine
+
+# --- CONFIGURATION ---
+ARC_RESOLUTION = 0.01  # mm of arc length per segment
+ARC_TOLERANCE = 0.05  # mm of chord error, same default as parser.cpp
+MIN_RADIUS = 0.001  # Arcs smaller than this are skipped, like before
+
+
+def arc_geometry(x_start, y_start, x_end, y_end, i, j, clockwise):
+    """Returns centre, radius, start angle and signed sweep for one or many arcs."""
+    x_start = np.asarray(x_start, dtype=np.float64)
+    y_start = np.asarray(y_start, dtype=np.float64)
+    i = np.asarray(i, dtype=np.float64)
+    j = np.asarray(j, dtype=np.float64)
+    x_center = x_start + i
+    y_center = y_start + j
+    radius = np.sqrt(i**2 + j**2)
+
+    angle_start = np.arctan2(y_start - y_center, x_start - x_center)
+    angle_end = np.arctan2(y_end - y_center, x_end - x_center)
+
+    # Normalize Angles (G2 sweeps negative, G3 positive, never zero)
+    clockwise = np.asarray(clockwise, dtype=bool)
+    angle_end = np.where(
+        clockwise & (angle_end >= angle_start), angle_end - 2.0 * np.pi, angle_end
+    )
+    angle_end = np.where(
+        ~clockwise & (angle_end <= angle_start), angle_end + 2.0 * np.pi, angle_end
+    )
+    return x_center, y_center, radius, angle_start, angle_end - angle_start
+
+
+def segment_counts(radius, sweep, resolution=ARC_RESOLUTION, tolerance=None):
+    """Number of chords per arc, from a fixed arc length or a chord-error bound."""
+    radius = np.asarray(radius, dtype=np.float64)
+    sweep = np.abs(np.asarray(sweep, dtype=np.float64))
+    if tolerance is None:
+        counts = np.ceil(sweep * radius / resolution)
+    else:
+        # A chord spanning angle a deviates r * (1 - cos(a / 2)) from the arc
+        ratio = np.clip(1.0 - tolerance / np.maximum(radius, MIN_RADIUS), -1.0, 1.0)
+        max_angle = np.maximum(2.0 * np.arccos(ratio), 1e-9)
+        counts = np.ceil(sweep / max_angle)
+    return np.maximum(counts, 1).astype(np.int64)
+
+
+def firmware_segment_counts(radius, sweep):
+    """Chords parser.cpp's handle_arc cuts an arc into (always 8..32)."""
+    radius = np.asarray(radius, dtype=np.float64)
+    arc_mm = np.abs(np.asarray(sweep, dtype=np.float64) * radius)
+    mm_per_segment = 2.0 * np.sqrt(2.0 * radius * machine.ARC_TOLERANCE)
+    counts = np.floor(arc_mm / np.maximum(mm_per_segment, 1e-9))
+    return np.clip(counts, machine.MIN_ARC_SEGMENTS, machine.ARC_SEGMENT_CAP).astype(
+        np.int64
+    )
+
+
+def firmware_chord_error(radius, sweep):
+    """Worst distance between the arc and the chords the firmware draws."""
+    radius = np.asarray(radius, dtype=np.float64)
+    step = np.abs(np.asarray(sweep, dtype=np.float64)) / firmware_segment_counts(
+        radius, sweep
+    )
+    error = radius * (1.0 - np.cos(step / 2.0))
+    # Below ARC_MIN_RADIUS the firmware draws one straight line instead
+    straight = radius * (1.0 - np.cos(np.minimum(np.abs(sweep), np.pi) / 2.0))
+    return np.where(radius < machine.ARC_MIN_RADIUS, straight, error)
+
+
+def linearize_arcs(
+    x_start,
+    y_start,
+    x_end,
+    y_end,
+    i,
+    j,
+    clockwise,
+    resolution=ARC_RESOLUTION,
+    tolerance=None,
+):
+    """Linearizes a batch of arcs in one pass.
+
+    Returns (xs, ys, counts): the chord end points of every arc concatenated,
+    and how many of them belong to each arc. Degenerate arcs get a count of 0.
+    """
+    x_center, y_center, radius, angle_start, sweep = arc_geometry(
+        x_start, y_start, x_end, y_end, i, j, clockwise
+    )
+    x_center, y_center, radius, angle_start, sweep = np.broadcast_arrays(
+        x_center, y_center, radius, angle_start, sweep
+    )
+    x_center = x_center.ravel()
+    y_center = y_center.ravel()
+    radius = radius.ravel()
+    angle_start = angle_start.ravel()
+    sweep = sweep.ravel()
+
+    counts = segment_counts(radius, sweep, resolution, tolerance)
+    counts[radius < MIN_RADIUS] = 0
+    theta_step = sweep / np.maximum(counts, 1)
+
+    # k runs 1..count inside each arc
+    total = int(counts.sum())
+    owner = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    k = np.arange(1, total + 1) - starts[owner]
+
+    theta = angle_start[owner] + k * theta_step[owner]
+    xs = x_center[owner] + radius[owner] * np.cos(theta)
+    ys = y_center[owner] + radius[owner] * np.sin(theta)
+    return xs, ys, counts
+
+
+def linearize_arc_points(
+    x_start,
+    y_start,
+    x_end,
+    y_end,
+    i,
+    j,
+    clockwise,
+    resolution=ARC_RESOLUTION,
+    tolerance=None,
+):
+    """Chord end points (xs, ys) of a single arc; empty if the radius is tiny."""
+    xs, ys, _ = linearize_arcs(
+        x_start, y_start, x_end, y_end, i, j, clockwise, resolution, tolerance
+    )
+    return xs, ys
+
+
+def format_segments(xs, ys):
+    """Formats chord end points as G1 lines, matching the old per-point output."""
+    if len(xs) == 0:
+        return []
+    # One C-level format call for the whole batch instead of one per point
+    flat = np.column_stack((xs, ys)).ravel().tolist()
+    return (("G1 X%.4f Y%.4f\n" * len(xs)) % tuple(flat)).splitlines()
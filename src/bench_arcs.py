@@ -0,0 +1,186 @@
+import glob
+import math
+import os
+import re
+import sys
+import time
+
+import arcs
+
+# --- CONFIGURATION ---
+EXAMPLES_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "examples"
+)
+ARC_RESOLUTION = 0.01  # Same as gui.py
+ARC_TOLERANCE = 0.05  # Chord-error mode, same as parser.cpp
+REPEATS = 5
+
+
+def parse_coords(line):
+    coords = {}
+    for char in ["X", "Y", "Z", "I", "J", "F"]:
+        match = re.search(rf"{char}([-+]?[\d.]+)", line)
+        if match:
+            coords[char] = float(match.group(1))
+    return coords
+
+
+def legacy_linearize_arc(start_coords, cmd_coords, clockwise):
+    """The original per-point loop from gui.py, kept as the baseline."""
+    segments = []
+    x_start, y_start = start_coords.get("X", 0.0), start_coords.get("Y", 0.0)
+    i, j = cmd_coords.get("I", 0.0), cmd_coords.get("J", 0.0)
+    x_center, y_center = x_start + i, y_start + j
+    radius = math.sqrt(i**2 + j**2)
+    if radius < 0.001:
+        return []
+
+    angle_start = math.atan2(y_start - y_center, x_start - x_center)
+    x_end = cmd_coords.get("X", x_start)
+    y_end = cmd_coords.get("Y", y_start)
+    angle_end = math.atan2(y_end - y_center, x_end - x_center)
+
+    if clockwise:
+        if angle_end >= angle_start:
+            angle_end -= 2.0 * math.pi
+    else:
+        if angle_end <= angle_start:
+            angle_end += 2.0 * math.pi
+
+    arc_length = abs(angle_end - angle_start) * radius
+    num_segments = int(math.ceil(arc_length / ARC_RESOLUTION))
+    if num_segments < 1:
+        num_segments = 1
+
+    theta_step = (angle_end - angle_start) / num_segments
+
+    for k in range(1, num_segments + 1):
+        theta = angle_start + k * theta_step
+        nx = x_center + radius * math.cos(theta)
+        ny = y_center + radius * math.sin(theta)
+        segments.append(f"G1 X{nx:.4f} Y{ny:.4f}")
+    return segments
+
+
+def vector_linearize_arc(start_coords, cmd_coords, clockwise, tolerance=None):
+    x_start, y_start = start_coords.get("X", 0.0), start_coords.get("Y", 0.0)
+    xs, ys = arcs.linearize_arc_points(
+        x_start,
+        y_start,
+        cmd_coords.get("X", x_start),
+        cmd_coords.get("Y", y_start),
+        cmd_coords.get("I", 0.0),
+        cmd_coords.get("J", 0.0),
+        clockwise,
+        resolution=ARC_RESOLUTION,
+        tolerance=tolerance,
+    )
+    return arcs.format_segments(xs, ys)
+
+
+def collect_arcs(path):
+    """Returns (start, coords, clockwise) for every arc, chained like gui.py does."""
+    found = []
+    current_pos = {"X": 0.0, "Y": 0.0}
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line[0] in ";(%":
+                continue
+            g_match = re.search(r"G(\d+)", line)
+            cmd_type = int(g_match.group(1)) if g_match else -1
+            coords = parse_coords(line)
+            if cmd_type == 2 or cmd_type == 3:
+                found.append((dict(current_pos), coords, cmd_type == 2))
+                segs = legacy_linearize_arc(current_pos, coords, cmd_type == 2)
+                if segs:
+                    last = parse_coords(segs[-1])
+                    current_pos["X"], current_pos["Y"] = last["X"], last["Y"]
+            else:
+                if "X" in coords:
+                    current_pos["X"] = coords["X"]
+                if "Y" in coords:
+                    current_pos["Y"] = coords["Y"]
+    return found
+
+
+def best_of(fn):
+    best = float("inf")
+    result = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_file(path):
+    found = collect_arcs(path)
+    if not found:
+        print(f"{os.path.basename(path):24s} no arcs")
+        return
+
+    def run_legacy():
+        out = []
+        for start, coords, cw in found:
+            out.extend(legacy_linearize_arc(start, coords, cw))
+        return out
+
+    def run_vector():
+        out = []
+        for start, coords, cw in found:
+            out.extend(vector_linearize_arc(start, coords, cw))
+        return out
+
+    def run_batch():
+        xs, ys, _ = arcs.linearize_arcs(
+            [s.get("X", 0.0) for s, c, cw in found],
+            [s.get("Y", 0.0) for s, c, cw in found],
+            [c.get("X", s.get("X", 0.0)) for s, c, cw in found],
+            [c.get("Y", s.get("Y", 0.0)) for s, c, cw in found],
+            [c.get("I", 0.0) for s, c, cw in found],
+            [c.get("J", 0.0) for s, c, cw in found],
+            [cw for s, c, cw in found],
+            resolution=ARC_RESOLUTION,
+        )
+        return arcs.format_segments(xs, ys)
+
+    def run_tolerance():
+        out = []
+        for start, coords, cw in found:
+            out.extend(vector_linearize_arc(start, coords, cw, ARC_TOLERANCE))
+        return out
+
+    t_legacy, legacy = best_of(run_legacy)
+    t_vector, vector = best_of(run_vector)
+    t_batch, batch = best_of(run_batch)
+    t_tol, tol = best_of(run_tolerance)
+
+    mismatches = sum(a != b for a, b in zip(legacy, vector))
+    mismatches += abs(len(legacy) - len(vector))
+
+    print(f"{os.path.basename(path):24s} {len(found):6d} arcs")
+    print(f"   legacy loop      : {t_legacy * 1000:9.2f} ms  {len(legacy):8d} lines")
+    print(
+        f"   numpy per arc    : {t_vector * 1000:9.2f} ms  {len(vector):8d} lines"
+        f"  ({t_legacy / t_vector:.1f}x, {mismatches} mismatches)"
+    )
+    print(
+        f"   numpy whole file : {t_batch * 1000:9.2f} ms  {len(batch):8d} lines"
+        f"  ({t_legacy / t_batch:.1f}x)"
+    )
+    print(
+        f"   tolerance {ARC_TOLERANCE}mm : {t_tol * 1000:9.2f} ms  {len(tol):8d} lines"
+        f"  ({t_legacy / t_tol:.1f}x)"
+    )
+
+
+def main():
+    files = sys.argv[1:] or sorted(glob.glob(os.path.join(EXAMPLES_DIR, "*.gcode")))
+    print(f"Arc resolution {ARC_RESOLUTION}mm, best of {REPEATS} runs")
+    for path in files:
+        bench_file(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+import argparse
+import glob
+import itertools
+import json
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+import machine
+import pipeline
+import tracking
+import uploader
+from cmdbuffer import CommandBuffer
+from compact import Compactor
+from simplify import Simplifier
+from simulator import FirmwareSim, Simulator
+
+# --- CONFIGURATION ---
+EXAMPLES_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "examples"
+)
+WINDOWS = (0, 32, 63)  # bytes in flight; 0 = ping-pong (one line at a time)
+BAUDS = (57600, 115200)
+ARC_RESOLUTION = 0.01  # Same as gui.py
+LIMIT = 3000  # commands per file (0 = whole file)
+USB_LATENCY = 1e-3  # s a USB-serial adapter holds bytes before the host sees them
+HOST_LATENCY = 50e-6  # s from a line arriving to the reply being written
+SETTLE_TIME = 0.1  # s to wait after opening the simulator's pty
+TIMEOUT = 600.0  # s of simulated time before a run is declared stalled
+PERCENTILES = (50, 90, 99, 100)
+
+
+class Streamer:
+    """uploader.Uploader's flow control on a simulated clock, instrumented.
+
+    window is the character-counting budget in bytes; 0 means ping-pong.
+    An idle gap is time the host-to-plotter wire spent silent between two
+    commands of the job. run_realtime() streams through the Uploader itself.
+    """
+
+    def __init__(self, commands, window, baud):
+        self.commands = deque(commands)
+        self.window = window
+        self.char_time = 10.0 / baud
+        self.wire_free = None  # when the last byte sent has left the host
+        self.inflight = deque()  # (bytes, send time)
+        self.inflight_bytes = 0
+        self.status_inflight = 0
+        self.sent = 0
+        self.acked = 0
+        self.bytes_sent = 0
+        self.latencies = []
+        self.t_field = []
+        self.idle_gaps = []
+        self.began = None  # when the first command went out
+        self.last = None
+        self.end = None
+
+    @property
+    def done(self):
+        return not self.commands and not self.inflight
+
+    def sends(self, now):
+        """Commands that may go on the wire now."""
+        if self.began is None:
+            self.began = now
+        out = []
+        while self.commands:
+            size = len(self.commands[0]) + 1
+            if self.window == 0:
+                if self.inflight:
+                    break
+            elif self.inflight and (
+                self.inflight_bytes + self.status_inflight + size > self.window
+            ):
+                break
+            data = (self.commands.popleft() + "\n").encode()
+            if self.wire_free is not None and now - self.wire_free > self.char_time:
+                self.idle_gaps.append(now - self.wire_free)
+            self.wire_free = (
+                max(now, self.wire_free or now) + len(data) * self.char_time
+            )
+            self.inflight.append((len(data), now))
+            self.inflight_bytes += len(data)
+            self.bytes_sent += len(data)
+            self.sent += 1
+            out.append(data)
+        return out
+
+    def poll(self):
+        if self.window and self.inflight_bytes + self.status_inflight >= self.window:
+            return False
+        self.status_inflight += 1
+        return True
+
+    def on_line(self, line, now):
+        self.last = now
+        if line.startswith("<"):
+            self.status_inflight = max(0, self.status_inflight - 1)
+        elif line.startswith("ok") and self.inflight:
+            size, sent_at = self.inflight.popleft()
+            self.inflight_bytes -= size
+            self.acked += 1
+            self.latencies.append(now - sent_at)
+            if line.startswith("ok T:"):
+                self.t_field.append(float(line[5:]))
+            if not self.inflight and not self.commands:
+                self.end = now
+
+
+class BenchUploader(uploader.Uploader):
+    """uploader.Uploader, instrumented like Streamer.
+
+    Times are on the simulator's clock: perf_counter() scaled by speed, so
+    runs at different speeds stay comparable.
+    """
+
+    def __init__(self, port, window, baud, speed):
+        super().__init__(
+            port,
+            baud,
+            "char-count" if window else "ping-pong",
+            log=lambda msg: None,
+        )
+        if window:
+            self.window = window
+        self.speed = speed
+        self.char_time = 10.0 / baud
+        self.wire_free = None
+        self.sent_at = deque()  # send time of every job line not yet answered
+        self.bytes_sent = 0
+        self.latencies = []
+        self.t_field = []
+        self.idle_gaps = []
+        self.began = None
+        self.last = None
+        self.end = None
+
+    @property
+    def done(self):
+        return self.finished.is_set()
+
+    def clock(self):
+        return time.perf_counter() * self.speed
+
+    def write_command(self, data):
+        now = self.clock()
+        if self.began is None:
+            self.began = now
+        if self.wire_free is not None and now - self.wire_free > self.char_time:
+            self.idle_gaps.append(now - self.wire_free)
+        self.wire_free = max(now, self.wire_free or now) + len(data) * self.char_time
+        self.sent_at.append(now)
+        self.bytes_sent += len(data)
+        super().write_command(data)
+
+    def handle_line(self, line):
+        if line.startswith("ok"):
+            now = self.last = self.clock()
+            if self.sent_at:
+                self.latencies.append(now - self.sent_at.popleft())
+            if line.startswith("ok T:"):
+                self.t_field.append(float(line[5:]))
+        super().handle_line(line)
+
+    def reset_inflight(self):
+        super().reset_inflight()
+        self.sent_at.clear()
+
+    def finish(self):
+        self.end = self.clock()
+        self.finished.set()
+
+
+def load_job(path, limit, simplify=None, arc_mode="host", compact=False):
+    """The first limit commands of path, preprocessed like plot.py does."""
+    source = pipeline.SourceFile(path)
+    lines = pipeline.upload_stream(
+        source,
+        ARC_RESOLUTION,
+        simplifier=Simplifier(simplify) if simplify else None,
+        arc_mode=arc_mode,
+        compactor=Compactor() if compact else None,
+    )
+    buffer = CommandBuffer()
+    buffer.fill(itertools.islice(lines, limit or None))
+    return buffer
+
+
+# --- DRIVERS ---
+def run_virtual(commands, window, baud):
+    """Runs the streamer against FirmwareSim on a shared simulated clock.
+
+    '?' polls follow a tracking.PollScheduler, as the uploader's do.
+    """
+    sim = FirmwareSim(baud=baud)
+    streamer = Streamer(commands, window, baud)
+    scheduler = tracking.PollScheduler()
+    status_sent = deque()  # send times of unanswered '?'
+    rx = bytearray()
+    deliveries = deque()  # (host time, line)
+    t = 0.0
+
+    def send(now):
+        for data in streamer.sends(now):
+            sim.receive(data, now)
+            scheduler.sent()
+
+    send(t + HOST_LATENCY)
+    next_poll = scheduler.interval()
+    while not streamer.done and t < TIMEOUT:
+        candidates = [next_poll]
+        wake = sim.next_wakeup()
+        if wake is not None:
+            candidates.append(wake)
+        if deliveries:
+            candidates.append(deliveries[0][0])
+        t = max(t, min(candidates))
+
+        rx += sim.advance(t)
+        while b"\n" in rx:
+            raw, _, rest = bytes(rx).partition(b"\n")
+            rx = bytearray(rest)
+            line = raw.decode("utf-8", errors="ignore").strip()
+            if line:
+                deliveries.append((t + USB_LATENCY, line))
+
+        while deliveries and deliveries[0][0] <= t:
+            _, line = deliveries.popleft()
+            streamer.on_line(line, t)
+            if line.startswith("<"):
+                rtt = t - status_sent.popleft() if status_sent else None
+                scheduler.report(line.strip("<>").split("|")[0], rtt)
+            send(t + HOST_LATENCY)
+
+        if t >= next_poll:
+            if streamer.poll():
+                sim.receive(b"?", t + HOST_LATENCY)
+                status_sent.append(t)
+            next_poll = t + scheduler.interval()
+
+    return streamer, sim.overflows
+
+
+def run_realtime(buffer, window, baud, speed):
+    """Streams buffer through uploader.Uploader to a pty simulator.
+
+    speed > 1 runs the simulated plotter faster than real time; all times
+    are reported on the simulator's clock so runs stay comparable.
+    """
+    sim = Simulator(speed=speed, baud=baud)
+    path = sim.start_pty()
+    bench = BenchUploader(path, window, baud, speed)
+    try:
+        bench.connect(settle=SETTLE_TIME)
+        bench.start(buffer)
+        bench.wait(TIMEOUT / speed)
+    finally:
+        bench.close()
+        sim.stop()
+    return bench, sim.sim.overflows
+
+
+# --- REPORTING ---
+def summarize(values, scale=1000.0):
+    if not values:
+        return {}
+    arr = np.asarray(values) * scale
+    stats = {f"p{p}": float(np.percentile(arr, p)) for p in PERCENTILES}
+    stats["mean"] = float(arr.mean())
+    return stats
+
+
+def bench(
+    files,
+    windows,
+    bauds,
+    limit,
+    realtime,
+    speed,
+    simplify=None,
+    arc_mode="host",
+    compact=False,
+):
+    runs = []
+    for path in files:
+        buffer = load_job(path, limit, simplify, arc_mode, compact)
+        if not len(buffer):
+            continue
+        commands = list(buffer.lines())
+        for baud in bauds:
+            for window in windows:
+                if realtime:
+                    streamer, overflows = run_realtime(buffer, window, baud, speed)
+                else:
+                    streamer, overflows = run_virtual(commands, window, baud)
+                # A stalled run has no end; report how far it got
+                duration = (streamer.end or streamer.last) - streamer.began
+                run = {
+                    "file": os.path.basename(path),
+                    "baud": baud,
+                    "window": window,
+                    "lines": len(commands),
+                    "acked": streamer.acked,
+                    "stalled": not streamer.done,
+                    "overflows": overflows,
+                    "bytes": streamer.bytes_sent,
+                    "duration_s": duration,
+                    "lines_per_sec": streamer.acked / duration if duration else 0.0,
+                    "latency_ms": summarize(streamer.latencies),
+                    "firmware_t_ms": summarize(streamer.t_field, 1.0),
+                    "idle_gap_ms": summarize(streamer.idle_gaps),
+                    "idle_total_s": float(sum(streamer.idle_gaps)),
+                }
+                runs.append(run)
+                print_run(run)
+    return runs
+
+
+def print_run(run):
+    mode = "ping-pong" if run["window"] == 0 else f"window {run['window']}"
+    lat = run["latency_ms"]
+    flag = " STALLED" if run["stalled"] else ""
+    print(
+        f"{run['file']:22s} {run['baud']:6d} {mode:10s} "
+        f"{run['duration_s']:8.2f}s {run['lines_per_sec']:8.1f} l/s "
+        f"lat p50 {lat.get('p50', 0):6.2f} p99 {lat.get('p99', 0):8.2f} ms "
+        f"idle {run['idle_total_s']:6.2f}s ovf {run['overflows']}{flag}"
+    )
+
+
+def compare(runs, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["runs"]
+    key = lambda r: (r["file"], r["baud"], r["window"])
+    before = {key(r): r for r in baseline}
+    print(f"\n--- Compared with {baseline_path} ---")
+    for run in runs:
+        old = before.get(key(run))
+        if not old or not old["duration_s"]:
+            continue
+        change = (run["duration_s"] - old["duration_s"]) / old["duration_s"] * 100
+        print(
+            f"{run['file']:22s} {run['baud']:6d} w{run['window']:<4d} "
+            f"{old['duration_s']:8.2f}s -> {run['duration_s']:8.2f}s ({change:+.1f}%)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming benchmark")
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--window", type=int, action="append")
+    parser.add_argument("--baud", type=int, action="append")
+    parser.add_argument("--limit", type=int, default=LIMIT)
+    parser.add_argument("--realtime", action="store_true")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--simplify", type=float, help="merge tolerance in mm")
+    parser.add_argument("--arc-mode", default="host", choices=pipeline.ARC_MODES)
+    parser.add_argument(
+        "--compact", action="store_true", help="send commands compacted, as plot.py"
+    )
+    parser.add_argument("--json")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(EXAMPLES_DIR, "*.gcode")))
+    runs = bench(
+        files,
+        args.window or WINDOWS,
+        args.baud or BAUDS,
+        args.limit,
+        args.realtime,
+        args.speed,
+        args.simplify,
+        args.arc_mode,
+        args.compact,
+    )
+    if args.json:
+        settings = {
+            "arc_resolution": ARC_RESOLUTION,
+            "limit": args.limit,
+            "simplify": args.simplify,
+            "arc_mode": args.arc_mode,
+            "compact": args.compact,
+            "realtime": args.realtime,
+            "usb_latency": USB_LATENCY,
+            "host_latency": HOST_LATENCY,
+            "rx_buffer": machine.RX_BUFFER_SIZE,
+        }
+        with open(args.json, "w") as f:
+            json.dump({"settings": settings, "runs": runs}, f, indent=2)
+        print(f"Wrote {args.json}")
+    if args.compare:
+        compare(runs, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import mmap
+import os
+import struct
+
+import machine
+from jobcache import CACHE_DIR
+from tokenizer import tokenize
+
+# --- CONFIGURATION ---
+CHECKPOINT_DIR = os.path.join(CACHE_DIR, "checkpoints")
+SUFFIX = ".ckpt"
+MAGIC = b"PLTCKPT1"
+# Answered commands can still have moves in the planner, and those are lost
+# when the Uno resets; resuming this many commands early redraws them instead
+BACKTRACK = machine.PLANNER_BUFFER_SIZE - 1
+HEADER = struct.Struct("<8s64s1024s")  # magic, job key, source path
+# total, acked, resume index, feed, G92 offset, position at the resume
+# index, last reported head position, firmware origin, G90, pen, motion mode
+STATE = struct.Struct("<QQQddddddddd??b")
+
+
+class ModalState:
+    """parser.cpp's modal state, replayed one command at a time.
+
+    Positions are machine coordinates, step rounded like the planner's.
+    """
+
+    def __init__(self):
+        self.absolute = True
+        self.offset_x = 0.0
+        self.offset_y = 0.0
+        self.x = 0.0
+        self.y = 0.0
+        self.target_x = 0.0  # the last target, before step rounding
+        self.target_y = 0.0
+        self.z = 0.0  # parser.cpp ignores Z, but the GUI draws by it
+        self.feed_rate = machine.DEFAULT_FEED_RATE
+        self.motion_mode = -1
+        self.pen = False
+
+    def feed(self, line):
+        self.apply(tokenize(line))
+
+    def apply(self, block):
+        """feed() for a line already tokenized."""
+        for g in block.g:
+            if g in (0, 1, 2, 3):
+                self.motion_mode = g
+            elif g == 90:
+                self.absolute = True
+            elif g == 91:
+                self.absolute = False
+            elif g == 92:
+                self.motion_mode = 92
+        if 3 in block.m:
+            self.pen = True
+        if 5 in block.m:
+            self.pen = False
+        if block.f is not None:
+            self.feed_rate = block.f
+        if block.z is not None:
+            self.z = block.z
+
+        if self.motion_mode == 92:
+            if block.x is not None:
+                self.offset_x = self.x - block.x
+            if block.y is not None:
+                self.offset_y = self.y - block.y
+            self.motion_mode = -1
+        elif self.motion_mode >= 0 and (block.x is not None or block.y is not None):
+            self.target_x, self.target_y = self.x, self.y
+            if block.x is not None:
+                self.target_x = block.x + (self.offset_x if self.absolute else self.x)
+                self.x = planner_mm(self.target_x, machine.STEPS_PER_MM_X)
+            if block.y is not None:
+                self.target_y = block.y + (self.offset_y if self.absolute else self.y)
+                self.y = planner_mm(self.target_y, machine.STEPS_PER_MM_Y)
+
+
+def planner_mm(value, steps_per_mm):
+    """value mm as the planner stores it: lround() to whole steps."""
+    steps = int(abs(value) * steps_per_mm + 0.5) * (1 if value >= 0 else -1)
+    return steps / steps_per_mm
+
+
+class Checkpoint:
+    """How far a job got, kept in a small memory-mapped state file.
+
+    The state file holds the number of commands the firmware acknowledged,
+    the index a resume starts from (BACKTRACK commands earlier) with the
+    modal state in force there, and the head position last reported. Every
+    update is a store into the mapping, never a system call; the kernel
+    writes the page back, so the file survives the program dying with it.
+    """
+
+    def __init__(self, path, mapping):
+        magic, key, source = HEADER.unpack_from(mapping)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a checkpoint")
+        self.path = path
+        self.mmap = mapping
+        self.buffer = None
+        self.key = key.rstrip(b"\0").decode()
+        self.source = source.rstrip(b"\0").decode()
+        fields = STATE.unpack_from(mapping, HEADER.size)
+        self.total, self.acked, self.resume = fields[:3]
+        s = self.state = ModalState()
+        s.feed_rate, s.offset_x, s.offset_y, s.x, s.y = fields[3:8]
+        self.head_x, self.head_y, self.origin_x, self.origin_y = fields[8:12]
+        s.absolute, s.pen, s.motion_mode = fields[12:]
+
+    @classmethod
+    def create(cls, key, source, buffer, directory=CHECKPOINT_DIR):
+        """A fresh checkpoint for a job starting at line 0, tracking buffer."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, key + SUFFIX)
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, key.encode(), os.path.abspath(source).encode()))
+            f.write(bytes(STATE.size))
+        checkpoint = cls.open(path, writable=True)
+        checkpoint.state = ModalState()
+        checkpoint.attach(buffer)
+        return checkpoint
+
+    @classmethod
+    def open(cls, path, writable=False):
+        """Maps a state file. Raises ValueError if it isn't one."""
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        with open(path, "r+b" if writable else "rb") as f:
+            mapping = mmap.mmap(f.fileno(), HEADER.size + STATE.size, access=access)
+        try:
+            return cls(path, mapping)
+        except ValueError:
+            mapping.close()
+            raise
+
+    def attach(self, buffer):
+        """Starts tracking acknowledgements of buffer's lines."""
+        self.buffer = buffer
+        self.total = len(buffer)
+        self.store()
+
+    # --- UPDATES ---
+    def acknowledge(self, index):
+        """Command index was answered with "ok"."""
+        self.acked = index + 1
+        while self.resume < self.acked - BACKTRACK:
+            self.state.feed(self.buffer.command(self.resume))
+            self.resume += 1
+        self.total = max(self.total, len(self.buffer))
+        self.store()
+
+    def report(self, x, y):
+        """The firmware reported the head at x, y (its machine mm)."""
+        self.head_x = x + self.origin_x
+        self.head_y = y + self.origin_y
+        self.store()
+
+    def store(self):
+        s = self.state
+        STATE.pack_into(
+            self.mmap,
+            HEADER.size,
+            self.total,
+            self.acked,
+            self.resume,
+            s.feed_rate,
+            s.offset_x,
+            s.offset_y,
+            s.x,
+            s.y,
+            self.head_x,
+            self.head_y,
+            self.origin_x,
+            self.origin_y,
+            s.absolute,
+            s.pen,
+            s.motion_mode,
+        )
+
+    def flush(self):
+        self.mmap.flush()
+
+    def close(self):
+        if not self.mmap.closed:
+            self.mmap.close()
+
+    def remove(self):
+        """The job finished: forget it."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    # --- RESUME ---
+    def restart(self):
+        """Commands that put a freshly reset firmware back at the resume index.
+
+        The Uno resets when the port opens and restarts at 0,0 wherever the
+        head stopped. G92 declares the head's last reported position in the
+        job's own coordinates, so the job's targets land where they did
+        before; then the pen goes up, the head travels to the resume point
+        and the modes are restored. Positions are kept in the frame of the
+        job's first run, so the firmware's new origin is the head's position.
+
+        The head sits on a whole step, and MPos is reported to 0.01 mm, well
+        within half a step of it, so the position is snapped back onto its
+        step first. The new offsets then differ from the first run's by whole
+        steps, and every target rounds to the step it did before.
+        """
+        s = self.state
+        self.head_x = planner_mm(self.head_x, machine.STEPS_PER_MM_X)
+        self.head_y = planner_mm(self.head_y, machine.STEPS_PER_MM_Y)
+        self.origin_x, self.origin_y = self.head_x, self.head_y
+        self.store()
+        lines = [
+            "M5",
+            "G90",
+            f"G92 X{self.head_x - s.offset_x:.4f} Y{self.head_y - s.offset_y:.4f}",
+            f"G0 X{s.x - s.offset_x:.4f} Y{s.y - s.offset_y:.4f}",
+        ]
+        if s.motion_mode in (0, 1, 2, 3):
+            lines.append(f"G{s.motion_mode} F{s.feed_rate:g}")
+        else:
+            lines.append(f"F{s.feed_rate:g}")
+        if s.pen:
+            lines.append("M3")
+        if not s.absolute:
+            lines.append("G91")
+        return lines
+
+    def __str__(self):
+        return (
+            f"{os.path.basename(self.source)}: {self.acked}/{self.total} acknowledged,"
+            f" resumes at {self.resume}"
+        )
+
+
+def list_checkpoints(directory=CHECKPOINT_DIR):
+    """Interrupted jobs, most recently started first."""
+    if not os.path.isdir(directory):
+        return []
+    paths = [
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(SUFFIX)
+    ]
+    checkpoints = []
+    for path in sorted(paths, key=os.path.getmtime, reverse=True):
+        try:
+            checkpoints.append(Checkpoint.open(path))
+        except (OSError, ValueError):
+            continue
+    return checkpoints
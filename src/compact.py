@@ -0,0 +1,360 @@
+import itertools
+import math
+
+import machine
+from checkpoint import ModalState
+from tokenizer import WORD_RE
+
+# --- CONFIGURATION ---
+# Steps; a rounded word must land at least this far from a half step, where
+# the firmware's float32 lround() could go either way
+STEP_MARGIN = 0.05
+MAX_DECIMALS = 4  # 1 / STEPS_PER_MM needs four
+# mm; how far a word may be nudged, within its step, to keep a corner stop
+NUDGE = 0.0005
+NUDGE_RANGE = 0.006
+LENGTH_MARGIN = 1e-6  # mm; float slack around CORNER_MIN_LENGTH
+BITS_PER_BYTE = 10  # 8N1: start bit, 8 data bits, stop bit
+
+MOTION_CODES = (0, 1, 2, 3, 92)  # the G codes that set parser.cpp's motion_mode
+
+
+def number(text):
+    """text without a plus sign or zeros that don't count: 1.500000 -> 1.5."""
+    sign = "-" if text.startswith("-") else ""
+    whole, _, fraction = text.lstrip("+-").partition(".")
+    whole = whole.lstrip("0")
+    fraction = fraction.rstrip("0")
+    if not whole and not fraction:
+        return "0"
+    return sign + whole + (f".{fraction}" if fraction else "")
+
+
+def near_half(scaled):
+    return abs(scaled - math.floor(scaled) - 0.5) < STEP_MARGIN
+
+
+def quantize(value, text, base, steps_per_mm):
+    """The shortest spelling of an axis word the planner rounds to the same step.
+
+    base is added to value before rounding: the G92 offset for an absolute
+    word, 0 for an increment (added to a whole-step position). Words
+    within STEP_MARGIN of a half step are only trimmed.
+    """
+    exact = number(text)
+    scaled = (value + base) * steps_per_mm
+    if near_half(scaled):
+        return exact
+    step = math.floor(scaled + 0.5)
+    for decimals in range(MAX_DECIMALS + 1):
+        candidate = round(value, decimals)
+        rounded = (candidate + base) * steps_per_mm
+        if math.floor(rounded + 0.5) == step and not near_half(rounded):
+            short = number(f"{candidate:.{decimals}f}")
+            return short if len(short) < len(exact) else exact
+    return exact
+
+
+def nudged(value, text, base, steps_per_mm):
+    """text, then the spellings of value within NUDGE_RANGE that round to the
+    same step, nearest first; base as in quantize()."""
+    step = math.floor((value + base) * steps_per_mm + 0.5)
+    yield number(text)
+    for n in range(1, round(NUDGE_RANGE / NUDGE) + 1):
+        for candidate in (value + n * NUDGE, value - n * NUDGE):
+            candidate = round(candidate, MAX_DECIMALS)
+            rounded = (candidate + base) * steps_per_mm
+            if math.floor(rounded + 0.5) == step and not near_half(rounded):
+                yield number(f"{candidate:.{MAX_DECIMALS}f}")
+
+
+class Compactor:
+    """Shortens each command to the fewest bytes that plan the same steps.
+
+    Words are dropped when they would not change the firmware's state: a
+    motion G code already in force, G90/G91, M3/M5, F and Z values the
+    firmware already has, I0/J0, an X or Y that lands on the step the head
+    is already at, and the codes and letters parser.cpp skips (G21, N...).
+    G0/G1 coordinates are rounded to the fewest decimals that still round
+    to the same step in the planner, and the spaces between words go. A
+    line left with nothing to say is dropped.
+
+    Rounding moves the unrounded targets by less than half a step, which
+    parser.cpp's corner check still sees: where it would decide a corner
+    differently, the words are nudged within their steps, or the previous
+    move is (so each move is held back until the next one). Only a chain of
+    turns all within that much of the threshold can still go the other way.
+
+    What the firmware was told is tracked from the start of the job, so
+    nothing is dropped until the job itself has set it; lines this stage
+    can't read pass unchanged and make it forget. Absolute words are
+    checked against the offsets the job's own G92s set, on top of offsets
+    that are whole steps when the job starts: after a reset or SET ZERO,
+    and after a checkpoint's restart, which snaps its G92 to the head's
+    step. Counters are updated as the stream is consumed.
+    """
+
+    def __init__(self, baud=machine.BAUD_RATE):
+        self.baud = baud
+        self.lines_in = self.lines_out = 0
+        self.bytes_in = self.bytes_out = 0
+        self.state = ModalState()  # the job's own frame, for the offsets
+        self.forget()
+
+    def __str__(self):
+        saved = self.bytes_in - self.bytes_out
+        share = saved / self.bytes_in * 100 if self.bytes_in else 0.0
+        seconds = saved * BITS_PER_BYTE / self.baud
+        return (
+            f"Compact: sent {self.bytes_out} of {self.bytes_in} bytes"
+            f" ({share:.1f}% fewer, {self.lines_in - self.lines_out} lines"
+            f" dropped), {seconds:.1f} s less on the wire at {self.baud} baud"
+        )
+
+    def forget(self):
+        """Nothing is known about the firmware's modes any more."""
+        self.motion = self.absolute = self.feed = self.z = self.pen = None
+        # Whether an absolute word has placed the axis, so the head's step
+        # is known relative to the offsets
+        self.placed = [False, False]
+        # The last move parser.cpp's corner check saw, as (from the job's
+        # words, from ours); None if unknown, but the same for both
+        self.last = None
+        # (last, the move, its spellings) for the last move if it was
+        # rounded, so it can be written another way after all
+        self.previous = None
+        self.respell = None
+        self.xy = None
+
+    def __call__(self, lines):
+        # Lines from the last G0/G1 move on, held back in case the next move
+        # needs it written another way: (words, (start, stop) of its X/Y words)
+        held = []
+        for line in lines:
+            self.lines_in += 1
+            self.bytes_in += len(line) + 1
+            self.respell = None
+            words = self.compact(line)
+            self.state.feed(line)
+            if self.respell is not None:
+                start, stop = held[0][1]
+                held[0][0][start:stop] = self.respell
+            if self.xy is not None:
+                yield from self.flush(held)
+            held.append((words, self.xy))
+        yield from self.flush(held)
+
+    def flush(self, held):
+        for words, _ in held:
+            if words:
+                short = "".join(words)
+                self.lines_out += 1
+                self.bytes_out += len(short) + 1
+                yield short
+        held.clear()
+
+    def compact(self, line):
+        """line as a list of words: shortened, empty if it changes nothing, or
+        line itself if unknown. Sets xy for a G0/G1 move's X/Y words."""
+        self.xy = None
+        upper = line.upper()
+        words = WORD_RE.findall(upper)
+        letters = [letter for letter, _ in words]
+        # parser.cpp skips every other code and letter
+        g = [int(float(v)) for letter, v in words if letter == "G"]
+        m = [int(float(v)) for letter, v in words if letter == "M"]
+        m = [code for code in m if code in (3, 5)]
+        if WORD_RE.sub("", upper).strip() or any(
+            letters.count(letter) > 1 for letter in "XYZIJF"
+        ):
+            self.forget()
+            return [line]
+        value = {letter: v for letter, v in words if letter in "XYZIJF"}
+        out = []
+
+        distance = [code for code in g if code in (90, 91)]
+        if distance and (distance[-1] == 90) != self.absolute:
+            self.absolute = distance[-1] == 90
+            out.append(f"G{distance[-1]}")
+        motion = [code for code in g if code in MOTION_CODES]
+        if motion and (motion[-1] == 92 or motion[-1] != self.motion):
+            out.append(f"G{motion[-1]}")
+        mode = motion[-1] if motion else self.motion
+
+        if mode in (0, 1):
+            kept = self.axes(value)
+            if kept:
+                self.xy = (len(out), len(out) + len(kept))
+            out.extend(kept)
+        else:
+            out.extend(f"{a}{number(value[a])}" for a in "XY" if a in value)
+            radius = math.hypot(float(value.get("I", 0)), float(value.get("J", 0)))
+            if mode in (2, 3) and radius >= machine.ARC_MIN_RADIUS:
+                # handle_arc() leaves the same last move for both spellings
+                self.last = None
+                self.previous = None
+        if mode == 92:
+            self.motion = -1  # parser.cpp forgets the motion mode after G92
+        elif motion:
+            self.motion = mode
+
+        if "Z" in value and float(value["Z"]) != self.z:
+            self.z = float(value["Z"])
+            out.append(f"Z{number(value['Z'])}")
+        for axis in "IJ":
+            if axis in value and float(value[axis]) != 0.0:
+                out.append(f"{axis}{number(value[axis])}")
+        if "F" in value and float(value["F"]) != self.feed:
+            self.feed = float(value["F"])
+            out.append(f"F{number(value['F'])}")
+        if m and (m[-1] == 3) != self.pen:
+            self.pen = m[-1] == 3
+            out.append(f"M{m[-1]}")
+        return out
+
+    def axes(self, value):
+        """The X and Y words of a G0/G1, rounded, or dropped where unchanged.
+
+        The words stay as written wherever the shorter ones would flip the
+        firmware's corner check, or it can't be told whether they would. If
+        nothing keeps a corner, the last move is spelled again (respell) to
+        find a pair of spellings that does.
+        """
+        s = self.state
+        exact = [f"{axis}{number(value[axis])}" for axis in "XY" if axis in value]
+        if not exact:
+            return []
+        # Until the job says, the firmware is in G90 as it is after a reset
+        absolute = self.absolute is not False
+        words = []  # (word, axis, the move along it, unchanged)
+        spellings = []  # how to write each word other ways, for spell()
+        original = [0.0, 0.0]  # the move as parser.cpp sees it
+        verifiable = True
+        for k, (axis, offset, position, steps_per_mm) in enumerate(
+            (
+                ("X", s.offset_x, s.x, machine.STEPS_PER_MM_X),
+                ("Y", s.offset_y, s.y, machine.STEPS_PER_MM_Y),
+            )
+        ):
+            if axis not in value:
+                continue
+            v = float(value[axis])
+            base = offset if absolute else 0.0
+            text = quantize(v, value[axis], base, steps_per_mm)
+            scaled = (v + base) * steps_per_mm
+            if absolute:
+                here = round(position * steps_per_mm)
+                # Until an absolute word places the axis, where the head is
+                # relative to the offsets is anyone's guess
+                verifiable = verifiable and self.placed[k]
+                unchanged = self.placed[k]
+                self.placed[k] = True
+            else:
+                here = 0
+                unchanged = True
+            unchanged = (
+                unchanged and not near_half(scaled) and math.floor(scaled + 0.5) == here
+            )
+
+            def along(t, offset=offset, position=position):
+                """The move parser.cpp makes for the word t, in its own order."""
+                target = t + offset if absolute else position + t
+                return target - position
+
+            original[k] = along(v)
+            words.append((f"{axis}{text}", k, along(float(text)), unchanged))
+            spellings.append((axis, k, v, value[axis], base, steps_per_mm, along))
+
+        # A line whose words all land where the head is still moves, by nothing
+        kept = [w for w in words if not w[3]] or words[:1]
+        rounded = [0.0, 0.0]
+        for _, k, move, _ in kept:
+            rounded[k] = move
+        kept = [word for word, _, _, _ in kept]
+        if not verifiable:
+            kept, rounded = exact, original
+        elif not self.corner_agrees(original, rounded):
+            # Nudging the words within their steps can put back a corner
+            # decision an earlier rounding flipped
+            kept, rounded = self.nudge(original, spellings)
+            if kept is None and self.previous is not None:
+                kept, rounded = self.respell_previous(original, spellings)
+            if kept is None:
+                # A turn right at the threshold: the job's own words decide
+                kept, rounded = exact, original
+        self.previous = (
+            (self.last, original, spellings) if rounded != original else None
+        )
+        self.last = (original, rounded)
+        return kept
+
+    def respell_previous(self, original, spellings):
+        """Spellings of the last move and this one that keep both corners."""
+        saved = self.last
+        last, before, before_spellings = self.previous
+        for words, move in spell(before_spellings):
+            self.last = last
+            if not self.corner_agrees(before, move):
+                continue
+            self.last = (before, move)
+            kept, rounded = self.nudge(original, spellings)
+            if kept is not None:
+                self.respell = words
+                return kept, rounded
+        self.last = saved
+        return None, None
+
+    def nudge(self, original, spellings):
+        """The first spelling of the move that keeps the corner, or (None, None)."""
+        for words, move in spell(spellings):
+            if self.corner_agrees(original, move):
+                return words, move
+        return None, None
+
+    def corner_agrees(self, original, rounded):
+        """True if parser.cpp's corner check decides the same for both moves,
+        and will see both as long enough, or not, when it checks the next."""
+        if original != rounded and (
+            long(original) is None or long(original) != long(rounded)
+        ):
+            return False
+        if self.last is None:
+            # The last move is the same for both, but not known
+            return original == rounded or not long(original)
+        return sharp(self.last[0], original) == sharp(self.last[1], rounded)
+
+
+def spell(spellings):
+    """(words, move) for every way to write a move, nearest first.
+
+    spellings has (axis, k, value, text, base, steps_per_mm, along) for each
+    word; along(t) is the move along axis k for the word t.
+    """
+    options = [
+        [(f"{axis}{t}", k, along(float(t))) for t in nudged(v, text, base, steps)]
+        for axis, k, v, text, base, steps, along in spellings
+    ]
+    for choice in itertools.product(*options):
+        move = [0.0, 0.0]
+        for _, k, along in choice:
+            move[k] = along
+        yield [word for word, _, _ in choice], move
+
+
+def long(move):
+    """Whether check_corner() counts move, or None too close to tell."""
+    length = math.hypot(*move)
+    if abs(length - machine.CORNER_MIN_LENGTH) < LENGTH_MARGIN:
+        return None
+    return length > machine.CORNER_MIN_LENGTH
+
+
+def sharp(last, move):
+    """check_corner(): True when move turns sharper than the threshold."""
+    mag_last = math.hypot(*last)
+    mag_new = math.hypot(*move)
+    if mag_last <= machine.CORNER_MIN_LENGTH or mag_new <= machine.CORNER_MIN_LENGTH:
+        return False
+    dot = last[0] * move[0] + last[1] * move[1]
+    cos_theta = max(-1.0, min(1.0, dot / (mag_last * mag_new)))
+    return math.degrees(math.acos(cos_theta)) > machine.CORNER_ANGLE_THRESHOLD
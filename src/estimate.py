@@ -0,0 +1,243 @@
+import math
+
+import numpy as np
+
+import arcs
+import machine
+import movetable
+from movetable import lround
+
+# --- CONFIGURATION ---
+CHAR_TIME = 10e-6  # s of AVR time per received byte (simulator.CHAR_TIME)
+PARSE_TIME = 0.4e-3  # s per parse_line (simulator.PARSE_TIME)
+OK_BYTES = len("ok T:0\r\n")
+HOST_LATENCY = 1e-3  # s a USB-serial adapter adds to each round trip
+ITERATIONS = 50  # cap on the passes coupling the link and the planner
+TOLERANCE = 1e-4  # s; passes stop once no time moves by more
+
+
+class Estimate:
+    """Predicted timeline of one job.
+
+    planned[k] is when command k is answered with "ok", in seconds from the
+    first byte sent; total is when the last move has finished.
+    """
+
+    def __init__(self, planned, total, motion, corners):
+        self.planned = planned
+        self.total = total
+        self.motion = motion  # s the steppers actually move
+        self.corners = corners  # corner stops the firmware will make
+
+    def remaining(self, acked):
+        """Seconds left once `acked` commands were answered."""
+        if acked <= 0 or not len(self.planned):
+            return self.total
+        return max(
+            0.0, self.total - float(self.planned[min(acked, len(self.planned)) - 1])
+        )
+
+    def progress(self, acked):
+        """Fraction of the job's time behind us once `acked` commands were answered."""
+        if self.total <= 0:
+            return 1.0
+        return 1.0 - self.remaining(acked) / self.total
+
+    def __str__(self):
+        return (
+            f"Estimate: {format_duration(self.total)} "
+            f"({format_duration(self.motion)} moving, {self.corners} corner stops)"
+        )
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+# --- PARSING ---
+def parse_moves(commands):
+    """Runs parser.cpp's modal state over the commands.
+
+    Returns per-segment arrays (x, y in mm, feed in mm/min, owning command)
+    plus per-command byte counts and corner-stop flags. The modal state is
+    resolved by movetable; arcs are cut into the firmware's own segments,
+    from the planner's step rounded start, all at once. check_corner's
+    vectors are compared afterwards, all at once too.
+    """
+    nbytes = np.array([len(line) + 1 for line in commands], np.int64)
+    table = movetable.compile_moves(commands)
+    arc = table["kind"] >= movetable.ARC_CW
+    x0, y0, tx, ty = table["x0"], table["y0"], table["x"], table["y"]
+    radius = np.hypot(table["i"], table["j"])
+    cut = arc & (radius >= machine.ARC_MIN_RADIUS)
+
+    # handle_arc: n - 1 points around the centre, then the target itself
+    cx = lround(x0 * machine.STEPS_PER_MM_X) / machine.STEPS_PER_MM_X
+    cy = lround(y0 * machine.STEPS_PER_MM_Y) / machine.STEPS_PER_MM_Y
+    _, _, _, start, sweep = arcs.arc_geometry(
+        cx, cy, tx, ty, table["i"], table["j"], table["kind"] == movetable.ARC_CW
+    )
+    counts = np.ones(len(table), np.int64)
+    counts[cut] = arcs.firmware_segment_counts(radius[cut], sweep[cut])
+    row = np.repeat(np.arange(len(table)), counts)
+    k = np.arange(len(row)) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+    theta = start[row] + sweep[row] * k / counts[row]
+    last = k == counts[row]
+    xs = np.where(
+        last, tx[row], cx[row] + table["i"][row] + radius[row] * np.cos(theta)
+    )
+    ys = np.where(
+        last, ty[row], cy[row] + table["j"][row] + radius[row] * np.sin(theta)
+    )
+    feeds = np.where(
+        table["kind"] == movetable.TRAVEL, machine.MAX_FEED_RATE, table["feed"]
+    )[row]
+
+    # check_corner sees every G0/G1, and an arc's last segment after it
+    # has set the vector to its last inner point
+    ends = np.cumsum(counts) - 1
+    turns = np.flatnonzero(~arc | (counts > 1))
+    inner = np.where(arc[turns], ends[turns] - 1, ends[turns])
+    corner = corner_stops(
+        len(commands),
+        np.column_stack(
+            (
+                np.where(arc[turns], -1, table["line"][turns]),
+                x0[turns],
+                y0[turns],
+                xs[inner],
+                ys[inner],
+            )
+        ),
+    )
+    return xs, ys, feeds, table["line"][row], nbytes, corner
+
+
+def corner_stops(n, turns):
+    """check_corner() for every G0/G1, from the direction vectors it sees."""
+    corner = np.zeros(n, bool)
+    if len(turns) < 2:
+        return corner
+    k, x0, y0, x1, y1 = np.array(turns).T
+    dx = x1 - lround(x0 * machine.STEPS_PER_MM_X) / machine.STEPS_PER_MM_X
+    dy = y1 - lround(y0 * machine.STEPS_PER_MM_Y) / machine.STEPS_PER_MM_Y
+    mag = np.hypot(dx, dy)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cos_t = (dx[:-1] * dx[1:] + dy[:-1] * dy[1:]) / (mag[:-1] * mag[1:])
+    angle = np.degrees(np.arccos(np.clip(cos_t, -1.0, 1.0)))
+    sharp = (
+        (mag[:-1] > machine.CORNER_MIN_LENGTH)
+        & (mag[1:] > machine.CORNER_MIN_LENGTH)
+        & (angle > machine.CORNER_ANGLE_THRESHOLD)
+        & (k[1:] >= 0)
+    )
+    corner[k[1:][sharp].astype(np.int64)] = True
+    return corner
+
+
+def arc_points(cx, cy, tx, ty, i, j, clockwise):
+    """End points of the segments handle_arc plans, the target last."""
+    radius = math.hypot(i, j)
+    if radius < machine.ARC_MIN_RADIUS:
+        return [tx], [ty]
+    _, _, _, start, sweep = arcs.arc_geometry(cx, cy, tx, ty, i, j, clockwise)
+    n = int(arcs.firmware_segment_counts(radius, sweep))
+    theta = float(start) + float(sweep) * np.arange(1, n) / n
+    xs = (cx + i + radius * np.cos(theta)).tolist()
+    ys = (cy + j + radius * np.sin(theta)).tolist()
+    return xs + [tx], ys + [ty]
+
+
+# --- TIMING ---
+def segment_durations(xs, ys, feeds):
+    """stepper_plan_move's step quantization and delays, for every segment."""
+    tx = lround(xs * machine.STEPS_PER_MM_X)
+    ty = lround(ys * machine.STEPS_PER_MM_Y)
+    dx = np.abs(np.diff(tx, prepend=0))
+    dy = np.abs(np.diff(ty, prepend=0))
+    steps = np.maximum(dx, dy)
+    feeds = np.where(feeds < 1.0, 100.0, feeds)
+    distance = np.maximum(
+        0.001, np.hypot(dx / machine.STEPS_PER_MM_X, dy / machine.STEPS_PER_MM_Y)
+    )
+    delay = np.floor(distance / feeds * 60000000.0 / np.maximum(steps, 1))
+    delay = np.maximum(delay, machine.MIN_STEP_DELAY_US)
+    period = np.maximum(delay, machine.STEP_PULSE_DELAY_US + machine.STEP_OVERHEAD_US)
+    # Zero moves are dropped by the planner
+    return np.where(steps > 0, steps * period * 1e-6, 0.0)
+
+
+def move_time(x0, y0, x1, y1, feed):
+    """segment_durations() for one segment from (x0, y0) to (x1, y1)."""
+    sx = machine.STEPS_PER_MM_X
+    sy = machine.STEPS_PER_MM_Y
+    tx0, tx1, ty0, ty1 = lround(np.array([x0 * sx, x1 * sx, y0 * sy, y1 * sy])).tolist()
+    dx = abs(tx1 - tx0)
+    dy = abs(ty1 - ty0)
+    steps = max(dx, dy)
+    if not steps:
+        return 0.0
+    feed = 100.0 if feed < 1.0 else feed
+    distance = max(
+        0.001, math.hypot(dx / machine.STEPS_PER_MM_X, dy / machine.STEPS_PER_MM_Y)
+    )
+    delay = max(int(distance / feed * 60000000.0 / steps), machine.MIN_STEP_DELAY_US)
+    period = max(delay, machine.STEP_PULSE_DELAY_US + machine.STEP_OVERHEAD_US)
+    return steps * period * 1e-6
+
+
+def estimate(commands, baud=machine.BAUD_RATE, stream_mode="char-count"):
+    """Predicts how long commands take to plot, without running them."""
+    commands = list(commands)
+    n = len(commands)
+    if not n:
+        return Estimate(np.zeros(0), 0.0, 0.0, 0)
+    xs, ys, feeds, owners, nbytes, corner = parse_moves(commands)
+    seg = segment_durations(xs, ys, feeds)
+    # Zero moves never reach the planner
+    keep = seg > 0
+    seg, owners = seg[keep], owners[keep]
+    first = np.searchsorted(owners, np.arange(n))
+    last = np.searchsorted(owners, np.arange(n), side="right") - 1
+    moves = last >= first
+
+    # Time each line costs the link and the parser when nothing else waits
+    byte_time = 10.0 / baud
+    if stream_mode == "char-count":
+        service = np.maximum(nbytes * byte_time, nbytes * CHAR_TIME + PARSE_TIME)
+    else:
+        service = (nbytes + OK_BYTES) * byte_time + PARSE_TIME + HOST_LATENCY
+    sent = np.cumsum(service)
+
+    # A command is answered once its last segment is in the planner, and the
+    # next one is parsed after that. A segment goes in when the one
+    # `capacity` places ahead of it has finished; a corner stop first waits
+    # for the planner to run dry. Given the other side's times, commands and
+    # segments are each a running maximum, so alternate until nothing moves.
+    capacity = machine.PLANNER_BUFFER_SIZE - 1
+    full = np.flatnonzero(moves & (last >= capacity))
+    stops = np.flatnonzero(corner & moves & (first > 0))
+    moving = np.cumsum(seg)
+    done = np.zeros(len(seg))
+    for _ in range(ITERATIONS):
+        gate = np.zeros(n)
+        gate[full] = done[last[full] - capacity]
+        gate[stops] = np.maximum(gate[stops], done[first[stops] - 1])
+        planned = sent + np.maximum.accumulate(np.maximum(gate - sent, 0.0))
+        parsed = np.concatenate(([0.0], planned[:-1])) + service
+        entry = parsed[owners]
+        entry[capacity:] = np.maximum(entry[capacity:], done[:-capacity])
+        s = first[stops]
+        entry[s] = np.maximum(entry[s], done[s - 1])
+        settled = moving + np.maximum.accumulate(entry - (moving - seg))
+        converged = np.allclose(settled, done, rtol=0.0, atol=TOLERANCE)
+        done = settled
+        if converged:
+            break
+
+    total = max(float(planned[-1]), float(done[-1]) if len(done) else 0.0)
+    return Estimate(planned, total, float(seg.sum()), len(stops))
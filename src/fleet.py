@@ -0,0 +1,319 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import checkpoint
+import pipeline
+import uploader
+from cmdbuffer import CommandBuffer
+from compact import Compactor
+from jobcache import JobCache, job_key
+
+# --- CONFIGURATION ---
+PORTS = ["/dev/ttyUSB0", "/dev/ttyUSB1"]
+BAUD = 115200
+STREAM_MODE = "ping-pong"  # or "char-count"
+ARC_RESOLUTION = 0.01
+ARC_TOLERANCE = None  # mm chord error; when set, overrides ARC_RESOLUTION
+ARC_MODE = "auto"
+COMPACT = True  # send each command in as few bytes as plan the same steps
+JOB_CACHE = True  # reuse preprocessed jobs from ~/.cache/arduino-plotter
+CHECKPOINTS = True  # resume a job on its plotter after the link drops
+SCHEDULE_INTERVAL = 0.5  # s between scheduler passes when nothing wakes it
+STATUS_INTERVAL = 10.0  # s between fleet status lines on the command line
+
+
+class Job:
+    """One file to plot once, on whichever plotter comes free first."""
+
+    def __init__(self, number, path, key):
+        self.number = number
+        self.path = path
+        self.key = key
+        self.state = "queued"  # then running, and done or failed
+        self.plotter = None
+        self.started = self.ended = None
+
+    def __str__(self):
+        where = f" on {self.plotter.port}" if self.plotter else ""
+        return f"#{self.number} {os.path.basename(self.path)}: {self.state}{where}"
+
+
+class Plotter(uploader.Uploader):
+    """A plotter in the fleet and the job it is running."""
+
+    def __init__(self, fleet, port):
+        super().__init__(port, fleet.baud, fleet.stream_mode, fleet.log)
+        self.fleet = fleet
+        self.job = None
+
+    def connect(self, *args, **kwargs):
+        super().connect(*args, **kwargs)
+        self.fleet.wake.set()
+
+    def finish(self):
+        super().finish()
+        self.fleet.wake.set()
+
+    def interrupt(self):
+        interrupted = super().interrupt()
+        self.fleet.wake.set()
+        return interrupted
+
+    @property
+    def idle(self):
+        return self.job is None and self.connected
+
+
+class Fleet:
+    """Several plotters, one per port, fed from a queue of jobs.
+
+    Every plotter keeps its own link, flow control and telemetry (an
+    uploader.Uploader); a scheduler thread hands the next queued job to
+    whichever is connected and idle. Jobs with the same preprocessed
+    output share one CommandBuffer: it is filled once, by one producer
+    thread, and every plotter on it streams zero-copy slices of it. A job
+    cut short by a dropped link resumes on the same plotter from its
+    checkpoint, since only that plotter's head is where the job left off.
+    """
+
+    def __init__(self, ports, baud=BAUD, stream_mode=STREAM_MODE, log=print):
+        self.baud = baud
+        self.stream_mode = stream_mode
+        self.log = log
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stop = threading.Event()
+        self.plotters = [Plotter(self, port) for port in ports]
+        self.queue = deque()
+        self.jobs = []
+        self.buffers = {}  # job key: CommandBuffer, while a job needs it
+        self.cache = JobCache() if JOB_CACHE else None
+
+    def start(self):
+        for plotter in self.plotters:
+            threading.Thread(
+                target=plotter.keep_connected,
+                args=(uploader.RECONNECT_INTERVAL, self.stop),
+                daemon=True,
+            ).start()
+        threading.Thread(target=self.schedule, daemon=True).start()
+
+    def close(self):
+        self.stop.set()
+        self.wake.set()
+        for plotter in self.plotters:
+            plotter.close()
+
+    # --- JOBS ---
+    def submit(self, path):
+        """Queues path for the next idle plotter. Raises OSError if unreadable."""
+        settings = pipeline.job_settings(
+            path, ARC_RESOLUTION, ARC_TOLERANCE, ARC_MODE, compact_commands=COMPACT
+        )
+        key = job_key(path, settings)
+        with self.lock:
+            job = Job(len(self.jobs), path, key)
+            self.jobs.append(job)
+            self.queue.append(job)
+        self.wake.set()
+        return job
+
+    def wait(self, timeout=None):
+        """Blocks until every submitted job is done or failed; False on timeout."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while any(job.state in ("queued", "running") for job in self.jobs):
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+            time.sleep(uploader.WAIT_STEP)
+        return True
+
+    def buffer(self, job):
+        """The job's commands: shared with any other job that has its key,
+        mapped from the job cache, or filling on a new producer thread."""
+        buffer = self.buffers.get(job.key)
+        if buffer is not None and not buffer.error:
+            return buffer
+        buffer = self.cache.get(job.key) if self.cache else None
+        if buffer is None:
+            buffer = CommandBuffer()
+            source = pipeline.open_source(job.path)
+            compactor = Compactor(self.baud) if COMPACT else None
+            lines = pipeline.upload_stream(
+                source,
+                ARC_RESOLUTION,
+                ARC_TOLERANCE,
+                arc_mode=ARC_MODE,
+                compactor=compactor,
+            )
+            threading.Thread(
+                target=self.produce,
+                args=(buffer, lines, job.key, compactor, job.path),
+                daemon=True,
+            ).start()
+        self.buffers[job.key] = buffer
+        return buffer
+
+    def produce(self, buffer, lines, key, compactor=None, path=None):
+        """Producer thread: fills buffer for every plotter streaming it."""
+
+        def on_data():
+            for plotter in self.plotters:
+                if plotter.buffer is buffer:
+                    plotter.notify()
+
+        buffer.fill(lines, on_data)
+        if compactor and buffer.complete and not buffer.error:
+            self.log(f"{os.path.basename(path)}: {compactor}")
+        if self.cache and buffer.complete and not buffer.error:
+            try:
+                self.cache.store(key, buffer)
+            except OSError as e:
+                self.log(f"[WARN] Job cache: {e}")
+
+    # --- SCHEDULING ---
+    def schedule(self):
+        """Scheduler thread: runs a pass whenever a plotter or the queue changes."""
+        while not self.stop.is_set():
+            self.wake.wait(SCHEDULE_INTERVAL)
+            self.wake.clear()
+            with self.lock:
+                for plotter in self.plotters:
+                    self.check(plotter)
+                for plotter in self.plotters:
+                    if not self.queue:
+                        break
+                    if plotter.idle:
+                        self.assign(self.queue.popleft(), plotter)
+                # Buffers nobody will stream again are left to the job cache
+                needed = {j.key for j in self.jobs if j.state in ("queued", "running")}
+                for key in list(self.buffers):
+                    if key not in needed:
+                        del self.buffers[key]
+
+    def check(self, plotter):
+        """Retires the plotter's finished job, or resumes an interrupted one."""
+        job = plotter.job
+        if job is None:
+            return
+        if plotter.finished.is_set():
+            job.ended = time.perf_counter()
+            job.state = "failed" if plotter.buffer.error else "done"
+            plotter.job = None
+            self.log(f"{job} in {job.ended - job.started:.1f} s")
+        elif plotter.interrupted and plotter.connected:
+            resume = plotter.checkpoint
+            if resume is None:
+                job.state = "failed"
+                plotter.job = None
+                self.log(f"{job}: link lost with no checkpoint to resume from")
+                return
+            self.log(f"{job}: resuming at line {resume.resume}")
+            plotter.start(plotter.buffer, resume.resume, resume.restart(), resume)
+
+    def assign(self, job, plotter):
+        try:
+            buffer = self.buffer(job)
+        except Exception as e:
+            job.state = "failed"
+            self.log(f"{job}: {e}")
+            return
+        resume = None
+        if CHECKPOINTS:
+            # One directory per plotter: two of them can run the same job
+            directory = os.path.join(
+                checkpoint.CHECKPOINT_DIR, os.path.basename(plotter.port)
+            )
+            try:
+                resume = checkpoint.Checkpoint.create(
+                    job.key, job.path, buffer, directory
+                )
+            except OSError as e:
+                self.log(f"[WARN] Checkpoint: {e}")
+        job.state = "running"
+        job.plotter = plotter
+        job.started = time.perf_counter()
+        plotter.job = job
+        self.log(f"{job}")
+        plotter.start(buffer, checkpoint=resume)
+
+    def status(self):
+        """One line per plotter: its job and progress."""
+        lines = []
+        for plotter in self.plotters:
+            job = plotter.job
+            if not plotter.connected:
+                state = "offline"
+            elif job is None:
+                state = "idle"
+            else:
+                state = (
+                    f"#{job.number} {os.path.basename(job.path)}"
+                    f" {plotter.acked}/{len(plotter.buffer)},"
+                    f" {plotter.rate():.1f} lines/sec"
+                )
+            lines.append(f"{plotter.port}: {state}")
+        return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Plots a queue of files on several plotters at once"
+    )
+    parser.add_argument("files", nargs="+")
+    parser.add_argument(
+        "--port", action="append", dest="ports", help="repeat for each plotter"
+    )
+    parser.add_argument("--baud", type=int, default=BAUD)
+    parser.add_argument(
+        "--stream-mode", default=STREAM_MODE, choices=("ping-pong", "char-count")
+    )
+    parser.add_argument("--copies", type=int, default=1, help="plots of each file")
+    parser.add_argument(
+        "--simulate", type=int, metavar="N", help="plot to N firmware simulators"
+    )
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="simulated clock speed-up"
+    )
+    args = parser.parse_args()
+
+    ports = args.ports or PORTS
+    if args.simulate:
+        from simulator import Simulator
+
+        ports = [Simulator(args.speed).start_pty() for _ in range(args.simulate)]
+    fleet = Fleet(ports, args.baud, args.stream_mode)
+    failed = 0
+    for _ in range(args.copies):
+        for path in args.files:
+            try:
+                fleet.submit(path)
+            except OSError as e:
+                print(f"[Error] {path}: {e}")
+                failed += 1
+    started = time.perf_counter()
+    fleet.start()
+    try:
+        while not fleet.wait(STATUS_INTERVAL):
+            for line in fleet.status():
+                print(line)
+    except KeyboardInterrupt:
+        for plotter in fleet.plotters:
+            if plotter.uploading:
+                plotter.pause()
+        return 130
+    finally:
+        fleet.close()
+    failed += sum(job.state == "failed" for job in fleet.jobs)
+    print(
+        f"{len(fleet.jobs)} jobs on {len(ports)} plotters in"
+        f" {time.perf_counter() - started:.1f} s, {failed} failed"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
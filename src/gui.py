@@ -1,15 +1,19 @@
 import pygame
-import serial
 import time
 import threading
 import sys
-import tkinter as tk
-from tkinter import filedialog
 import os
-from svgpathtools import svg2paths, Line, CubicBezier, QuadraticBezier, Arc, Path
-import numpy as np
-import math
-import re
+
+import checkpoint
+import metrics
+import pipeline
+import uploader
+from compact import Compactor
+from jobcache import JobCache, job_key
+from path_store import PathLOD
+from path_view import PathView
+from simplify import Simplifier
+from tokenizer import tokenize
 
 # --- CONFIGURATION ---
 PORT = "/dev/ttyUSB0"
@@ -17,8 +21,19 @@ BAUD = 115200
 WINDOW_SIZE = (1000, 650)
 OFFSET = [250, 550]
 FIRMWARE_TIMEOUT = 3600.0
-WATCHDOG_THRESHOLD = 1.0
 ARC_RESOLUTION = 0.01
+ARC_TOLERANCE = None  # mm chord error; when set, overrides ARC_RESOLUTION
+ARC_MODE = "auto"  # "host", "firmware" or "auto" (see pipeline.ARC_MODE)
+OUTPUT_TEE = None  # e.g. "output.gcode" to keep a copy of what was streamed
+OPTIMIZE_TRAVEL = False  # reorder strokes to cut pen-up travel (loads whole file)
+SIMPLIFY_TOLERANCE = None  # mm, e.g. 0.02 to merge nearly collinear G1 moves
+COMPACT = True  # send each command in as few bytes as plan the same steps
+JOB_CACHE = True  # reuse preprocessed jobs from ~/.cache/arduino-plotter
+CHECKPOINTS = True  # keep a resume point for jobs the link drops mid-way
+RECONNECT_INTERVAL = 2.0  # s between attempts to reopen a lost port
+METRICS = False  # collect hot-path timings; F3 toggles the overlay
+METRICS_DUMP = None  # e.g. "metrics.csv" or "metrics.json", appended periodically
+STREAM_MODE = "ping-pong"  # or "char-count" to keep the firmware buffer full
 
 # --- COLORS ---
 COLOR_BG = (20, 20, 30)
@@ -36,223 +51,112 @@ COLOR_TRAVEL = (255, 50, 50)  # RED (Pen Up)
 COLOR_DRAW = (50, 255, 255)  # CYAN/BLUE (Pen Down)
 
 # --- GLOBAL STATE ---
-current_x = 0.0
-current_y = 0.0
-# Path points now store: (x, y, is_pen_down)
-path_segments = []
-is_connected = False
-serial_port = None
+# Recorded head positions: float32 x/y plus a pen-down bit per point, with
+# decimated copies for drawing when zoomed out
+path_store = PathLOD()
+path_view = None
 console_messages = []
 scale = 5.0
 
-upload_queue = []
-is_uploading = False
-upload_total = 0
-upload_current = 0
-upload_paused = False
-last_cmd_time = 0.0
-last_status_time = 0.0
-
-# Track "Virtual" State to color lines correctly
-virtual_pen_down = False
-
-
-# --- LINEARIZER ---
-def parse_coords(line):
-    coords = {}
-    for char in ["X", "Y", "Z", "I", "J", "F"]:
-        match = re.search(rf"{char}([-+]?[\d.]+)", line)
-        if match:
-            coords[char] = float(match.group(1))
-    return coords
-
-
-def linearize_arc(start_coords, cmd_coords, clockwise):
-    segments = []
-    x_start, y_start = start_coords.get("X", 0.0), start_coords.get("Y", 0.0)
-    i, j = cmd_coords.get("I", 0.0), cmd_coords.get("J", 0.0)
-    x_center, y_center = x_start + i, y_start + j
-    radius = math.sqrt(i**2 + j**2)
-    if radius < 0.001:
-        return []
-
-    angle_start = math.atan2(y_start - y_center, x_start - x_center)
-    x_end = cmd_coords.get("X", x_start)
-    y_end = cmd_coords.get("Y", y_start)
-    angle_end = math.atan2(y_end - y_center, x_end - x_center)
-
-    if clockwise:
-        if angle_end >= angle_start:
-            angle_end -= 2.0 * math.pi
-    else:
-        if angle_end <= angle_start:
-            angle_end += 2.0 * math.pi
-
-    arc_length = abs(angle_end - angle_start) * radius
-    num_segments = int(math.ceil(arc_length / ARC_RESOLUTION))
-    if num_segments < 1:
-        num_segments = 1
-
-    theta_step = (angle_end - angle_start) / num_segments
+# The job's preprocessing; the plotter streams from its buffer while a
+# producer thread appends to it
+upload_source = None
+upload_simplifier = None
+upload_compactor = None
+load_lock = threading.Lock()  # one file load at a time
+job_cache = JobCache() if JOB_CACHE else None
 
-    for k in range(1, num_segments + 1):
-        theta = angle_start + k * theta_step
-        nx = x_center + radius * math.cos(theta)
-        ny = y_center + radius * math.sin(theta)
-        segments.append(f"G1 X{nx:.4f} Y{ny:.4f}")
-    return segments
-
-
-def run_linearization(input_file, output_file):
-    log_message(f"Linearizing...")
-    try:
-        current_pos = {"X": 0.0, "Y": 0.0, "Z": 0.0}
-        with open(input_file, "r") as f_in, open(output_file, "w") as f_out:
-            for line in f_in:
-                line = line.strip()
-                if (
-                    not line
-                    or line.startswith(";")
-                    or line.startswith("(")
-                    or line.startswith("%")
-                ):
-                    f_out.write(line + "\n")
-                    continue
-                g_match = re.search(r"G(\d+)", line)
-                cmd_type = int(g_match.group(1)) if g_match else -1
-                coords = parse_coords(line)
-                if cmd_type == 2 or cmd_type == 3:
-                    new_lines = linearize_arc(
-                        current_pos, coords, clockwise=(cmd_type == 2)
-                    )
-                    for nl in new_lines:
-                        f_out.write(nl + "\n")
-                        seg_coords = parse_coords(nl)
-                        if "X" in seg_coords:
-                            current_pos["X"] = seg_coords["X"]
-                        if "Y" in seg_coords:
-                            current_pos["Y"] = seg_coords["Y"]
-                else:
-                    f_out.write(line + "\n")
-                    if "X" in coords:
-                        current_pos["X"] = coords["X"]
-                    if "Y" in coords:
-                        current_pos["Y"] = coords["Y"]
-                    if "Z" in coords:
-                        current_pos["Z"] = coords["Z"]
-        log_message("Linearization Done.")
-        return True
-    except Exception as e:
-        log_message(f"Linearize Error: {e}")
-        return False
+# Instrumentation
+stats = metrics.Metrics() if METRICS else metrics.NullMetrics()
+show_metrics = False
 
 
 # --- SERIAL LOGIC ---
-def send_next_command():
-    global upload_current, is_uploading, last_cmd_time, virtual_pen_down
-    if upload_current < len(upload_queue):
-        cmd = upload_queue[upload_current]
-
+class Plotter(uploader.Uploader):
+    """The plotter on PORT, echoing the job to the console and recording
+    the head's path for the view."""
+
+    def __init__(self, port, baud, stream_mode):
+        super().__init__(port, baud, stream_mode, log_message)
+        self.stats = stats
+        # Track "Virtual" State to color lines correctly
+        self.pen_down = False
+
+    def write_command(self, data):
+        index = self.current
+        super().write_command(data)
+        cmd = bytes(data[:-1]).decode()
         # --- TRACK PEN STATE FOR COLORS ---
+        block = tokenize(cmd)
         # We assume negative Z is pen down (cutting)
-        if "Z" in cmd:
-            z_match = re.search(r"Z([-+]?[\d.]+)", cmd)
-            if z_match:
-                z_val = float(z_match.group(1))
-                virtual_pen_down = z_val <= 0
+        if block.z is not None:
+            self.pen_down = block.z <= 0
         # Also check M3 (Down) / M5 (Up) just in case
-        if "M3" in cmd:
-            virtual_pen_down = True
-        if "M5" in cmd:
-            virtual_pen_down = False
+        if 3 in block.m:
+            self.pen_down = True
+        if 5 in block.m:
+            self.pen_down = False
         # ----------------------------------
+        if index % 10 == 0 or "G0" in cmd:
+            log_message(f"[{index}] {cmd}")
+
+    def handle_status(self, line):
+        super().handle_status(line)
+        # Only add point if moved significantly
+        last = path_store.last()
+        if not last or (abs(last[0] - self.x) > 0.1 or abs(last[1] - self.y) > 0.1):
+            # STORE (X, Y, COLOR_STATE)
+            path_store.append(self.x, self.y, self.pen_down)
+
+    def finish(self):
+        super().finish()
+        if upload_simplifier:
+            log_message(str(upload_simplifier))
+        if upload_compactor:
+            log_message(str(upload_compactor))
+
+    def interrupt(self):
+        if not super().interrupt():
+            return False
+        if self.checkpoint:
+            log_message("Type RESUME JOB once the link is back")
+        return True
 
-        if serial_port and is_connected:
-            serial_port.write(f"{cmd}\n".encode())
-            last_cmd_time = time.perf_counter()
-            if upload_current % 10 == 0 or "G0" in cmd:
-                log_message(f"[{upload_current}/{upload_total}] {cmd}")
-            upload_current += 1
-    else:
-        is_uploading = False
-        log_message("Upload Complete!")
 
+def produce_upload(buffer, lines, key):
+    """Producer thread: preprocess into buffer, then keep it in the job cache.
 
-def serial_worker():
-    global current_x, current_y, is_connected, serial_port
-    global is_uploading, upload_current, upload_queue, upload_paused
-    global last_cmd_time, last_status_time, path_segments, virtual_pen_down
+    Nothing holds the producer back: the buffer keeps the whole job anyway
+    (see CommandBuffer), and finishing early lets the ETA and the cache in.
+    """
+    buffer.fill(lines, plotter.notify)
+    if buffer.complete and not buffer.error:
+        estimate_upload(buffer)
+    if key and buffer.complete and not buffer.error:
+        try:
+            job_cache.store(key, buffer)
+        except OSError as e:
+            log_message(f"[WARN] Job cache: {e}")
 
-    try:
-        s = serial.Serial(PORT, BAUD, timeout=0.1)
-        s.write(b"\r\n\r\n")
-        time.sleep(2)
-        s.reset_input_buffer()
-        is_connected = True
-        serial_port = s
-        print(f"Connected to {PORT}")
-
-        while True:
-            if s.isOpen():
-                now = time.perf_counter()
-
-                # Heartbeat / Watchdog
-                if (now - last_status_time) > 0.5:
-                    s.write(b"?")
-                    last_status_time = now
-
-                while s.in_waiting:
-                    try:
-                        line = s.readline().decode("utf-8", errors="ignore").strip()
-                        if not line:
-                            continue
-
-                        if line.startswith("<"):
-                            if "MPos:" in line:
-                                content = line.strip("<>").split("|")
-                                for item in content:
-                                    if item.startswith("MPos:"):
-                                        coords = item.split(":")[1].split(",")
-                                        new_x = float(coords[0])
-                                        new_y = float(coords[1])
-
-                                        # Only add point if moved significantly
-                                        if not path_segments or (
-                                            abs(path_segments[-1][0] - new_x) > 0.1
-                                            or abs(path_segments[-1][1] - new_y) > 0.1
-                                        ):
-                                            # STORE (X, Y, COLOR_STATE)
-                                            path_segments.append(
-                                                (new_x, new_y, virtual_pen_down)
-                                            )
-                                            current_x, current_y = new_x, new_y
-
-                            if "Idle" in line and is_uploading and not upload_paused:
-                                log_message("[WARN] Watchdog: Recovering...")
-                                send_next_command()
-
-                        elif "ok" in line:
-                            if is_uploading and not upload_paused:
-                                send_next_command()
-
-                        elif line != "ok":
-                            pass
-
-                    except Exception as e:
-                        pass
-
-            time.sleep(0.005)
 
+def estimate_upload(buffer):
+    """Predicts the plot time of a complete job buffer for the ETA."""
+    import estimate
+
+    try:
+        result = estimate.estimate(buffer.lines(), BAUD, plotter.stream_mode)
     except Exception as e:
-        print(f"Serial Error: {e}")
-        is_connected = False
+        log_message(f"[WARN] Estimate: {e}")
+        return
+    with plotter.lock:
+        if buffer is not plotter.buffer:
+            return
+        plotter.estimate = result
+    log_message(str(result))
 
 
 def send_gcode(code):
-    global last_cmd_time
-    if serial_port and is_connected:
-        serial_port.write(f"{code}\n".encode())
-        last_cmd_time = time.perf_counter()
+    plotter.send(code)
 
 
 def log_message(msg):
@@ -262,12 +166,17 @@ def log_message(msg):
         console_messages.pop(0)
 
 
+plotter = Plotter(PORT, BAUD, STREAM_MODE)
+
+
 # --- GUI BOILERPLATE ---
 def open_file_dialog():
+    # Tk runs in a child process: it must own its main thread, and this
+    # process never has to import it
     import subprocess
 
     cmd = [
-        "python3",
+        sys.executable,
         "-c",
         "import tkinter as tk; from tkinter import filedialog; root = tk.Tk(); root.withdraw(); print(filedialog.askopenfilename())",
     ]
@@ -277,53 +186,157 @@ def open_file_dialog():
         return None
 
 
-def clean_gcode_line(line):
-    if ";" in line:
-        line = line.split(";")[0]
-    if "(" in line:
-        line = line.split("(")[0]
-    return line.strip()
+def preprocess_settings(file_path):
+    """Everything that changes the preprocessed stream, for the job cache key."""
+    return pipeline.job_settings(
+        file_path,
+        ARC_RESOLUTION,
+        ARC_TOLERANCE,
+        ARC_MODE,
+        OPTIMIZE_TRAVEL,
+        SIMPLIFY_TOLERANCE,
+        COMPACT,
+    )
 
 
-def load_file_handler():
-    global upload_queue, is_uploading, upload_total, upload_current, upload_paused, last_cmd_time
-    file_path = open_file_dialog()
+def load_file_handler(resume=None):
+    if not load_lock.acquire(blocking=False):
+        log_message("[WARN] Already loading a file")
+        return
+    try:
+        load_file(resume)
+    finally:
+        load_lock.release()
+
+
+def list_jobs():
+    """Logs the interrupted jobs RESUME JOB can pick up."""
+    jobs = checkpoint.list_checkpoints()
+    if not jobs:
+        log_message("No interrupted jobs")
+    for n, job in enumerate(jobs):
+        log_message(f"{n}: {job}")
+        job.close()
+
+
+def resume_job(number=0):
+    """Continues the n-th most recent interrupted job."""
+    jobs = checkpoint.list_checkpoints()
+    for job in jobs:
+        job.close()
+    if not 0 <= number < len(jobs):
+        log_message("[Error] No such interrupted job")
+        return
+    try:
+        job = checkpoint.Checkpoint.open(jobs[number].path, writable=True)
+    except (OSError, ValueError) as e:
+        log_message(f"Resume Error: {e}")
+        return
+    load_file_handler(job)
+
+
+def load_file(resume=None):
+    """Streams a file, or with resume (a Checkpoint) the rest of an interrupted job."""
+    global upload_source, upload_simplifier, upload_compactor
+    file_path = resume.source if resume else open_file_dialog()
     if not file_path:
         return
 
+    picked_time = time.perf_counter()
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    output_path = os.path.join(script_dir, "output.gcode")
+    tee_path = os.path.join(script_dir, OUTPUT_TEE) if OUTPUT_TEE else None
     log_message(f"Processing: {os.path.basename(file_path)}")
 
-    if not run_linearization(file_path, output_path):
-        log_message("Conversion Failed!")
-        return
-
-    commands = []
+    key = cached = None
+    simplifier = compactor = None
     try:
-        with open(output_path, "r") as f:
-            for line in f.readlines():
-                clean = clean_gcode_line(line)
-                if clean:
-                    commands.append(clean)
+        if job_cache or CHECKPOINTS:
+            key = job_key(file_path, preprocess_settings(file_path))
+        if resume and key != resume.key:
+            raise ValueError("the file or the settings changed since it stopped")
+        if job_cache:
+            cached = job_cache.get(key)
+        if cached is not None:
+            source = None
+            log_message(f"Cache hit: {len(cached)} commands")
+        else:
+            # SVG files are drawn straight from their curves
+            source = pipeline.open_source(file_path)
+            if isinstance(source, pipeline.CommandList):
+                log_message(f"SVG: {source.total} commands")
+            if OPTIMIZE_TRAVEL:
+                source, report = pipeline.optimized_source(
+                    source, ARC_RESOLUTION, ARC_TOLERANCE, ARC_MODE
+                )
+                log_message(str(report))
+            if SIMPLIFY_TOLERANCE:
+                simplifier = Simplifier(SIMPLIFY_TOLERANCE)
+            if COMPACT:
+                compactor = Compactor(BAUD)
     except Exception as e:
         log_message(f"Load Error: {e}")
+        if resume:
+            resume.close()
         return
 
-    if commands:
-        upload_queue = commands
-        upload_total = len(commands)
-        upload_current = 0
-        is_uploading = True
-        upload_paused = False
-        log_message(f"Ready: {upload_total} lines (Linearized).")
-        if serial_port and is_connected:
-            send_next_command()
-        else:
-            log_message("[Error] Not Connected!")
-            is_uploading = False
+    if not plotter.connected:
+        log_message("[Error] Not Connected!")
+        if resume:
+            resume.close()
+        return
+
+    from cmdbuffer import CommandBuffer
+
+    if plotter.buffer is not None:
+        plotter.buffer.cancel()
+    buffer = cached if cached is not None else CommandBuffer()
+    upload_source = source
+    upload_simplifier = simplifier
+    upload_compactor = compactor
+    job = None
+    preamble = []
+    if resume:
+        job = resume
+        resume.attach(buffer)
+        # Rebases the checkpoint before reports from the new firmware arrive
+        preamble = resume.restart()
+    elif CHECKPOINTS:
+        try:
+            job = checkpoint.Checkpoint.create(key, file_path, buffer)
+        except OSError as e:
+            log_message(f"[WARN] Checkpoint: {e}")
+    if cached is None:
+        # Preprocessing runs ahead on its own thread; sending starts with
+        # the first line it produces
+        lines = pipeline.upload_stream(
+            source,
+            ARC_RESOLUTION,
+            ARC_TOLERANCE,
+            tee_path,
+            simplifier,
+            ARC_MODE,
+            compactor,
+        )
+        threading.Thread(
+            target=produce_upload,
+            args=(buffer, lines, key if job_cache else None),
+            daemon=True,
+        ).start()
     else:
-        log_message("File empty.")
+        threading.Thread(target=estimate_upload, args=(buffer,), daemon=True).start()
+        if tee_path:
+            threading.Thread(
+                target=lambda: all(pipeline.tee(cached.lines(), tee_path)),
+                daemon=True,
+            ).start()
+    total = len(cached) if cached is not None else source.total
+    log_message(f"Streaming: {total} lines ({plotter.stream_mode}).")
+    if resume:
+        log_message(f"Resuming at line {resume.resume}")
+    plotter.start(buffer, resume.resume if resume else 0, preamble, job)
+    log_message(
+        f"First command after {(time.perf_counter() - picked_time) * 1000:.1f} ms"
+    )
 
 
 class Button:
@@ -370,22 +383,27 @@ def btn_home():
 
 
 def btn_clear():
-    path_segments.clear()
+    path_store.clear()
+    if path_view:
+        path_view.invalidate()
     log_message("Path Cleared")
 
 
 def btn_zero():
     send_gcode("G92 X0 Y0")
-    path_segments.clear()
+    path_store.clear()
+    if path_view:
+        path_view.invalidate()
     log_message("Zero Set")
 
 
 def btn_pause():
-    global upload_paused
-    if is_uploading:
-        upload_paused = not upload_paused
-        send_gcode("!" if upload_paused else "~")
-        log_message("Paused" if upload_paused else "Resumed")
+    if plotter.uploading:
+        if plotter.paused:
+            plotter.resume()
+        else:
+            plotter.pause()
+        log_message("Paused" if plotter.paused else "Resumed")
     else:
         send_gcode("!")
 
@@ -402,6 +420,33 @@ def btn_pen_down():
     send_gcode("M3")
 
 
+def btn_stream_mode():
+    mode = "char-count" if plotter.stream_mode == "ping-pong" else "ping-pong"
+    plotter.stream_mode = mode
+    log_message(f"Stream mode: {mode}")
+    plotter.pump()
+
+
+def toggle_metrics():
+    global show_metrics
+    if stats.enabled:
+        show_metrics = not show_metrics
+    else:
+        log_message("Metrics are off (METRICS = False)")
+
+
+def draw_metrics(screen, font):
+    """Overlay with the instrumentation, over the top of the plot view."""
+    rows = stats.lines()
+    if not rows:
+        return
+    panel = pygame.Surface((540, 8 + 16 * len(rows)), pygame.SRCALPHA)
+    panel.fill((0, 0, 0, 180))
+    for i, row in enumerate(rows):
+        panel.blit(font.render(row, True, COLOR_TEXT), (6, 4 + 16 * i))
+    screen.blit(panel, (245, 40))
+
+
 def btn_zoom_in():
     global scale
     scale = min(20.0, scale + 1.0)
@@ -421,6 +466,7 @@ def draw_pen(screen, x, y):
 
 
 def main():
+    global path_view
     pygame.init()
     screen = pygame.display.set_mode(WINDOW_SIZE)
     pygame.display.set_caption("Grbl Plotter Viz")
@@ -430,8 +476,17 @@ def main():
     zoom_font = pygame.font.SysFont("sans-serif", 24, bold=True)
     input_font = pygame.font.SysFont("monospace", 16)
 
-    t = threading.Thread(target=serial_worker, daemon=True)
+    path_view = PathView(
+        (240, 10, 550, 580), (15, 15, 20), COLOR_GRID, COLOR_DRAW, COLOR_TRAVEL
+    )
+
+    # Reading, writing and the status poll all run on the transport's loop
+    t = threading.Thread(
+        target=plotter.keep_connected, args=(RECONNECT_INTERVAL,), daemon=True
+    )
     t.start()
+    if METRICS_DUMP:
+        stats.start_dumping(METRICS_DUMP)
 
     buttons = [
         Button(820, 50, 160, 40, "LOAD FILE", btn_load),
@@ -442,6 +497,7 @@ def main():
         Button(905, 280, 75, 40, "RESUME", btn_resume),
         Button(820, 340, 75, 40, "PEN UP", btn_pen_up),
         Button(905, 340, 75, 40, "PEN DN", btn_pen_down),
+        Button(820, 400, 160, 40, "STREAM MODE", btn_stream_mode),
     ]
     zoom_buttons = [
         Button(740, 20, 40, 40, "+", btn_zoom_in, True),
@@ -451,6 +507,7 @@ def main():
     user_text = ""
     running = True
     while running:
+        frame_start = time.perf_counter()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
@@ -459,10 +516,19 @@ def main():
             for btn in zoom_buttons:
                 btn.handle_event(event)
             if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_RETURN:
+                if event.key == pygame.K_F3:
+                    toggle_metrics()
+                elif event.key == pygame.K_RETURN:
                     if user_text:
-                        if user_text.upper() == "LOAD":
+                        command = user_text.upper().split()
+                        if command == ["LOAD"]:
                             threading.Thread(target=load_file_handler).start()
+                        elif command == ["JOBS"]:
+                            list_jobs()
+                        elif command[:2] == ["RESUME", "JOB"]:
+                            number = command[2] if command[2:] else "0"
+                            number = int(number) if number.isdigit() else -1
+                            threading.Thread(target=resume_job, args=(number,)).start()
                         else:
                             send_gcode(user_text)
                             log_message(f"$ {user_text}")
@@ -484,65 +550,60 @@ def main():
         for btn in buttons:
             btn.draw(screen, btn_font)
 
-        status = (0, 255, 0) if is_connected else (255, 0, 0)
+        connected = plotter.connected
+        status = (0, 255, 0) if connected else (255, 0, 0)
         screen.blit(
-            font.render(f"CONN: {'OK' if is_connected else 'NO'}", True, status),
+            font.render(f"CONN: {'OK' if connected else 'NO'}", True, status),
             (820, 500),
         )
-        screen.blit(font.render(f"X: {current_x:.2f}", True, COLOR_TEXT), (820, 530))
-        screen.blit(font.render(f"Y: {current_y:.2f}", True, COLOR_TEXT), (820, 550))
+        screen.blit(font.render(f"X: {plotter.x:.2f}", True, COLOR_TEXT), (820, 530))
+        screen.blit(font.render(f"Y: {plotter.y:.2f}", True, COLOR_TEXT), (820, 550))
         screen.blit(font.render(f"Zoom: {scale:.1f}x", True, COLOR_TEXT), (820, 570))
+        screen.blit(
+            font.render(f"Mode: {plotter.stream_mode}", True, COLOR_TEXT), (820, 450)
+        )
+        if plotter.uploading:
+            screen.blit(
+                font.render(f"Rate: {plotter.rate():.1f} l/s", True, COLOR_TEXT),
+                (820, 470),
+            )
+            eta = plotter.eta()
+            if eta is not None:
+                import estimate  # loaded with the job that has an ETA
+
+                screen.blit(
+                    font.render(
+                        f"ETA: {estimate.format_duration(eta)}", True, COLOR_TEXT
+                    ),
+                    (820, 430),
+                )
 
         viz_rect = pygame.Rect(240, 10, 550, 580)
-        pygame.draw.rect(screen, (15, 15, 20), viz_rect)
         old_clip = screen.get_clip()
         screen.set_clip(viz_rect)
 
-        # Draw Grid
-        for i in range(0, 200, 10):
-            pygame.draw.line(
-                screen,
-                COLOR_GRID,
-                (OFFSET[0] + i * scale, 0),
-                (OFFSET[0] + i * scale, 600),
-                1,
-            )
-            pygame.draw.line(
-                screen,
-                COLOR_GRID,
-                (0, OFFSET[1] - i * scale),
-                (1000, OFFSET[1] - i * scale),
-                1,
-            )
-
-        # --- DRAW PATH WITH COLOR ---
-        if len(path_segments) > 1:
-            # We iterate through points and draw a line from prev to curr
-            # Optimization: Only draw last 3000 points to prevent lag if necessary
-            points_to_draw = path_segments  # [-3000:]
-
-            for i in range(1, len(points_to_draw)):
-                p1 = points_to_draw[i - 1]
-                p2 = points_to_draw[i]
-
-                # p = (x, y, is_down)
-                start_pos = (OFFSET[0] + p1[0] * scale, OFFSET[1] - p1[1] * scale)
-                end_pos = (OFFSET[0] + p2[0] * scale, OFFSET[1] - p2[1] * scale)
-
-                # Color based on destination state (p2)
-                col = COLOR_DRAW if p2[2] else COLOR_TRAVEL
-                pygame.draw.line(screen, col, start_pos, end_pos, 2)
+        # --- DRAW GRID + PATH WITH COLOR (cached layer, only new points) ---
+        drawn = path_view.draw(screen, path_store.select(scale), scale, OFFSET)
+        stats.observe("points_drawn", drawn)
 
+        head_x, head_y = plotter.head.position(frame_start)
         draw_pen(
             screen,
-            int(OFFSET[0] + current_x * scale),
-            int(OFFSET[1] - current_y * scale),
+            int(OFFSET[0] + head_x * scale),
+            int(OFFSET[1] - head_y * scale),
         )
         for btn in zoom_buttons:
             btn.draw(screen, zoom_font)
 
-        if is_uploading:
-            p = upload_current / max(1, upload_total)
+        if plotter.uploading:
+            if plotter.estimate is not None:
+                # Share of the predicted plot time, not of the lines
+                p = plotter.estimate.progress(plotter.acked)
+            else:
+                p = plotter.current / max(1, len(plotter.buffer))
+                if not plotter.buffer.complete and upload_source:
+                    # Still preprocessing: scale by how much of the file was read
+                    p *= upload_source.read / max(1, upload_source.total)
             pygame.draw.rect(screen, (0, 200, 0), (250, 20, 530 * p, 10))
 
         screen.set_clip(old_clip)
@@ -554,7 +615,16 @@ def main():
             input_font.render("> " + user_text, True, (255, 255, 255)), (20, 610)
         )
 
+        if stats.enabled:
+            stats.gauge("inflight_lines", len(plotter.inflight))
+            stats.gauge("inflight_bytes", plotter.inflight_bytes)
+            if plotter.buffer is not None:
+                stats.gauge("lines_buffered", len(plotter.buffer) - plotter.current)
+        if show_metrics:
+            draw_metrics(screen, font)
         pygame.display.flip()
+        # Work done this frame, without the wait for the next one
+        stats.observe("frame_time", time.perf_counter() - frame_start)
         clock.tick(60)
     pygame.quit()
 
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+
+# --- CONFIGURATION ---
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "arduino-plotter")
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_VERSION = 4  # bump when the preprocessing output changes for equal settings
+HASH_CHUNK = 1 << 20
+SUFFIX = ".cmd"
+
+
+def file_digest(path):
+    """SHA-256 of the file's bytes."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def job_key(path, settings):
+    """Cache key for path preprocessed with settings (a JSON-able dict)."""
+    h = hashlib.sha256(file_digest(path).encode())
+    h.update(json.dumps(settings, sort_keys=True).encode())
+    h.update(str(CACHE_VERSION).encode())
+    return h.hexdigest()
+
+
+class JobCache:
+    """Preprocessed jobs on disk, keyed by input hash and settings.
+
+    Entries are CommandBuffer files, saved through a temporary file and
+    renamed into place, so a half-written job never becomes a hit; a hit is
+    mapped rather than read. A hit bumps the entry's mtime; when the cache
+    grows past max_bytes the least recently used entries are deleted.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key):
+        """The cached job for key as a mapped CommandBuffer, or None on a miss."""
+        from cmdbuffer import CommandBuffer
+
+        path = self.path(key)
+        try:
+            buffer = CommandBuffer.open(path)
+            os.utime(path)
+        except (FileNotFoundError, ValueError, struct.error):
+            return None
+        return buffer
+
+    def store(self, key, buffer):
+        """Saves a complete buffer under key, then trims the cache."""
+        buffer.save(self.path(key))
+        self.evict()
+
+    def evict(self):
+        """Deletes least recently used entries until the cache fits max_bytes."""
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(SUFFIX):
+                    continue
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
@@ -0,0 +1,27 @@
+# --- FIRMWARE LIMITS ---
+# Host-side copy of the numbers baked into the Uno firmware (config.h,
+# parser.cpp, stepper.cpp). config.h is not part of this tree, so the values
+# below are the ones this plotter is built with; keep them in sync by hand.
+
+BAUD_RATE = 115200
+RX_BUFFER_SIZE = 64  # HardwareSerial receive ring on the ATmega328p
+LINE_BUFFER_SIZE = 64  # main.cpp line[], including the terminating 0
+PLANNER_BUFFER_SIZE = 16  # stepper.cpp ring, one slot is always kept free
+
+# --- MOTION ---
+STEPS_PER_MM_X = 80.0
+STEPS_PER_MM_Y = 80.0
+MAX_FEED_RATE = 2000.0  # mm/min, used for G0
+DEFAULT_FEED_RATE = 1000.0  # parser.cpp feed_rate before the first F word
+MIN_STEP_DELAY_US = 50  # stepper_plan_move speed cap
+STEP_PULSE_DELAY_US = 5
+STEP_OVERHEAD_US = 12  # stepper_run bookkeeping on top of the step pulse
+
+# --- PARSER ---
+ARC_TOLERANCE = 0.05  # mm
+MIN_ARC_SEGMENTS = 8
+MAX_ARC_SEGMENTS = 16  # declared, but handle_arc actually clamps at 32
+ARC_SEGMENT_CAP = 32
+ARC_MIN_RADIUS = 0.1  # smaller arcs become a straight move
+CORNER_ANGLE_THRESHOLD = 30.0  # degrees; sharper corners drain the planner
+CORNER_MIN_LENGTH = 0.1  # mm; shorter moves never trigger the corner stop
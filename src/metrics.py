@@ -0,0 +1,171 @@
+import csv
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# --- CONFIGURATION ---
+RECENT = 1024  # samples kept per series for percentiles
+DUMP_INTERVAL = 5.0  # s between dumps to the metrics file
+
+
+class Series:
+    """Running count/sum/min/max of one quantity, plus its recent samples."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.last = 0.0
+        self.recent = deque(maxlen=RECENT)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.last = value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.recent.append(value)
+
+    def summary(self):
+        recent = sorted(self.recent)
+        n = len(recent)
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": recent[n // 2] if n else 0.0,
+            "p99": recent[min(n - 1, n * 99 // 100)] if n else 0.0,
+            "max": self.max if self.count else 0.0,
+            "last": self.last,
+        }
+
+
+class Metrics:
+    """Counters, gauges and timing series shared by the GUI's threads.
+
+    observe() feeds a series (times are seconds), count() bumps a counter
+    and gauge() keeps the latest value of a level such as a queue depth.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+        self.counters = {}
+        self.gauges = {}
+        self.started = time.time()
+
+    def observe(self, name, value):
+        with self.lock:
+            series = self.series.get(name)
+            if series is None:
+                series = self.series[name] = Series()
+            series.add(value)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def snapshot(self):
+        """Everything collected so far, as plain JSON-able data."""
+        with self.lock:
+            return {
+                "time": time.time(),
+                "uptime": time.time() - self.started,
+                "series": {k: s.summary() for k, s in self.series.items()},
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+    def lines(self):
+        """Short human-readable rows for an on-screen overlay."""
+        snap = self.snapshot()
+        rows = []
+        for name, s in sorted(snap["series"].items()):
+            rows.append(
+                f"{name:<18} p50 {format_value(name, s['p50'])}"
+                f" p99 {format_value(name, s['p99'])}"
+                f" max {format_value(name, s['max'])}"
+            )
+        for name, value in sorted(snap["gauges"].items()):
+            rows.append(f"{name:<18} {value}")
+        for name, value in sorted(snap["counters"].items()):
+            rows.append(f"{name:<18} {value}")
+        return rows
+
+    # --- DUMPS ---
+    def dump(self, path):
+        """Appends a snapshot to path: one JSON object per line for .json,
+        one row per series/counter/gauge for .csv."""
+        snap = self.snapshot()
+        if path.endswith(".csv"):
+            new = not os.path.exists(path)
+            with open(path, "a", newline="") as f:
+                writer = csv.writer(f)
+                if new:
+                    writer.writerow(
+                        ["time", "name", "count", "mean", "p50", "p99", "max", "last"]
+                    )
+                for name, s in sorted(snap["series"].items()):
+                    writer.writerow(
+                        [f"{snap['time']:.3f}", name]
+                        + [s[k] for k in ("count", "mean", "p50", "p99", "max", "last")]
+                    )
+                for kind in ("counters", "gauges"):
+                    for name, value in sorted(snap[kind].items()):
+                        writer.writerow(
+                            [f"{snap['time']:.3f}", name, "", "", "", "", "", value]
+                        )
+        else:
+            with open(path, "a") as f:
+                f.write(json.dumps(snap) + "\n")
+
+    def start_dumping(self, path, interval=DUMP_INTERVAL):
+        """Dumps to path every interval seconds on a daemon thread."""
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.dump(path)
+                except OSError as e:
+                    print(f"Metrics dump failed: {e}")
+
+        threading.Thread(target=loop, daemon=True).start()
+
+
+class NullMetrics:
+    """Stands in for Metrics when instrumentation is off: every call is a no-op."""
+
+    enabled = False
+
+    def observe(self, name, value):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def gauge(self, name, value):
+        pass
+
+    def lines(self):
+        return []
+
+    def start_dumping(self, path, interval=DUMP_INTERVAL):
+        pass
+
+
+def format_value(name, value):
+    """Seconds as ms for the *_time series, anything else as is."""
+    if name.endswith("_time"):
+        return f"{value * 1000:7.2f}ms"
+    return f"{value:9.1f}"
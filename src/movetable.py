@@ -0,0 +1,209 @@
+import numpy as np
+
+import machine
+from checkpoint import ModalState
+from tokenizer import tokenize
+
+# --- CONFIGURATION ---
+HALF_TOLERANCE = 1e-9  # steps; increments this close to a half are replayed
+
+# Move kinds: the G code that drew the move
+TRAVEL, LINE, ARC_CW, ARC_CCW = 0, 1, 2, 3
+
+# One row per move the firmware makes. x0/y0 and x/y are where it starts and
+# ends in machine mm, as parser.cpp computes its target: G92 offsets and
+# G91 increments already applied, before the planner rounds to steps.
+MOVE = np.dtype(
+    [
+        ("kind", "i1"),
+        ("x0", "f8"),
+        ("y0", "f8"),
+        ("x", "f8"),
+        ("y", "f8"),
+        ("i", "f8"),  # arc centre, relative to the start
+        ("j", "f8"),
+        ("z", "f8"),  # parser.cpp ignores Z; the GUI draws Z <= 0 as pen down
+        ("feed", "f8"),  # mm/min in force, G0 included
+        ("pen", "?"),  # M3 in force (M3 on the move's own line counts)
+        ("absolute", "?"),  # G90 in force
+        ("offset_x", "f8"),  # G92 offsets in force: job mm = machine mm - offset
+        ("offset_y", "f8"),
+        ("line", "i8"),  # index of the source line
+    ]
+)
+
+
+def lround(values):
+    """C lround(): halves go away from zero."""
+    return (np.sign(values) * np.floor(np.abs(values) + 0.5)).astype(np.int64)
+
+
+def forward_fill(values, missing, initial):
+    """values with every missing entry replaced by the last one before it."""
+    last = np.maximum.accumulate(np.where(missing, -1, np.arange(len(values))))
+    return np.where(last >= 0, values[np.maximum(last, 0)], initial)
+
+
+def parse(lines):
+    """Tokenizes every line once into per-line columns; NaN or -1 when absent.
+
+    The last G code of each group on a line wins, as in parser.cpp.
+    """
+    n = len(lines)
+    motion = np.full(n, -1, np.int16)  # 0..3 or 92
+    distance = np.full(n, -1, np.int8)  # 1 for G90, 0 for G91
+    pen = np.full(n, -1, np.int8)  # 1 for M3, 0 for M5
+    words = np.full((n, 6), np.nan)  # X Y Z I J F
+    for k, line in enumerate(lines):
+        block = tokenize(line)
+        for g in block.g:
+            if g in (0, 1, 2, 3, 92):
+                motion[k] = g
+            elif g == 90:
+                distance[k] = 1
+            elif g == 91:
+                distance[k] = 0
+        for m in block.m:
+            if m == 3:
+                pen[k] = 1
+            elif m == 5:
+                pen[k] = 0
+        words[k] = (block.x, block.y, block.z, block.i, block.j, block.f)
+    return motion, distance, pen, words
+
+
+def resolve_axis(value, absolute, move, zero, steps_per_mm, target, position, offset):
+    """parser.cpp's targets along one axis, for every line.
+
+    value is the axis word (NaN when absent), move marks lines that move and
+    zero the G92 lines; target/position/offset are the state before the
+    first line. An absolute word lands at value + offset; an increment is
+    added to the planner's step rounded position, so a run of them is a
+    cumulative sum of whole steps from the last absolute move; a missing
+    word keeps the rounded position. Each G92 starts a new run with a new
+    offset. Returns the targets, the offsets in force, and the end state.
+    """
+    n = len(value)
+    targets = np.full(n, np.nan)
+    offsets = np.empty(n)
+    has = ~np.isnan(value)
+    word = np.where(has, value, 0.0)
+    steps = lround(position * steps_per_mm)
+    start = 0
+    for stop in [*np.flatnonzero(zero & has), n]:
+        run = np.flatnonzero(move[start:stop]) + start
+        offsets[start:stop] = offset
+        if len(run):
+            v = word[run]
+            absolute_move = has[run] & absolute[run]
+            relative = has[run] & ~absolute[run]
+            increments = np.where(relative, lround(v * steps_per_mm), 0)
+            anchor = np.maximum.accumulate(
+                np.where(absolute_move, np.arange(len(run)), -1)
+            )
+            landed = lround((v + offset) * steps_per_mm)
+            total = np.cumsum(increments)
+            base = np.where(anchor >= 0, landed[anchor] - total[anchor], steps)
+            after = base + total
+
+            # lround(p + d) is p + lround(d) except at exact halves, where
+            # the sign of p decides; those few are replayed one at a time
+            fraction = np.abs(v * steps_per_mm) % 1.0
+            for k in np.flatnonzero(
+                relative & (np.abs(fraction - 0.5) < HALF_TOLERANCE)
+            ):
+                before = after[k - 1] if k else steps
+                exact = int(lround((before / steps_per_mm + v[k]) * steps_per_mm))
+                if exact - before != increments[k]:
+                    later = np.flatnonzero(absolute_move[k + 1 :])
+                    end = k + 1 + later[0] if len(later) else len(run)
+                    after[k:end] += exact - before - increments[k]
+
+            before = np.concatenate(([steps], after[:-1]))
+            targets[run] = np.where(
+                absolute_move, v + offset, before / steps_per_mm + v
+            )
+            steps = int(after[-1])
+            target = targets[run[-1]]
+        if stop < n:
+            # G92: the head's rounded position is now value in job coordinates
+            offset = steps / steps_per_mm - value[stop]
+            offsets[stop] = offset
+        start = stop + 1
+    return targets, offsets, (target, steps / steps_per_mm, offset)
+
+
+def compile_moves(lines, state=None, first_line=0):
+    """Compiles lines into a MOVE table, resolving the modal state with NumPy.
+
+    state (a checkpoint.ModalState, fresh if None) is where the lines
+    start, and is left where they end, so a long program can be compiled a
+    batch at a time. first_line numbers the batch's lines in the line column.
+    """
+    state = state or ModalState()
+    n = len(lines)
+    if not n:
+        return np.zeros(0, MOVE)
+    motion, distance, pen, words = parse(lines)
+    x, y, z, i, j, f = words.T
+
+    # G92 applies to its own line only; the motion mode goes back to none
+    after = forward_fill(
+        np.where(motion == 92, -1, motion), motion < 0, state.motion_mode
+    )
+    before = np.concatenate(([state.motion_mode], after[:-1]))
+    mode = np.where(motion >= 0, motion, before)
+    absolute = forward_fill(distance == 1, distance < 0, state.absolute)
+    pens = forward_fill(pen == 1, pen < 0, state.pen)
+    feeds = forward_fill(f, np.isnan(f), state.feed_rate)
+    zs = forward_fill(z, np.isnan(z), state.z)
+    straight = (mode == 0) | (mode == 1)
+    move = (straight & ~(np.isnan(x) & np.isnan(y))) | (mode == 2) | (mode == 3)
+    zero = mode == 92
+    x0, y0 = state.target_x, state.target_y
+
+    xs, offset_x, (state.target_x, state.x, state.offset_x) = resolve_axis(
+        x,
+        absolute,
+        move,
+        zero,
+        machine.STEPS_PER_MM_X,
+        state.target_x,
+        state.x,
+        state.offset_x,
+    )
+    ys, offset_y, (state.target_y, state.y, state.offset_y) = resolve_axis(
+        y,
+        absolute,
+        move,
+        zero,
+        machine.STEPS_PER_MM_Y,
+        state.target_y,
+        state.y,
+        state.offset_y,
+    )
+
+    rows = np.flatnonzero(move)
+    table = np.zeros(len(rows), MOVE)
+    table["kind"] = mode[rows]
+    table["x"] = xs[rows]
+    table["y"] = ys[rows]
+    if len(rows):
+        table["x0"] = np.concatenate(([x0], table["x"][:-1]))
+        table["y0"] = np.concatenate(([y0], table["y"][:-1]))
+    table["i"] = np.nan_to_num(i[rows])
+    table["j"] = np.nan_to_num(j[rows])
+    table["z"] = zs[rows]
+    table["feed"] = feeds[rows]
+    table["pen"] = pens[rows]
+    table["absolute"] = absolute[rows]
+    table["offset_x"] = offset_x[rows]
+    table["offset_y"] = offset_y[rows]
+    table["line"] = rows + first_line
+
+    state.motion_mode = int(after[-1])
+    state.absolute = bool(absolute[-1])
+    state.pen = bool(pens[-1])
+    state.feed_rate = float(feeds[-1])
+    state.z = float(zs[-1])
+    return table
@@ -0,0 +1,458 @@
+import math
+
+import numpy as np
+
+import machine
+from tokenizer import tokenize
+
+# --- CONFIGURATION ---
+TWO_OPT_WINDOW = 64  # strokes looked ahead by each 2-opt move
+TWO_OPT_PASSES = 4
+BRUTE_FORCE_BELOW = 256  # remaining strokes at which NN stops using the grid
+TRAVEL_FORMAT = "G0 X%.4f Y%.4f"
+MOVE_FORMAT = "G%d X%.4f Y%.4f"
+NEUTRAL_G = {0, 1, 2, 3, 21, 90}  # codes that never stop strokes from being reordered
+NEUTRAL_M = {3, 5}
+
+
+class Stroke:
+    """One pen-down run of commands, from the pen-down line to the last move."""
+
+    __slots__ = ("lines", "start", "end", "entry", "exit", "moves", "reversible")
+
+    def __init__(self, start, entry):
+        self.lines = []
+        self.start = start
+        self.end = start
+        self.entry = entry  # (motion mode, feed) in effect before the stroke
+        self.exit = entry
+        self.moves = 0
+        self.reversible = True
+
+
+class Command:
+    """A line outside any stroke, with the position and state after it."""
+
+    __slots__ = ("line", "kind", "pos", "state", "block")
+
+    def __init__(self, line, kind, pos, state, block):
+        self.line = line
+        self.kind = kind  # "travel", "lift" or "other"
+        self.pos = pos
+        self.state = state
+        self.block = block
+
+
+class TravelReport:
+    """What the optimizer did, for the log."""
+
+    def __init__(self):
+        self.strokes = 0
+        self.reversed = 0
+        self.travel_before = 0.0
+        self.travel_after = 0.0
+        self.skipped = None
+
+    @property
+    def time_saved(self):
+        """Seconds of rapid travel removed, at the firmware's G0 feed."""
+        return (self.travel_before - self.travel_after) / machine.MAX_FEED_RATE * 60.0
+
+    def __str__(self):
+        if self.skipped:
+            return f"Travel optimizer skipped: {self.skipped}"
+        return (
+            f"Travel: {self.strokes} strokes ({self.reversed} reversed), "
+            f"{self.travel_before:.0f} -> {self.travel_after:.0f} mm, "
+            f"~{self.time_saved:.1f}s saved"
+        )
+
+
+# --- PARSING ---
+def next_state(state, block):
+    mode, feed = state
+    for g in block.g:
+        if g in (0, 1, 2, 3):
+            mode = g
+    if block.f is not None:
+        feed = block.f
+    return mode, feed
+
+
+def split_program(commands):
+    """Splits commands into Stroke and Command items.
+
+    The pen model is the GUI's: Z <= 0 or M3 puts it down, Z > 0 or M5
+    lifts it. Returns None when the program uses G91 or G92, whose
+    coordinates depend on the order they run in.
+    """
+    items = []
+    x = y = 0.0
+    pen = False
+    state = (None, None)
+    stroke = None
+    for line in commands:
+        block = tokenize(line)
+        if 91 in block.g or 92 in block.g:
+            return None
+        before, pos_before = state, (x, y)
+        state = next_state(state, block)
+        moved = block.x is not None or block.y is not None
+        if block.x is not None:
+            x = block.x
+        if block.y is not None:
+            y = block.y
+        down = pen
+        if block.z is not None:
+            down = block.z <= 0
+        if 3 in block.m:
+            down = True
+        if 5 in block.m:
+            down = False
+        linear = set(block.g) <= {0, 1} and not block.m
+        neutral = set(block.g) <= NEUTRAL_G and set(block.m) <= NEUTRAL_M
+
+        if stroke is not None and down:
+            stroke.lines.append(line)
+            if not neutral:
+                stroke.reversible = None  # Pinned in place
+            elif not (moved and linear) and stroke.reversible:
+                stroke.reversible = False
+            stroke.moves += moved
+            stroke.end, stroke.exit = (x, y), state
+            pen = down
+            continue
+
+        if stroke is not None:
+            # The pen came up: close the stroke before looking at this line
+            close_stroke(items, stroke)
+            stroke = None
+
+        if down and not pen:
+            stroke = Stroke(pos_before, before)
+            stroke.lines.append(line)
+            # A pen-down line that also moves can't be replayed backwards
+            stroke.reversible = (not moved) if neutral else None
+            stroke.moves += moved
+            stroke.end, stroke.exit = (x, y), state
+        else:
+            if moved and linear and block.z is None and not down:
+                kind = "travel"
+            elif not moved and linear and not down:
+                kind = "lift"
+            else:
+                kind = "other"
+            items.append(Command(line, kind, (x, y), state, block))
+        pen = down
+
+    if stroke is not None:
+        stroke.reversible = None  # Never lifted; leave the ending alone
+        close_stroke(items, stroke)
+    return items
+
+
+def close_stroke(items, stroke):
+    if stroke.moves == 0:
+        # Pen went down and up without drawing: keep those lines where they are
+        for line in stroke.lines:
+            items.append(Command(line, "other", stroke.end, stroke.exit, None))
+    else:
+        items.append(stroke)
+
+
+def find_groups(items):
+    """Yields (first, last) item indices of runs of reorderable strokes.
+
+    Strokes in a group are separated only by lifts and pen-up travel, so
+    any order of them draws the same picture.
+    """
+    first = last = None
+    gap_pure = True
+    for k, item in enumerate(items):
+        if isinstance(item, Stroke):
+            if item.reversible is None:
+                if first is not None and last > first:
+                    yield first, last
+                first = last = None
+            elif first is not None and gap_pure:
+                last = k
+            else:
+                if first is not None and last > first:
+                    yield first, last
+                first = last = k
+            gap_pure = True
+        elif item.kind == "other":
+            gap_pure = False
+    if first is not None and last > first:
+        yield first, last
+
+
+# --- ORDERING ---
+def nearest_neighbour(origin, starts, ends, reversible):
+    """Greedy tour: always draw the unvisited stroke whose nearer end is closest.
+
+    Candidates come from a uniform grid over the stroke end points; once
+    few strokes are left, a vectorized scan over them is cheaper.
+    """
+    n = len(starts)
+    points = np.concatenate((starts, ends[reversible]))
+    owner = np.concatenate((np.arange(n), np.flatnonzero(reversible)))
+    flip = np.concatenate((np.zeros(n, bool), np.ones(reversible.sum(), bool)))
+
+    lo = points.min(axis=0)
+    span = float(max(np.ptp(points, axis=0).max(), 1e-6))
+    cell = span / max(1.0, math.sqrt(n))
+    keys = np.floor((points - lo) / cell).astype(np.int64)
+    grid = {}
+    for p, (cx, cy) in enumerate(keys.tolist()):
+        grid.setdefault((cx, cy), []).append(p)
+    max_ring = int(keys.max()) + 1
+
+    visited = np.zeros(n, bool)
+    remaining = n
+    order = np.empty(n, np.int64)
+    flipped = np.empty(n, bool)
+    pos = np.asarray(origin, np.float64)
+    for step in range(n):
+        best = None
+        if remaining > BRUTE_FORCE_BELOW:
+            cx, cy = np.floor((pos - lo) / cell).astype(np.int64).tolist()
+            best_d = math.inf
+            for r in range(max_ring + abs(cx) + abs(cy) + 1):
+                for key in ring(cx, cy, r):
+                    bucket = grid.get(key)
+                    if not bucket:
+                        continue
+                    live = [p for p in bucket if not visited[owner[p]]]
+                    if len(live) != len(bucket):
+                        grid[key] = live
+                    for p in live:
+                        d = math.hypot(points[p, 0] - pos[0], points[p, 1] - pos[1])
+                        if d < best_d:
+                            best, best_d = p, d
+                # Everything beyond ring r is at least r cells away
+                if best is not None and best_d <= r * cell:
+                    break
+        if best is None:
+            live = np.flatnonzero(~visited[owner])
+            d = np.hypot(*(points[live] - pos).T)
+            best = live[np.argmin(d)]
+        s = owner[best]
+        visited[s] = True
+        remaining -= 1
+        order[step] = s
+        flipped[step] = flip[best]
+        pos = starts[s] if flip[best] else ends[s]
+    return order, flipped
+
+
+def ring(cx, cy, r):
+    """Grid cells at Chebyshev distance r from (cx, cy)."""
+    if r == 0:
+        yield cx, cy
+        return
+    for dx in range(-r, r + 1):
+        yield cx + dx, cy - r
+        yield cx + dx, cy + r
+    for dy in range(-r + 1, r):
+        yield cx - r, cy + dy
+        yield cx + r, cy + dy
+
+
+def two_opt(origin, order, flipped, starts, ends, reversible, window, passes):
+    """Windowed 2-opt: reverse a run of strokes whenever that shortens travel.
+
+    Reversing positions i..j draws them in the opposite order and each one
+    backwards, so only runs of reversible strokes qualify.
+    """
+    n = len(order)
+    a = np.where(flipped[:, None], ends[order], starts[order])  # entry points
+    b = np.where(flipped[:, None], starts[order], ends[order])  # exit points
+    ok = reversible[order]
+    origin = np.asarray(origin, np.float64)
+    for _ in range(passes):
+        improved = False
+        for i in range(n):
+            j_end = min(n, i + window)
+            allowed = np.logical_and.accumulate(ok[i:j_end])
+            if not allowed[0]:
+                continue
+            prev = origin if i == 0 else b[i - 1]
+            cj = b[i:j_end]
+            old = np.hypot(*(prev - a[i])) + np.zeros(j_end - i)
+            new = np.hypot(*(prev - cj).T)
+            # The stroke after j, if any, is entered from a different point
+            nxt = a[i + 1 : j_end + 1]
+            m = len(nxt)
+            old[:m] += np.hypot(*(cj[:m] - nxt).T)
+            new[:m] += np.hypot(*(a[i] - nxt).T)
+            gain = np.where(allowed, old - new, 0.0)
+            k = int(np.argmax(gain))
+            if gain[k] > 1e-9:
+                j = i + k + 1
+                a[i:j], b[i:j] = b[i:j][::-1].copy(), a[i:j][::-1].copy()
+                order[i:j] = order[i:j][::-1].copy()
+                flipped[i:j] = ~flipped[i:j][::-1]
+                ok[i:j] = ok[i:j][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return order, flipped
+
+
+def travel_length(origin, entries, exits):
+    hops = np.concatenate(([origin], exits[:-1])) - entries
+    return float(np.hypot(*hops.T).sum())
+
+
+# --- EMITTING ---
+def restore_state(out, state, target):
+    """Appends a line that puts the modal mode/feed back to target, if needed."""
+    words = []
+    if target[0] is not None and target[0] != state[0]:
+        words.append("G%d" % target[0])
+    if target[1] is not None and target[1] != state[1]:
+        words.append("F%g" % target[1])
+    if words:
+        out.append(" ".join(words))
+    return (
+        target[0] if target[0] is not None else state[0],
+        target[1] if target[1] is not None else state[1],
+    )
+
+
+def reversed_lines(stroke):
+    """The stroke drawn from its end back to its start."""
+    pen_line, moves = stroke.lines[0], stroke.lines[1:]
+    after_pen = next_state(stroke.entry, tokenize(pen_line))
+    state = after_pen
+    points = [stroke.start]
+    segments = []  # (mode, feed) each move was drawn with
+    x, y = stroke.start
+    for line in moves:
+        block = tokenize(line)
+        state = next_state(state, block)
+        x = block.x if block.x is not None else x
+        y = block.y if block.y is not None else y
+        points.append((x, y))
+        segments.append(state)
+
+    lines = [pen_line]
+    current = after_pen
+    for k in range(len(segments) - 1, -1, -1):
+        mode, feed = segments[k]
+        line = MOVE_FORMAT % ((mode,) + points[k])
+        if feed is not None and feed != current[1]:
+            line += " F%g" % feed
+        lines.append(line)
+        current = (mode, feed if feed is not None else current[1])
+    return lines, current
+
+
+def emit_group(out, items, first, last, report, window, passes):
+    """Appends the reordered strokes of items[first..last] to out."""
+    strokes = [item for item in items[first : last + 1] if isinstance(item, Stroke)]
+    lift = next(
+        (
+            c.line
+            for c in items[first:last]
+            if isinstance(c, Command) and c.kind == "lift"
+        ),
+        None,
+    )
+
+    # Pen-up travel leading into the group is replaced by our own
+    k = first - 1
+    while k >= 0 and isinstance(items[k], Command) and items[k].kind == "travel":
+        k -= 1
+    while out and k < first - 1:
+        out.pop()
+        k += 1
+    lead = items[k] if k >= 0 else None
+    origin = lead.pos if lead is not None else (0.0, 0.0)
+    state = lead.state if lead is not None else (None, None)
+
+    starts = np.array([s.start for s in strokes], np.float64)
+    ends = np.array([s.end for s in strokes], np.float64)
+    reversible = np.array([bool(s.reversible) for s in strokes])
+    report.travel_before += travel_length(origin, starts, ends)
+
+    order, flipped = nearest_neighbour(origin, starts, ends, reversible)
+    order, flipped = two_opt(
+        origin, order, flipped, starts, ends, reversible, window, passes
+    )
+    entries = np.where(flipped[:, None], ends[order], starts[order])
+    exits = np.where(flipped[:, None], starts[order], ends[order])
+    report.travel_after += travel_length(origin, entries, exits)
+    report.strokes += len(strokes)
+    report.reversed += int(flipped.sum())
+
+    for step, (s, flip) in enumerate(zip(order.tolist(), flipped.tolist())):
+        stroke = strokes[s]
+        if step > 0 and lift is not None:
+            out.append(lift)
+            state = next_state(state, tokenize(lift))
+        out.append(TRAVEL_FORMAT % tuple(entries[step]))
+        state = (0, state[1])
+        state = restore_state(out, state, stroke.entry)
+        if flip:
+            lines, state = reversed_lines(stroke)
+            out.extend(lines)
+        else:
+            out.extend(stroke.lines)
+            state = stroke.exit
+    # Whatever follows the group expects the original last stroke's state
+    restore_state(out, state, strokes[-1].exit)
+
+
+def trailing_needs_position(items, last):
+    """True when the line after a group moves only one axis (or none at all)."""
+    for item in items[last + 1 :]:
+        if isinstance(item, Stroke):
+            return True
+        block = item.block
+        if block is None:
+            continue
+        if block.x is not None or block.y is not None:
+            return block.x is None or block.y is None
+    return False
+
+
+def optimize_travel(commands, window=TWO_OPT_WINDOW, passes=TWO_OPT_PASSES):
+    """Reorders (and reverses) strokes to shorten pen-up travel.
+
+    Takes cleaned commands and returns (commands, TravelReport). Lines
+    that are not strokes or plain pen-up travel stay where they were.
+    """
+    commands = list(commands)
+    report = TravelReport()
+    items = split_program(commands)
+    if items is None:
+        report.skipped = "G91/G92 in program"
+        return commands, report
+
+    groups = [
+        (first, last)
+        for first, last in find_groups(items)
+        if not trailing_needs_position(items, last)
+    ]
+    if not groups:
+        report.skipped = "nothing to reorder"
+        return commands, report
+
+    out = []
+    k = 0
+    for first, last in groups:
+        for item in items[k:first]:
+            out.extend(item.lines if isinstance(item, Stroke) else (item.line,))
+        emit_group(out, items, first, last, report, window, passes)
+        k = last + 1
+    for item in items[k:]:
+        out.extend(item.lines if isinstance(item, Stroke) else (item.line,))
+
+    if report.travel_after >= report.travel_before:
+        # Already as good as we can make it; don't touch the file
+        report.travel_after = report.travel_before
+        report.reversed = 0
+        return commands, report
+    return out, report
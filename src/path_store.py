@@ -0,0 +1,129 @@
+import threading
+
+import numpy as np
+
+# --- CONFIGURATION ---
+CHUNK_SIZE = 1 << 16  # points per chunk (512 KB of float32 x/y + 8 KB of pen bits)
+LOD_CELLS = (0.2, 0.5, 1.0)  # mm grid of each decimated level, finest first
+
+
+class PathStore:
+    """Append-only telemetry path: float32 x/y columns plus a packed pen bitmap.
+
+    Points live in fixed-size chunks, so growing never copies what is already
+    stored and a chunk can be handed to the renderer as a NumPy view.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.xy_chunks = []
+        self.pen_chunks = []
+        self.length = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.length
+
+    def append(self, x, y, pen_down):
+        with self.lock:
+            i = self.length % self.chunk_size
+            if i == 0:
+                self.xy_chunks.append(np.empty((self.chunk_size, 2), np.float32))
+                self.pen_chunks.append(np.zeros(self.chunk_size // 8 + 1, np.uint8))
+            self.xy_chunks[-1][i] = (x, y)
+            if pen_down:
+                self.pen_chunks[-1][i >> 3] |= 1 << (i & 7)
+            # Publish last, so readers never see a half-written point
+            self.length += 1
+
+    def clear(self):
+        with self.lock:
+            self.xy_chunks = []
+            self.pen_chunks = []
+            self.length = 0
+
+    def last(self):
+        """(x, y, pen_down) of the newest point, or None when empty."""
+        with self.lock:
+            if self.length == 0:
+                return None
+            return self.point(self.length - 1)
+
+    def point(self, index):
+        c, i = divmod(index, self.chunk_size)
+        x, y = self.xy_chunks[c][i]
+        pen = bool(self.pen_chunks[c][i >> 3] & (1 << (i & 7)))
+        return float(x), float(y), pen
+
+    def views(self, start=0, stop=None):
+        """Yields (xy, pen) per chunk for points start..stop.
+
+        xy is a zero-copy (n, 2) float32 view; pen is a bool array unpacked
+        from the bitmap.
+        """
+        with self.lock:
+            length, xy_chunks, pen_chunks = self.length, self.xy_chunks, self.pen_chunks
+        stop = length if stop is None else min(stop, length)
+        while start < stop:
+            c, i = divmod(start, self.chunk_size)
+            j = min(self.chunk_size, i + stop - start)
+            # Only unpack the bytes covering i..j
+            b = i >> 3
+            bits = np.unpackbits(pen_chunks[c][b : (j >> 3) + 1], bitorder="little")
+            yield xy_chunks[c][i:j], bits[i - 8 * b : j - 8 * b].astype(bool)
+            start += j - i
+
+    @property
+    def nbytes(self):
+        return sum(c.nbytes for c in self.xy_chunks) + sum(
+            c.nbytes for c in self.pen_chunks
+        )
+
+
+class PathLOD:
+    """A full-resolution PathStore plus pixel-snapped decimated copies of it.
+
+    Level k keeps a point only when it lands in a different cell of a
+    LOD_CELLS[k] mm grid than the last point it kept, or when the pen state
+    changes. The levels are maintained as points arrive, so the renderer can
+    pick the coarsest one whose cells are still smaller than a pixel.
+    """
+
+    def __init__(self, cells=LOD_CELLS, chunk_size=CHUNK_SIZE):
+        self.base = PathStore(chunk_size)
+        self.cells = cells
+        self.levels = [PathStore(chunk_size) for _ in cells]
+        self.keys = [None] * len(cells)
+
+    def __len__(self):
+        return len(self.base)
+
+    def append(self, x, y, pen_down):
+        self.base.append(x, y, pen_down)
+        for k, cell in enumerate(self.cells):
+            key = (int(x // cell), int(y // cell), pen_down)
+            if key != self.keys[k]:
+                self.keys[k] = key
+                self.levels[k].append(x, y, pen_down)
+
+    def clear(self):
+        self.base.clear()
+        for level in self.levels:
+            level.clear()
+        self.keys = [None] * len(self.cells)
+
+    def last(self):
+        return self.base.last()
+
+    def select(self, scale):
+        """Coarsest store whose cells are no bigger than one pixel at scale."""
+        pixel_mm = 1.0 / scale
+        best = self.base
+        for cell, level in zip(self.cells, self.levels):
+            if cell <= pixel_mm:
+                best = level
+        return best
+
+    @property
+    def nbytes(self):
+        return self.base.nbytes + sum(level.nbytes for level in self.levels)
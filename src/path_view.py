@@ -0,0 +1,90 @@
+import numpy as np
+import pygame
+
+
+class PathView:
+    """Off-screen layer holding the grid and the path drawn so far.
+
+    Each frame only the points that arrived since the last frame are stroked
+    onto the layer, which is then blitted in one go. The layer is rebuilt
+    from scratch only when the zoom, the offset or the path itself is reset.
+    """
+
+    def __init__(self, rect, bg, grid, draw, travel, width=2):
+        self.rect = pygame.Rect(rect)
+        self.surface = pygame.Surface(self.rect.size)
+        self.colors = {"bg": bg, "grid": grid, True: draw, False: travel}
+        self.width = width
+        self.view = None
+        self.drawn = 0
+
+    def invalidate(self):
+        self.view = None
+
+    def to_screen(self, x, y):
+        """Machine mm -> layer pixel for the current view."""
+        scale, ox, oy = self.view
+        return (ox + x * scale, oy - y * scale)
+
+    def redraw(self, scale, offset):
+        self.view = (scale, offset[0] - self.rect.x, offset[1] - self.rect.y)
+        self.drawn = 0
+        _, ox, oy = self.view
+        w, h = self.rect.size
+        self.surface.fill(self.colors["bg"])
+        for i in range(0, 200, 10):
+            pygame.draw.line(
+                self.surface,
+                self.colors["grid"],
+                (ox + i * scale, 0),
+                (ox + i * scale, h),
+            )
+            pygame.draw.line(
+                self.surface,
+                self.colors["grid"],
+                (0, oy - i * scale),
+                (w, oy - i * scale),
+            )
+
+    def extend(self, store):
+        """Strokes the points added since the last call; runs of the same pen
+        state are one draw call. Returns how many points were new."""
+        n = len(store)
+        if n < 2 or n <= self.drawn:
+            return 0
+        scale, ox, oy = self.view
+        # Start one point back so the new run joins the old one
+        prev = None
+        for xy, pen in store.views(max(0, self.drawn - 1), n):
+            sx = ox + xy[:, 0] * scale
+            sy = oy - xy[:, 1] * scale
+            if prev is not None:
+                sx = np.concatenate(([prev[0]], sx))
+                sy = np.concatenate(([prev[1]], sy))
+                pen = np.concatenate(([prev[2]], pen))
+            prev = (sx[-1], sy[-1], pen[-1])
+            if len(sx) < 2:
+                continue
+            # Segment k ends at point k and takes that point's color
+            dest = pen[1:]
+            cuts = np.flatnonzero(dest[1:] != dest[:-1]) + 1
+            bounds = np.concatenate(([0], cuts, [len(dest)]))
+            points = np.column_stack((sx, sy)).tolist()
+            for a, b in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+                pygame.draw.lines(
+                    self.surface,
+                    self.colors[bool(dest[a])],
+                    False,
+                    points[a : b + 1],
+                    self.width,
+                )
+        start, self.drawn = self.drawn, n
+        return n - start
+
+    def draw(self, screen, store, scale, offset):
+        view = (scale, offset[0] - self.rect.x, offset[1] - self.rect.y)
+        if view != self.view or len(store) < self.drawn:
+            self.redraw(scale, offset)
+        drawn = self.extend(store)
+        screen.blit(self.surface, self.rect.topleft)
+        return drawn
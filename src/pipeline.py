@@ -0,0 +1,437 @@
+import copy
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import machine
+from checkpoint import ModalState
+from tokenizer import strip_comment, tokenize
+
+# --- CONFIGURATION ---
+ARC_RESOLUTION = 0.01  # mm per segment
+ARC_TOLERANCE = None  # mm chord error; when set, overrides ARC_RESOLUTION
+ARC_MODE = "host"  # "host" linearizes every arc, "firmware" sends G2/G3 as is,
+# "auto" sends the arcs the firmware can draw within ARC_MAX_ERROR
+ARC_MODES = ("host", "firmware", "auto")
+ARC_MAX_ERROR = 0.1  # mm; a bit more than parser.cpp's own ARC_TOLERANCE target
+COUNT_CHUNK = 1 << 20  # bytes read at a time when counting lines
+PARALLEL_WORKERS = os.cpu_count() or 1  # processes linearizing large files
+PARALLEL_MIN_LINES = 20000  # smaller files aren't worth starting processes for
+CHUNK_LINES = 4096  # raw lines per chunk handed to a worker, at least
+LINEARIZE_BATCH = 512  # lines compiled into one move table while linearizing
+# G90/G91/G92, the only lines split_chunks() has to look into
+MODE_RE = re.compile(r"G\s*0*9[012]", re.IGNORECASE)
+
+
+def count_lines(path):
+    """Counts lines without decoding them, for progress reporting."""
+    count = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(COUNT_CHUNK)
+            if not chunk:
+                break
+            count += chunk.count(b"\n")
+            last = chunk[-1:]
+    return count + (last != b"\n")
+
+
+class SourceFile:
+    """Iterates the raw lines of a file lazily and remembers how far it got."""
+
+    def __init__(self, path):
+        self.path = path
+        self.total = count_lines(path)
+        self.read = 0
+
+    def __iter__(self):
+        with open(self.path, "r") as f:
+            for line in f:
+                self.read += 1
+                yield line
+
+
+class CommandList:
+    """Commands already prepared in memory, with SourceFile's progress counters."""
+
+    def __init__(self, commands):
+        self.commands = commands
+        self.total = len(commands)
+        self.read = 0
+
+    def __iter__(self):
+        for line in self.commands:
+            self.read += 1
+            yield line
+
+
+def is_svg(path):
+    return path.lower().endswith(".svg")
+
+
+def open_source(path):
+    """The raw lines of a G-code file, or the commands drawing an SVG file.
+
+    svg_import (and svgpathtools with it) is only loaded for SVG files.
+    """
+    if is_svg(path):
+        import svg_import
+
+        return CommandList(svg_import.svg_commands(path))
+    return SourceFile(path)
+
+
+def job_settings(
+    path,
+    resolution=ARC_RESOLUTION,
+    tolerance=ARC_TOLERANCE,
+    arc_mode=ARC_MODE,
+    optimize_travel=False,
+    simplify_tolerance=None,
+    compact_commands=False,
+):
+    """Everything that changes the preprocessed stream, for the job cache key."""
+    import compact
+    import optimize
+
+    settings = {
+        "arc_resolution": resolution,
+        "arc_tolerance": tolerance,
+        "arc_mode": arc_mode,
+        "arc_max_error": ARC_MAX_ERROR,
+        "firmware_arcs": [
+            machine.ARC_TOLERANCE,
+            machine.MIN_ARC_SEGMENTS,
+            machine.ARC_SEGMENT_CAP,
+            machine.ARC_MIN_RADIUS,
+            machine.LINE_BUFFER_SIZE,
+            machine.STEPS_PER_MM_X,
+            machine.STEPS_PER_MM_Y,
+        ],
+        "optimize_travel": (
+            [optimize.TWO_OPT_WINDOW, optimize.TWO_OPT_PASSES]
+            if optimize_travel
+            else False
+        ),
+        "simplify_tolerance": simplify_tolerance,
+        "compact": (
+            [
+                compact.STEP_MARGIN,
+                compact.MAX_DECIMALS,
+                machine.STEPS_PER_MM_X,
+                machine.STEPS_PER_MM_Y,
+            ]
+            if compact_commands
+            else False
+        ),
+    }
+    if is_svg(path):
+        import svg_import
+
+        settings.update(svg_import.settings())
+    return settings
+
+
+def linearize(
+    lines,
+    resolution=ARC_RESOLUTION,
+    tolerance=ARC_TOLERANCE,
+    arc_mode=ARC_MODE,
+    state=None,
+):
+    """Replaces G2/G3 with G1 segments, as arc_mode says; the rest passes through.
+
+    Lines are compiled into a move table a batch at a time, so arc starts
+    follow G91 increments, G92 offsets and modal G2/G3 the way parser.cpp
+    does, and each batch's arcs are cut all at once. state (a
+    checkpoint.ModalState) is where the lines start.
+    """
+    if arc_mode == "firmware":
+        for line in lines:
+            yield line.strip()
+        return
+    state = state or ModalState()
+    batch = []
+    for line in lines:
+        batch.append(line.strip())
+        if len(batch) >= LINEARIZE_BATCH:
+            yield from linearize_batch(batch, resolution, tolerance, arc_mode, state)
+            batch = []
+    if batch:
+        yield from linearize_batch(batch, resolution, tolerance, arc_mode, state)
+
+
+def kept_arc(line, kind):
+    """An arc line as auto mode sends it to the firmware.
+
+    A modal arc gets its G2/G3 back: the segments before it left the
+    firmware in G1.
+    """
+    if {2, 3} & set(tokenize(line).g):
+        return line
+    return f"G{kind} {line}"
+
+
+def linearize_batch(lines, resolution, tolerance, arc_mode, state):
+    """linearize() of one batch of stripped lines, carrying state over."""
+    import numpy as np
+
+    import arcs
+    import movetable
+
+    table = movetable.compile_moves(lines, state)
+    arc = table[table["kind"] >= movetable.ARC_CW]
+    if not len(arc):
+        yield from lines
+        return
+    clockwise = arc["kind"] == movetable.ARC_CW
+    keep = np.zeros(len(arc), bool)
+    if arc_mode == "auto":
+        # The arcs parser.cpp would draw within ARC_MAX_ERROR go as they are
+        _, _, radius, _, sweep = arcs.arc_geometry(
+            arc["x0"], arc["y0"], arc["x"], arc["y"], arc["i"], arc["j"], clockwise
+        )
+        fits = np.array(
+            [
+                len(strip_comment(kept_arc(lines[k], kind))) + 1
+                < machine.LINE_BUFFER_SIZE
+                for k, kind in zip(arc["line"], arc["kind"])
+            ],
+            bool,
+        )
+        keep = fits & (arcs.firmware_chord_error(radius, sweep) <= ARC_MAX_ERROR)
+
+    replaced = {}
+    for row in arc[keep]:
+        replaced[row["line"]] = [kept_arc(lines[row["line"]], row["kind"])]
+
+    cut = arc[~keep]
+    xs, ys, counts = arcs.linearize_arcs(
+        cut["x0"],
+        cut["y0"],
+        cut["x"],
+        cut["y"],
+        cut["i"],
+        cut["j"],
+        cut["kind"] == movetable.ARC_CW,
+        resolution=resolution,
+        tolerance=tolerance,
+    )
+    # Each arc ends exactly on its target, as handle_arc's last move does;
+    # the centre's cos/sin end point would drift under G91
+    ends = np.cumsum(counts)
+    last = ends[counts > 0] - 1
+    xs[last] = cut["x"][counts > 0]
+    ys[last] = cut["y"][counts > 0]
+    # Segments go out in the job's own coordinates, as absolute moves
+    owner = np.repeat(np.arange(len(cut)), counts)
+    segments = arcs.format_segments(
+        xs - cut["offset_x"][owner], ys - cut["offset_y"][owner]
+    )
+    for n, row in enumerate(cut):
+        block = tokenize(lines[row["line"]])
+        lines_out = segments[ends[n] - counts[n] : ends[n]]
+        if not lines_out:
+            if block.x is None and block.y is None:
+                continue  # No move at all (an M5 under a modal G2, say)
+            # Too small to cut; parser.cpp would go straight there too
+            lines_out = [
+                f"G1 X{row['x'] - row['offset_x']:.4f}"
+                f" Y{row['y'] - row['offset_y']:.4f}"
+            ]
+        # The arc's own F and M words still apply
+        extra = "".join(f" M{m}" for m in block.m)
+        if block.f is not None:
+            extra += f" F{block.f:g}"
+        if extra:
+            lines_out[0] += extra
+        if not row["absolute"]:
+            lines_out = ["G90", *lines_out, "G91"]
+        elif 90 in block.g:
+            lines_out = ["G90", *lines_out]
+        replaced[row["line"]] = lines_out
+
+    for k, line in enumerate(lines):
+        if k in replaced:
+            yield from replaced[k]
+        else:
+            yield line
+
+
+# --- PARALLEL ---
+def is_chunk_boundary(line):
+    """True for a G0 travel that sets both X and Y, and no G91 or G92.
+
+    In G90 such a line replaces all of the position, so linearize() can
+    start over there from a state holding just the G92 offsets and produce
+    the same lines.
+    """
+    head = line.lstrip()[:3].upper()
+    if not head.startswith("G0") or (head[2:3].isdigit() and head != "G00"):
+        return False
+    block = tokenize(line.strip())
+    return (
+        block.command == 0
+        and block.x is not None
+        and block.y is not None
+        and 91 not in block.g
+        and 92 not in block.g
+    )
+
+
+def split_chunks(lines, size=CHUNK_LINES):
+    """Groups lines into (state, lines) of about size, each cut before a boundary.
+
+    Only the distance mode is followed as the lines go by, from those that
+    mention G90..G92. A chunk that changed the G92 offsets is replayed
+    through a ModalState to find them.
+    """
+    state = ModalState()
+    chunk = []
+    absolute = True
+    zeroed = False  # a G92 in the chunk
+    for line in lines:
+        if len(chunk) >= size and absolute and is_chunk_boundary(line):
+            yield state, chunk
+            start, state = state, ModalState()
+            if zeroed:
+                # The chunk starts at a boundary, so it replays from its state
+                start = copy.copy(start)
+                for previous in chunk:
+                    start.feed(previous)
+            state.offset_x, state.offset_y = start.offset_x, start.offset_y
+            chunk = []
+            zeroed = False
+        chunk.append(line)
+        if MODE_RE.search(line):
+            for g in tokenize(line).g:
+                if g in (90, 91):
+                    absolute = g == 90
+                zeroed = zeroed or g == 92
+    if chunk:
+        yield state, chunk
+
+
+def linearize_chunk(state, lines, resolution, tolerance, arc_mode):
+    """linearize() of one chunk; runs in a worker process.
+
+    The lines come back as one newline-terminated string, which pickles far
+    faster than a list of millions of short ones.
+    """
+    return "".join(
+        line + "\n" for line in linearize(lines, resolution, tolerance, arc_mode, state)
+    )
+
+
+def parallel_linearize(
+    lines,
+    resolution=ARC_RESOLUTION,
+    tolerance=ARC_TOLERANCE,
+    arc_mode=ARC_MODE,
+    workers=PARALLEL_WORKERS,
+):
+    """linearize() spread over worker processes, with identical output.
+
+    Chunks are cut at boundaries where linearize() would start over anyway,
+    linearized in a process pool and yielded back in order. At most two
+    chunks per worker are in flight, so the output still streams and
+    memory stays bounded however large the file is.
+    """
+    pool = ProcessPoolExecutor(workers)
+    pending = deque()
+    try:
+        for state, chunk in split_chunks(lines):
+            pending.append(
+                pool.submit(
+                    linearize_chunk, state, chunk, resolution, tolerance, arc_mode
+                )
+            )
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result().split("\n")[:-1]
+        while pending:
+            yield from pending.popleft().result().split("\n")[:-1]
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def linearize_source(
+    source, resolution=ARC_RESOLUTION, tolerance=ARC_TOLERANCE, arc_mode=ARC_MODE
+):
+    """linearize() for a SourceFile, across processes when the file is large."""
+    if (
+        PARALLEL_WORKERS > 1
+        and isinstance(source, SourceFile)
+        and source.total >= PARALLEL_MIN_LINES
+    ):
+        return parallel_linearize(source, resolution, tolerance, arc_mode)
+    return linearize(source, resolution, tolerance, arc_mode)
+
+
+def tee(lines, path):
+    """Passes lines through while writing a copy of them to path.
+
+    The copy goes to a temporary file that replaces path only once the
+    stream is complete, so concurrent loads never interleave in one file
+    and an aborted upload leaves the previous copy alone.
+    """
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "w") as f_out:
+            for line in lines:
+                f_out.write(line + "\n")
+                yield line
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def clean(lines):
+    """Drops comments, blank lines and '%' markers; yields sendable commands."""
+    for line in lines:
+        line = strip_comment(line)
+        if line and not line.startswith("%"):
+            yield line
+
+
+def optimized_source(
+    source, resolution=ARC_RESOLUTION, tolerance=ARC_TOLERANCE, arc_mode=ARC_MODE
+):
+    """Linearizes all of source and reorders its strokes to cut pen-up travel.
+
+    Reordering needs the whole program, so this stage is not lazy. Returns
+    (CommandList, optimize.TravelReport).
+    """
+    import optimize
+
+    commands, report = optimize.optimize_travel(
+        clean(linearize_source(source, resolution, tolerance, arc_mode))
+    )
+    return CommandList(commands), report
+
+
+def upload_stream(
+    source,
+    resolution=ARC_RESOLUTION,
+    tolerance=ARC_TOLERANCE,
+    tee_path=None,
+    simplifier=None,
+    arc_mode=ARC_MODE,
+    compactor=None,
+):
+    """Read -> linearize -> (simplify) -> clean -> (compact) -> (tee), lazily."""
+    if isinstance(source, CommandList):
+        lines = iter(source)  # Already linearized
+    else:
+        lines = linearize_source(source, resolution, tolerance, arc_mode)
+    if simplifier:
+        lines = simplifier(lines)
+    lines = clean(lines)
+    if compactor:
+        lines = compactor(lines)
+    if tee_path:
+        lines = tee(lines, tee_path)
+    return lines
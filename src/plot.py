@@ -0,0 +1,215 @@
+import time
+
+STARTED = time.perf_counter()  # before anything heavy is imported
+
+import argparse
+import sys
+import threading
+
+# Everything else is imported inside main(), while the Uno reboots
+
+# --- CONFIGURATION ---
+PORT = "/dev/ttyUSB0"
+BAUD = 115200
+STREAM_MODE = "ping-pong"  # or "char-count"
+ARC_RESOLUTION = 0.01
+ARC_TOLERANCE = None  # mm chord error; when set, overrides ARC_RESOLUTION
+ARC_MODE = "auto"
+COMPACT = True  # send each command in as few bytes as plan the same steps
+JOB_CACHE = True  # reuse preprocessed jobs from ~/.cache/arduino-plotter
+CHECKPOINTS = True  # keep a resume point the GUI's RESUME JOB can pick up
+PROGRESS_INTERVAL = 5.0  # s between progress lines
+# s from start-up to the first command on the wire, not counting the wait
+# for the firmware's reboot
+FIRST_BYTE_BUDGET = 0.3
+
+
+def log(msg):
+    print(msg, flush=True)
+
+
+def connect(uploader, result):
+    try:
+        uploader.connect()
+    except Exception as e:
+        result.append(e)
+
+
+def prepare(path, args, uploader):
+    """The job buffer for path, filling on a producer thread unless cached.
+
+    Returns (buffer, key, compactor); key is None when neither the cache
+    nor a checkpoint needs one, compactor None unless it runs.
+    """
+    import pipeline
+    from cmdbuffer import CommandBuffer
+    from compact import Compactor
+    from jobcache import JobCache, job_key
+
+    key = None
+    if args.cache or args.checkpoint:
+        settings = pipeline.job_settings(
+            path,
+            args.resolution,
+            args.tolerance,
+            args.arc_mode,
+            compact_commands=args.compact,
+        )
+        key = job_key(path, settings)
+    cache = JobCache() if args.cache else None
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            log(f"{path}: cache hit, {len(cached)} commands")
+            return cached, key, None
+
+    buffer = CommandBuffer()
+    source = pipeline.open_source(path)
+    compactor = Compactor(args.baud) if args.compact else None
+    lines = pipeline.upload_stream(
+        source,
+        args.resolution,
+        args.tolerance,
+        arc_mode=args.arc_mode,
+        compactor=compactor,
+    )
+
+    def produce():
+        buffer.fill(lines, uploader.notify)
+        if cache and buffer.complete and not buffer.error:
+            try:
+                cache.store(key, buffer)
+            except OSError as e:
+                log(f"[WARN] Job cache: {e}")
+
+    threading.Thread(target=produce, daemon=True).start()
+    return buffer, key, compactor
+
+
+def plot(path, args, uploader, startup=None):
+    """Streams one file to the end. Returns False if it failed.
+
+    startup is (imports done, firmware ready) for the first file, whose
+    time to the first byte on the wire is reported.
+    """
+    import checkpoint
+
+    job_started = time.perf_counter()
+
+    buffer, key, compactor = prepare(path, args, uploader)
+    job = None
+    if args.checkpoint:
+        try:
+            job = checkpoint.Checkpoint.create(key, path, buffer)
+        except OSError as e:
+            log(f"[WARN] Checkpoint: {e}")
+    uploader.start(buffer, checkpoint=job)
+    if startup:
+        while uploader.first_byte is None and not uploader.finished.wait(0.001):
+            pass
+        if uploader.first_byte is not None:
+            report_startup(*startup, job_started, uploader.first_byte)
+    try:
+        while not uploader.wait(PROGRESS_INTERVAL):
+            log(
+                f"{path}: {uploader.acked}/{len(buffer)} acknowledged,"
+                f" {uploader.rate():.1f} lines/sec"
+            )
+    except ConnectionError as e:
+        log(f"[Error] {e}")
+        if job:
+            job.flush()
+        return False
+    except KeyboardInterrupt:
+        uploader.pause()
+        log(f"Paused at line {uploader.acked}")
+        if job:
+            job.flush()
+        raise
+    if buffer.error:
+        log(f"[Error] {path}: {buffer.error}")
+        return False
+    if compactor:
+        log(str(compactor))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Plots G-code or SVG files without the GUI"
+    )
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--port", default=PORT)
+    parser.add_argument("--baud", type=int, default=BAUD)
+    parser.add_argument(
+        "--stream-mode", default=STREAM_MODE, choices=("ping-pong", "char-count")
+    )
+    parser.add_argument(
+        "--arc-mode", default=ARC_MODE, choices=("host", "firmware", "auto")
+    )
+    parser.add_argument("--resolution", type=float, default=ARC_RESOLUTION)
+    parser.add_argument("--tolerance", type=float, default=ARC_TOLERANCE)
+    parser.add_argument("--no-compact", dest="compact", action="store_false")
+    parser.add_argument("--no-cache", dest="cache", action="store_false")
+    parser.add_argument("--no-checkpoint", dest="checkpoint", action="store_false")
+    parser.add_argument(
+        "--simulate", action="store_true", help="plot to the firmware simulator"
+    )
+    parser.set_defaults(compact=COMPACT, cache=JOB_CACHE, checkpoint=CHECKPOINTS)
+    args = parser.parse_args()
+
+    # The link opens first: the Uno reboots while the rest loads
+    import uploader
+
+    if args.simulate:
+        from simulator import Simulator
+
+        args.port = Simulator().start_pty()
+    plotter = uploader.Uploader(args.port, args.baud, args.stream_mode, log)
+    failed = []
+    link = threading.Thread(target=connect, args=(plotter, failed), daemon=True)
+    link.start()
+    # The preprocessing stages (and numpy) load during the reboot
+    import checkpoint  # noqa: F401
+    import jobcache  # noqa: F401
+    import pipeline  # noqa: F401
+
+    loaded = time.perf_counter()
+    link.join()
+    ready = time.perf_counter()
+    if failed:
+        log(f"[Error] {args.port}: {failed[0]}")
+        return 1
+
+    ok = True
+    try:
+        for n, path in enumerate(args.files):
+            if not plot(path, args, plotter, (loaded, ready) if n == 0 else None):
+                ok = False
+                break
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        plotter.close()
+    return 0 if ok else 1
+
+
+def report_startup(loaded, ready, job_started, first_byte):
+    """Logs how long the first command took to reach the wire, and why."""
+    waiting = max(0.0, ready - loaded)  # the firmware's reboot, past the imports
+    own = first_byte - STARTED - waiting
+    log(
+        f"First byte after {(first_byte - STARTED) * 1000:.0f} ms:"
+        f" {(loaded - STARTED) * 1000:.0f} ms loading,"
+        f" {waiting * 1000:.0f} ms waiting for the firmware,"
+        f" {(first_byte - job_started) * 1000:.0f} ms preparing the job"
+    )
+    if own > FIRST_BYTE_BUDGET:
+        log(
+            f"[WARN] Start-up took {own * 1000:.0f} ms of our own,"
+            f" over the {FIRST_BYTE_BUDGET * 1000:.0f} ms budget"
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
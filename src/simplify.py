@@ -0,0 +1,147 @@
+import math
+
+from tokenizer import tokenize
+
+# --- CONFIGURATION ---
+SIMPLIFY_TOLERANCE = 0.02  # mm; a bit more than one step (1 / STEPS_PER_MM)
+MERGED_FORMAT = "G1 X%.4f Y%.4f"  # a run's last point, both axes named
+
+
+class Simplifier:
+    """Merges runs of pen-down G1 moves that stay within tolerance of one line.
+
+    Works on the stream one line at a time with the sleeve-fitting method:
+    from the run's anchor, every point seen so far allows a cone of
+    directions (those passing within tolerance of it), and the run grows
+    for as long as the new point lies inside all of them and no nearer to
+    the anchor than any earlier point. Only the run's last point is sent,
+    with both axes named (its own line may name one, leaving the other to
+    the points dropped before it), so every dropped point is within
+    tolerance of the segment that replaces it. Modal G1 lines merge like
+    G1 ones. A run never spans a feed change, a pen change or relative mode.
+    Counters are updated as the stream is consumed.
+    """
+
+    def __init__(self, tolerance=SIMPLIFY_TOLERANCE):
+        self.tolerance = tolerance
+        self.kept = 0
+        self.removed = 0
+
+    def __str__(self):
+        total = self.kept + self.removed
+        share = self.removed / total * 100 if total else 0.0
+        return f"Simplify: removed {self.removed} of {total} commands ({share:.1f}%)"
+
+    def __call__(self, lines):
+        tol = self.tolerance
+        x = y = 0.0
+        pen = False
+        absolute = True
+        feed = None
+        motion = None  # G0/G1/G2/G3 in force
+        pending = None  # last line of the current run, not sent yet
+        merged = False  # whether the run has dropped any line
+        for line in lines:
+            block = tokenize(line)
+            moves = block.x is not None or block.y is not None
+            nx = block.x if block.x is not None else x
+            ny = block.y if block.y is not None else y
+            mergeable = (
+                pen
+                and absolute
+                and moves
+                and (block.g == (1,) or (not block.g and motion == 1))
+                and not block.m
+                and block.i is None
+                and block.j is None
+                and (block.z is None or block.z <= 0)
+                and (block.f is None or block.f == feed)
+            )
+
+            if mergeable and pending is not None:
+                # --- SLEEVE TEST ---
+                dx, dy = nx - ax, ny - ay
+                d = math.hypot(dx, dy)
+                fits = d >= reach
+                if fits and lo is not None:
+                    fits = lo <= angle_from(ref, dx, dy) <= hi
+                if fits:
+                    if d > tol:
+                        if lo is None:
+                            ref, lo, hi = math.atan2(dy, dx), -math.pi, math.pi
+                        a = angle_from(ref, dx, dy)
+                        half = math.asin(tol / d)
+                        lo, hi = max(lo, a - half), min(hi, a + half)
+                    reach = d
+                    pending = line
+                    merged = True
+                    self.removed += 1
+                    x, y = nx, ny
+                    continue
+
+            if pending is not None:
+                yield self.merged_line(pending, x, y) if merged else pending
+                self.kept += 1
+                pending = None
+
+            if mergeable:
+                # Start a run anchored where the pen is now
+                ax, ay = x, y
+                dx, dy = nx - ax, ny - ay
+                reach = math.hypot(dx, dy)
+                ref = lo = hi = None
+                if reach > tol:
+                    ref = math.atan2(dy, dx)
+                    half = math.asin(tol / reach)
+                    lo, hi = -half, half
+                pending = line
+                merged = False
+                motion = 1
+                x, y = nx, ny
+                continue
+
+            yield line
+            self.kept += 1
+            # --- TRACK STATE ---
+            for g in block.g:
+                if g in (0, 1, 2, 3):
+                    motion = g
+                elif g == 92:
+                    motion = None  # parser.cpp forgets the motion mode
+            if 90 in block.g:
+                absolute = True
+            if 91 in block.g:
+                absolute = False
+            if 92 in block.g:
+                # A new origin: positions from here on are in the new frame
+                x = block.x if block.x is not None else x
+                y = block.y if block.y is not None else y
+            elif absolute:
+                x, y = nx, ny
+            else:
+                x += block.x or 0.0
+                y += block.y or 0.0
+            if block.z is not None:
+                pen = block.z <= 0
+            if 3 in block.m:
+                pen = True
+            if 5 in block.m:
+                pen = False
+            if block.f is not None:
+                feed = block.f
+
+        if pending is not None:
+            yield self.merged_line(pending, x, y) if merged else pending
+            self.kept += 1
+
+    @staticmethod
+    def merged_line(line, x, y):
+        """The command for a run ending at (x, y), with its last line's feed."""
+        block = tokenize(line)
+        merged = MERGED_FORMAT % (x, y)
+        return f"{merged} F{block.f:g}" if block.f is not None else merged
+
+
+def angle_from(ref, dx, dy):
+    """Direction of (dx, dy) relative to ref, wrapped to [-pi, pi)."""
+    return (math.atan2(dy, dx) - ref + math.pi) % (2 * math.pi) - math.pi
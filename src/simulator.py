@@ -0,0 +1,501 @@
+import math
+import os
+import re
+import select
+import sys
+import threading
+import time
+from collections import deque
+
+import machine
+
+# --- CONFIGURATION ---
+CHAR_TIME = 10e-6  # s of AVR time to move one byte from RX into line[]
+PARSE_TIME = 0.4e-3  # s of strtod/strtol work in parse_line
+STATUS_TIME = 0.3e-3  # s to format the two floats of a status report
+BANNER = "\nGrbl-Plotter-Echo v0.6 Ready"
+IDLE_WAIT = 0.05  # s to sleep in serve() when nothing is scheduled
+
+INT_RE = re.compile(rb"\s*[-+]?\d+")
+FLOAT_RE = re.compile(rb"\s*[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+class Segment:
+    __slots__ = ("x0", "y0", "dx", "dy", "steps", "duration")
+
+    def __init__(self, x0, y0, dx, dy, steps, duration):
+        self.x0, self.y0 = x0, y0
+        self.dx, self.dy = dx, dy
+        self.steps = steps
+        self.duration = duration
+
+
+class FirmwareSim:
+    """main.cpp, parser.cpp and stepper.cpp modelled on a simulated clock.
+
+    receive() queues bytes from the host; they reach the 64-byte RX ring one
+    byte time apart, and are dropped if it is full, like on the Uno. advance()
+    runs the firmware up to a given time and returns the bytes that have
+    finished leaving its TX pin by then. Times are seconds.
+    """
+
+    def __init__(
+        self,
+        baud=machine.BAUD_RATE,
+        rx_size=machine.RX_BUFFER_SIZE,
+        line_size=machine.LINE_BUFFER_SIZE,
+        planner_size=machine.PLANNER_BUFFER_SIZE,
+    ):
+        self.byte_time = 10.0 / baud  # 8N1
+        self.t = 0.0
+
+        # Link
+        self.wire_in = deque()  # (arrival time, byte)
+        self.wire_in_free = 0.0
+        self.wire_out = deque()  # (departure time, byte)
+        self.wire_out_free = 0.0
+        self.rx = deque()
+        self.rx_size = rx_size
+        self.overflows = 0
+
+        # main.cpp
+        self.line = bytearray()
+        self.line_size = line_size
+        self.cpu_ready = 0.0
+        self.parsing = None
+        self.parse_start = None
+        self.pending = deque()  # ("corner",) / ("move", x_mm, y_mm, feed)
+        self.lines_parsed = 0
+
+        # parser.cpp
+        self.feed_rate = machine.DEFAULT_FEED_RATE
+        self.motion_mode = -1
+        self.absolute_mode = True
+        self.offset_x = 0.0
+        self.offset_y = 0.0
+        self.last_move_dx = 0.0
+        self.last_move_dy = 0.0
+        self.pen_is_down = False
+
+        # stepper.cpp
+        self.planner = deque()  # running segment first
+        self.planner_capacity = planner_size - 1
+        self.planner_x = 0
+        self.planner_y = 0
+        self.seg_elapsed = 0.0
+        self.paused = False
+        self.status_reports = 0
+
+        self.println(BANNER)
+
+    # --- LINK ---
+    def receive(self, data, now):
+        """Host bytes written at time now; one byte time each on the wire."""
+        t = max(now, self.wire_in_free)
+        for b in data:
+            t += self.byte_time
+            self.wire_in.append((t, b))
+        self.wire_in_free = t
+
+    def print(self, text):
+        t = max(self.t, self.wire_out_free)
+        for b in text.encode():
+            t += self.byte_time
+            self.wire_out.append((t, b))
+        self.wire_out_free = t
+
+    def println(self, text):
+        self.print(text + "\r\n")
+
+    # --- CLOCK ---
+    def next_event(self):
+        """Earliest time the firmware state changes, or None when idle."""
+        times = []
+        if self.wire_in:
+            times.append(self.wire_in[0][0])
+        if self.planner and not self.paused:
+            times.append(self.t + self.planner[0].duration - self.seg_elapsed)
+        if self.cpu_has_work():
+            times.append(max(self.cpu_ready, self.t))
+        return min(times) if times else None
+
+    def next_wakeup(self):
+        """Earliest time advance() has something new to do or to return."""
+        t_next = self.next_event()
+        if self.wire_out and (t_next is None or self.wire_out[0][0] < t_next):
+            return self.wire_out[0][0]
+        return t_next
+
+    def advance(self, now):
+        """Runs the firmware up to time now and returns the bytes it sent."""
+        while True:
+            t_next = self.next_event()
+            if t_next is None or t_next > now:
+                break
+            self.advance_clock(max(t_next, self.t))
+            self.run_events()
+        self.advance_clock(max(now, self.t))
+        out = bytearray()
+        while self.wire_out and self.wire_out[0][0] <= now:
+            out.append(self.wire_out.popleft()[1])
+        return bytes(out)
+
+    def advance_clock(self, t):
+        if self.planner and not self.paused:
+            self.seg_elapsed += t - self.t
+        self.t = t
+
+    def run_events(self):
+        while self.wire_in and self.wire_in[0][0] <= self.t:
+            b = self.wire_in.popleft()[1]
+            if len(self.rx) < self.rx_size:
+                self.rx.append(b)
+            else:
+                self.overflows += 1
+
+        # stepper_run: segment complete?
+        while self.planner and not self.paused:
+            seg = self.planner[0]
+            if self.seg_elapsed < seg.duration - 1e-12:
+                break
+            self.seg_elapsed -= seg.duration
+            self.planner.popleft()
+        if not self.planner:
+            self.seg_elapsed = 0.0
+
+        if self.cpu_has_work() and self.cpu_ready <= self.t:
+            self.cpu_step()
+
+    # --- main.cpp ---
+    def cpu_has_work(self):
+        if self.parsing is not None:
+            return True
+        if self.pending:
+            if self.rx and self.rx[0] in b"?!~":
+                return True
+            head = self.pending[0]
+            if head[0] == "corner":
+                return not self.planner
+            return len(self.planner) < self.planner_capacity
+        return bool(self.rx)
+
+    def cpu_step(self):
+        self.cpu_ready = self.t
+        if self.parsing is not None:
+            line, self.parsing = self.parsing, None
+            self.parse_line(line)
+            self.drain_pending()
+            return
+        if self.pending:
+            # check_realtime_commands() while parse_line waits for the planner
+            if self.rx and self.rx[0] in b"?!~":
+                self.realtime(self.rx.popleft())
+            self.drain_pending()
+            return
+
+        c = self.rx.popleft()
+        self.cpu_ready += CHAR_TIME
+        if c in b"?!~":
+            self.realtime(c)
+        elif c in b"\r\n":
+            if self.line:
+                self.parsing = bytes(self.line)
+                self.parse_start = self.t
+                self.cpu_ready += PARSE_TIME
+                self.line.clear()
+        elif len(self.line) < self.line_size - 1:
+            self.line.append(c)
+        else:
+            self.println("[ERR] Line Buffer Full!")
+            self.line.clear()
+
+    def realtime(self, c):
+        if c == ord("?"):
+            self.report_status()
+        elif c == ord("!"):
+            self.paused = True
+            self.println("[MSG] Paused")
+        else:
+            self.paused = False
+            self.println("[MSG] Resumed")
+
+    def drain_pending(self):
+        while self.pending:
+            head = self.pending[0]
+            if head[0] == "corner":
+                if self.planner:
+                    return
+            elif not self.plan_move(head[1], head[2], head[3]):
+                return
+            self.pending.popleft()
+        if self.parse_start is not None:
+            # Serial.print("ok T:"); Serial.println(millis() delta)
+            elapsed = int(self.t * 1000) - int(self.parse_start * 1000)
+            self.println(f"ok T:{elapsed}")
+            self.parse_start = None
+            self.lines_parsed += 1
+
+    # --- parser.cpp ---
+    def position(self):
+        return (
+            self.planner_x / machine.STEPS_PER_MM_X,
+            self.planner_y / machine.STEPS_PER_MM_Y,
+        )
+
+    def parse_line(self, line):
+        has_x = has_y = False
+        val_x = val_y = val_i = val_j = 0.0
+        line = line.upper()
+        pos = 0
+        while pos < len(line):
+            c = line[pos : pos + 1]
+            pos += 1
+            if c <= b" ":
+                continue
+            if c in b";(":
+                break
+            if c in b"GM":
+                m = INT_RE.match(line, pos)
+                cmd = int(m.group()) if m else 0
+                pos = m.end() if m else pos
+                if c == b"G":
+                    if cmd in (0, 1, 2, 3):
+                        self.motion_mode = cmd
+                    elif cmd == 90:
+                        self.absolute_mode = True
+                    elif cmd == 91:
+                        self.absolute_mode = False
+                    elif cmd == 92:
+                        self.motion_mode = 92
+                elif cmd == 3:
+                    self.pen(True)
+                elif cmd == 5:
+                    self.pen(False)
+            elif c in b"XYIJF":
+                m = FLOAT_RE.match(line, pos)
+                value = float(m.group()) if m else 0.0
+                pos = m.end() if m else pos
+                if c == b"X":
+                    val_x, has_x = value, True
+                elif c == b"Y":
+                    val_y, has_y = value, True
+                elif c == b"I":
+                    val_i = value
+                elif c == b"J":
+                    val_j = value
+                else:
+                    self.feed_rate = value
+
+        cx, cy = self.position()
+        if self.motion_mode == 92:
+            if has_x:
+                self.offset_x = cx - val_x
+            if has_y:
+                self.offset_y = cy - val_y
+            self.motion_mode = -1
+            return
+
+        if has_x:
+            tx = val_x + self.offset_x if self.absolute_mode else cx + val_x
+        else:
+            tx = cx
+        if has_y:
+            ty = val_y + self.offset_y if self.absolute_mode else cy + val_y
+        else:
+            ty = cy
+
+        if self.motion_mode in (0, 1):
+            speed = machine.MAX_FEED_RATE if self.motion_mode == 0 else self.feed_rate
+            if has_x or has_y:
+                if self.check_corner(tx - cx, ty - cy):
+                    self.pending.append(("corner",))
+                self.pending.append(("move", tx, ty, speed))
+        elif self.motion_mode in (2, 3):
+            self.handle_arc(cx, cy, tx, ty, val_i, val_j, self.motion_mode == 2)
+
+    def pen(self, down):
+        self.pen_is_down = down
+        self.println("[DEBUG] PEN DOWN" if down else "[DEBUG] PEN UP")
+
+    def check_corner(self, new_dx, new_dy):
+        """True when the move turns sharper than CORNER_ANGLE_THRESHOLD."""
+        sharp = False
+        mag_last = math.hypot(self.last_move_dx, self.last_move_dy)
+        mag_new = math.hypot(new_dx, new_dy)
+        if mag_last > machine.CORNER_MIN_LENGTH and mag_new > machine.CORNER_MIN_LENGTH:
+            dot = self.last_move_dx * new_dx + self.last_move_dy * new_dy
+            cos_theta = max(-1.0, min(1.0, dot / (mag_last * mag_new)))
+            sharp = math.degrees(math.acos(cos_theta)) > machine.CORNER_ANGLE_THRESHOLD
+        self.last_move_dx = new_dx
+        self.last_move_dy = new_dy
+        return sharp
+
+    def handle_arc(self, cx, cy, tx, ty, i, j, clockwise):
+        radius = math.hypot(i, j)
+        if radius < machine.ARC_MIN_RADIUS:
+            self.pending.append(("move", tx, ty, self.feed_rate))
+            return
+        center_x, center_y = cx + i, cy + j
+        travel = math.atan2(ty - center_y, tx - center_x) - math.atan2(
+            cy - center_y, cx - center_x
+        )
+        if clockwise and travel >= 0:
+            travel -= 2.0 * math.pi
+        elif not clockwise and travel <= 0:
+            travel += 2.0 * math.pi
+
+        mm_per_segment = 2.0 * math.sqrt(2.0 * radius * machine.ARC_TOLERANCE)
+        segments = math.floor(abs(travel * radius) / mm_per_segment)
+        segments = min(max(segments, machine.MIN_ARC_SEGMENTS), machine.ARC_SEGMENT_CAP)
+        theta = travel / segments
+        cos_t, sin_t = math.cos(theta), math.sin(theta)
+        r_ax, r_ay = -i, -j
+        for _ in range(1, segments):
+            r_ax, r_ay = r_ax * cos_t - r_ay * sin_t, r_ax * sin_t + r_ay * cos_t
+            nx, ny = center_x + r_ax, center_y + r_ay
+            self.pending.append(("move", nx, ny, self.feed_rate))
+            self.last_move_dx = nx - cx
+            self.last_move_dy = ny - cy
+        self.pending.append(("move", tx, ty, self.feed_rate))
+
+    # --- stepper.cpp ---
+    def plan_move(self, x_mm, y_mm, feed_rate):
+        """stepper_plan_move: False when the ring is full."""
+        if len(self.planner) >= self.planner_capacity:
+            return False
+        target_x = round_half_away(x_mm * machine.STEPS_PER_MM_X)
+        target_y = round_half_away(y_mm * machine.STEPS_PER_MM_Y)
+        dx = target_x - self.planner_x
+        dy = target_y - self.planner_y
+        if dx == 0 and dy == 0:
+            return True
+        steps = max(abs(dx), abs(dy))
+        if feed_rate < 1.0:
+            feed_rate = 100.0
+        distance = max(
+            0.001,
+            math.hypot(dx / machine.STEPS_PER_MM_X, dy / machine.STEPS_PER_MM_Y),
+        )
+        step_delay = max(
+            machine.MIN_STEP_DELAY_US, int((distance / feed_rate) * 60000000.0 / steps)
+        )
+        period = max(step_delay, machine.STEP_PULSE_DELAY_US + machine.STEP_OVERHEAD_US)
+        self.planner.append(
+            Segment(
+                self.planner_x, self.planner_y, dx, dy, steps, steps * period * 1e-6
+            )
+        )
+        self.planner_x, self.planner_y = target_x, target_y
+        return True
+
+    def live_steps(self):
+        """Steps actually taken, like live_steps_x/y in stepper.cpp."""
+        if not self.planner:
+            return self.planner_x, self.planner_y
+        seg = self.planner[0]
+        done = min(seg.steps, int(seg.steps * self.seg_elapsed / seg.duration))
+        return (
+            seg.x0 + int(seg.dx * done / seg.steps),
+            seg.y0 + int(seg.dy * done / seg.steps),
+        )
+
+    def report_status(self):
+        if self.paused:
+            state = "Hold"
+        elif self.planner:
+            state = "Run"
+        else:
+            state = "Idle"
+        sx, sy = self.live_steps()
+        x = sx / machine.STEPS_PER_MM_X
+        y = sy / machine.STEPS_PER_MM_Y
+        self.println(f"<{state}|MPos:{x:.2f},{y:.2f}>")
+        self.cpu_ready += STATUS_TIME
+        self.status_reports += 1
+
+
+def round_half_away(value):
+    """lround(): halves go away from zero."""
+    return int(math.floor(abs(value) + 0.5)) * (1 if value >= 0 else -1)
+
+
+# --- SERVING ---
+class Simulator:
+    """Runs a FirmwareSim in real time behind a file descriptor.
+
+    speed > 1 runs the simulated clock (motion and baud rate alike) faster
+    than the wall clock, for long benchmark jobs.
+    """
+
+    def __init__(self, speed=1.0, **options):
+        self.sim = FirmwareSim(**options)
+        self.speed = speed
+        self.fd = None
+        self.slave_path = None
+        self.thread = None
+        self.running = False
+
+    def clock(self):
+        return (time.perf_counter() - self.t0) * self.speed
+
+    def serve(self, fd):
+        """Serves the simulated firmware on fd until stop() or EOF."""
+        self.fd = fd
+        self.t0 = time.perf_counter()
+        self.running = True
+        os.set_blocking(fd, False)
+        while self.running:
+            now = self.clock()
+            out = self.sim.advance(now)
+            if out:
+                os.write(fd, out)
+            t_next = self.sim.next_wakeup()
+            wait = IDLE_WAIT if t_next is None else (t_next - now) / self.speed
+            ready, _, _ = select.select([fd], [], [], min(max(wait, 0.0), IDLE_WAIT))
+            if ready:
+                try:
+                    data = os.read(fd, 4096)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    break
+                if not data:
+                    break
+                self.sim.receive(data, self.clock())
+
+    def start_pty(self):
+        """Opens a pty and serves it on a thread; returns the device path."""
+        master, slave = os.openpty()
+        self.slave_path = os.ttyname(slave)
+        self.slave_fd = slave  # Kept open so the pty survives reconnects
+        self.thread = threading.Thread(target=self.serve, args=(master,), daemon=True)
+        self.thread.start()
+        return self.slave_path
+
+    def start_socket(self, sock):
+        """Serves the device end of a transport.LoopbackBackend."""
+        self.thread = threading.Thread(
+            target=self.serve, args=(sock.fileno(),), daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+
+
+def main():
+    speed = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    sim = Simulator(speed=speed)
+    path = sim.start_pty()
+    print(f"Simulated plotter on {path} (speed x{speed}). Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,28 @@
-import serial
 import time
 import sys
-import threading
-import queue
+
+import transport
+from tokenizer import strip_comment
 
 # --- CONFIGURATION ---
 PORT = "/dev/ttyUSB0"
 BAUD = 115200
-FILENAME = "/home/afra/afra_0001.gcode" # Your large file
+FILENAME = sys.argv[1] if len(sys.argv) > 1 else "../examples/afra_0001.gcode" # Your large file
+PORT = sys.argv[2] if len(sys.argv) > 2 else PORT
 
 # --- STATE ---
 lines_to_send = []
 lines_processed = 0
 start_time = 0
 is_finished = False
-command_queue = queue.Queue()
-response_queue = queue.Queue()
-
-def reader_thread(ser):
-    """Reads responses from Arduino ('ok') to track progress."""
-    global lines_processed, is_finished
-    
-    print("   [Reader] Listening for responses...")
-    try:
-        while not is_finished:
-            if ser.in_waiting:
-                line = ser.readline().decode('utf-8', errors='ignore').strip()
-                if line == "ok":
-                    with threading.Lock():
-                        lines_processed += 1
-                elif "error" in line.lower():
-                    print(f"\n[ERROR] Arduino reported: {line}")
-            else:
-                time.sleep(0.001)
-    except Exception as e:
-        print(f"\n[Reader Error] {e}")
 
-def sender_thread(ser):
-    """Sends commands from the queue to the Arduino."""
-    global is_finished
-    
-    print("   [Sender] Starting command stream...")
-    try:
-        while not is_finished:
-            if not command_queue.empty():
-                cmd = command_queue.get()
-                ser.write(f"{cmd}\n".encode())
-                command_queue.task_done()
-            else:
-                time.sleep(0.001)
-    except Exception as e:
-        print(f"\n[Sender Error] {e}")
+def on_line(line):
+    """Counts responses from Arduino ('ok') to track progress."""
+    global lines_processed
+    if line.startswith("ok"):
+        lines_processed += 1
+    elif "error" in line.lower() or "[ERR]" in line:
+        print(f"\n[ERROR] Arduino reported: {line}")
 
 def run_test():
     global is_finished, start_time, lines_processed
@@ -66,33 +38,22 @@ def run_test():
     # Cleanup G-code (remove comments, empty lines)
     print(f"1. Cleaning {len(raw_lines)} lines...")
     for line in raw_lines:
-        l = line.strip()
-        if not l: continue
-        if l.startswith(";") or l.startswith("(") or l.startswith("%"): continue
+        l = strip_comment(line)
+        if not l or l.startswith("%"): continue
         lines_to_send.append(l)
     
     total_lines = len(lines_to_send)
     print(f"   -> Ready to send {total_lines} active commands.")
 
-    # 2. Connect
+    # 2. Connect (responses are counted on the transport thread)
     try:
-        s = serial.Serial(PORT, BAUD, timeout=1)
         print(f"2. Connecting to {PORT}...")
-        s.write(b"\r\n\r\n")
-        time.sleep(2)
-        s.reset_input_buffer()
+        s = transport.connect(PORT, BAUD, on_line=on_line)
     except Exception as e:
         print(f"Connection Failed: {e}")
         return
 
-    # 3. Start Threads
-    reader = threading.Thread(target=reader_thread, args=(s,), daemon=True)
-    sender = threading.Thread(target=sender_thread, args=(s,), daemon=True)
-    
-    reader.start()
-    sender.start()
-
-    # 4. Stream!
+    # 3. Stream!
     print("3. Starting Stream...")
     start_time = time.time()
     
@@ -107,7 +68,7 @@ def run_test():
         # Flow Control: Don't let the difference exceed Arduino buffer size (16)
         if (lines_sent - lines_processed) < 15:
             cmd = lines_to_send[lines_sent]
-            command_queue.put(cmd)
+            s.write(f"{cmd}\n")
             lines_sent += 1
             
             # Progress Bar
@@ -0,0 +1,225 @@
+import math
+import re
+
+import numpy as np
+from svgpathtools import Arc, CubicBezier, Document, QuadraticBezier
+
+import arcs
+
+# --- CONFIGURATION ---
+TOLERANCE = 0.05  # mm of chord error, same as the firmware's own arcs
+BED_WIDTH = 150.0  # mm of travel the drawing is fitted into
+BED_HEIGHT = 110.0
+MARGIN = 5.0  # mm kept free on every side when fitting
+FIT_TO_BED = True  # scale to the bed; False keeps the document's own size
+FEED_RATE = 1000.0  # mm/min for drawing moves
+MIN_LENGTH = 0.01  # mm; shorter subpaths are dropped
+UNIT_MM = {"mm": 1.0, "cm": 10.0, "in": 25.4, "pt": 25.4 / 72, "pc": 25.4 / 6}
+PX_MM = 25.4 / 96  # CSS pixels, also what unitless lengths mean
+
+
+def settings():
+    """Everything that changes the generated commands, for the job cache key."""
+    return {
+        "svg_tolerance": TOLERANCE,
+        "svg_bed": [BED_WIDTH, BED_HEIGHT, MARGIN] if FIT_TO_BED else False,
+        "svg_feed_rate": FEED_RATE,
+        "svg_min_length": MIN_LENGTH,
+    }
+
+
+def length_mm(value):
+    """An SVG length such as "210mm" or "800" in mm, or None if absent."""
+    if not value:
+        return None
+    match = re.fullmatch(r"\s*([-+.\deE]+)\s*([a-z%]*)\s*", value)
+    if not match or match.group(2) == "%":
+        return None
+    return float(match.group(1)) * UNIT_MM.get(match.group(2), PX_MM)
+
+
+def page_scale(root):
+    """mm per user unit and the page height in user units, from width/viewBox."""
+    width = length_mm(root.get("width"))
+    height = length_mm(root.get("height"))
+    view_box = root.get("viewBox")
+    if view_box:
+        _, _, vw, vh = (float(v) for v in re.split(r"[\s,]+", view_box.strip()))
+        if width:
+            return width / vw, vh
+        if height:
+            return height / vh, vh
+        return PX_MM, vh
+    return PX_MM, (height / PX_MM if height else 0.0)
+
+
+# --- FLATTENING ---
+def chord_index(counts):
+    """For every chord: which curve it belongs to and its number (0..n-1) there."""
+    owner = np.repeat(np.arange(len(counts)), counts)
+    return owner, np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+def bezier_counts(controls, tolerance):
+    """Chords per Bézier so none strays more than tolerance from its curve.
+
+    Wang's bound: with uniform parameter steps, a degree d curve is within
+    d(d-1)/8 * max|second difference of the control points| / n^2 of its
+    chords, so flat curves get one chord and tight bends many.
+    """
+    d = controls.shape[1] - 1
+    second = controls[:, :-2] - 2.0 * controls[:, 1:-1] + controls[:, 2:]
+    bend = np.abs(second).max(axis=1)
+    counts = np.ceil(np.sqrt(d * (d - 1) * bend / (8.0 * tolerance)))
+    return np.maximum(counts, 1).astype(np.int64)
+
+
+def bezier_points(controls, counts):
+    """Chord end points of a batch of same-degree Béziers, t = 1/n .. 1."""
+    d = controls.shape[1] - 1
+    owner, k = chord_index(counts)
+    t = (k + 1) / counts[owner]
+    points = np.zeros(len(t), complex)
+    for i in range(d + 1):
+        points += math.comb(d, i) * (1 - t) ** (d - i) * t**i * controls[owner, i]
+    return points
+
+
+def arc_points(segments, counts):
+    """Chord end points of a batch of svgpathtools Arcs."""
+    center = np.array([s.center for s in segments])
+    rx = np.array([s.radius.real for s in segments])
+    ry = np.array([s.radius.imag for s in segments])
+    rotation = np.exp(1j * np.radians([s.rotation for s in segments]))
+    theta = np.radians([s.theta for s in segments])
+    delta = np.radians([s.delta for s in segments])
+    owner, k = chord_index(counts)
+    angle = theta[owner] + delta[owner] * (k + 1) / counts[owner]
+    ellipse = rx[owner] * np.cos(angle) + 1j * ry[owner] * np.sin(angle)
+    return center[owner] + rotation[owner] * ellipse
+
+
+def flatten(segments, tolerance):
+    """Chord end points approximating segments, all at once.
+
+    Returns (points, counts): the complex end points of every segment's
+    chords concatenated in order, and how many belong to each segment.
+    Segments of one kind are flattened together over NumPy parameter
+    arrays; each segment's last point is its exact end point.
+    """
+    n = len(segments)
+    counts = np.ones(n, np.int64)
+    kinds = {}
+    for k, segment in enumerate(segments):
+        kinds.setdefault(type(segment), []).append(k)
+
+    batches = []
+    for kind, index in kinds.items():
+        index = np.array(index)
+        batch = [segments[k] for k in index]
+        if kind in (QuadraticBezier, CubicBezier):
+            controls = np.array([s.bpoints() for s in batch])
+            counts[index] = bezier_counts(controls, tolerance)
+            batches.append((index, bezier_points(controls, counts[index])))
+        elif kind is Arc:
+            # An ellipse bends no tighter than a circle of its larger radius
+            radius = np.array([max(s.radius.real, s.radius.imag) for s in batch])
+            sweep = np.radians([s.delta for s in batch])
+            counts[index] = arcs.segment_counts(radius, sweep, tolerance=tolerance)
+            batches.append((index, arc_points(batch, counts[index])))
+        else:  # Line, or anything else drawn as its chord
+            batches.append((index, np.array([s.end for s in batch], complex)))
+
+    offsets = np.cumsum(counts) - counts
+    points = np.zeros(int(counts.sum()), complex)
+    for index, batch_points in batches:
+        owner, k = chord_index(counts[index])
+        points[offsets[index][owner] + k] = batch_points
+    points[offsets + counts - 1] = [s.end for s in segments]
+    return points, counts
+
+
+# --- COMMANDS ---
+def load(path):
+    """Every subpath in the document, transforms applied, and its page size."""
+    document = Document(path)
+    subpaths = [
+        sub
+        for path_ in document.paths()
+        for sub in path_.continuous_subpaths()
+        if len(sub)
+    ]
+    return subpaths, page_scale(document.tree.getroot())
+
+
+def hull_points(segments):
+    """Points whose bounding box contains every segment: control points, and
+    for arcs the box around the larger radius."""
+    points = []
+    for s in segments:
+        if isinstance(s, Arc):
+            r = max(s.radius.real, s.radius.imag)
+            points.extend((s.center - r - 1j * r, s.center + r + 1j * r))
+        else:
+            points.extend(s.bpoints())
+    return np.array(points, complex)
+
+
+def fit(points):
+    """mm per user unit and the (x, y) user point that lands on the origin,
+    scaling uniformly so the points fill the bed inside the margin."""
+    xmin, xmax = points.real.min(), points.real.max()
+    ymin, ymax = points.imag.min(), points.imag.max()
+    width = max(xmax - xmin, 1e-9)
+    height = max(ymax - ymin, 1e-9)
+    scale = min((BED_WIDTH - 2 * MARGIN) / width, (BED_HEIGHT - 2 * MARGIN) / height)
+    return scale, xmin - MARGIN / scale, ymax + MARGIN / scale
+
+
+def svg_commands(path):
+    """G-code drawing an SVG file: G0 to each subpath, then M3, G1 chords, M5.
+
+    SVG's y axis points down, so it is flipped to the plotter's. When
+    fitting, the control points give a first, loose box; the chord points
+    flattened to that scale lie on the curves, so their box is the drawing's
+    own to within the tolerance, and the final pass is flattened to it.
+    """
+    subpaths, page = load(path)
+    commands = ["G90", "M5", f"F{FEED_RATE:g}"]
+    if not subpaths:
+        return commands
+    segments = [segment for sub in subpaths for segment in sub]
+    starts = np.array([sub.start for sub in subpaths])
+
+    if FIT_TO_BED:
+        rough, _, _ = fit(hull_points(segments))
+        points, counts = flatten(segments, TOLERANCE / rough)
+        scale, x0, y0 = fit(np.concatenate((starts, points)))
+        if scale > rough:
+            points, counts = flatten(segments, TOLERANCE / scale)
+    else:
+        scale, page_height = page
+        x0, y0 = 0.0, page_height  # the page's bottom-left corner
+        points, counts = flatten(segments, TOLERANCE / scale)
+    xs = (points.real - x0) * scale
+    ys = (y0 - points.imag) * scale
+    sx = (starts.real - x0) * scale
+    sy = (y0 - starts.imag) * scale
+
+    # Each subpath's chord end points are one contiguous run
+    per_subpath = np.add.reduceat(
+        counts, np.cumsum([0] + [len(sub) for sub in subpaths[:-1]])
+    )
+    begins = np.cumsum(per_subpath) - per_subpath
+    lengths = np.hypot(np.diff(xs, prepend=0.0), np.diff(ys, prepend=0.0))
+    lengths[begins] = np.hypot(xs[begins] - sx, ys[begins] - sy)
+    drawn = np.add.reduceat(lengths, begins)
+    for k, begin in enumerate(begins):
+        if drawn[k] < MIN_LENGTH:
+            continue
+        end = begin + per_subpath[k]
+        commands.append(f"G0 X{sx[k]:.4f} Y{sy[k]:.4f}")
+        commands.append("M3")
+        commands.extend(arcs.format_segments(xs[begin:end], ys[begin:end]))
+        commands.append("M5")
+    return commands
@@ -0,0 +1,145 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+import machine
+import pipeline
+from checkpoint import Checkpoint
+from cmdbuffer import CommandBuffer
+from compact import Compactor
+from simulator import FirmwareSim, round_half_away
+
+# --- Configuration ---
+PROGRAMS = 300  # random programs per run
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples")
+
+
+def random_program(seed, length=60):
+    """G-code with the spellings compaction rewrites: odd decimals, modal and
+    single-axis moves, G91 stretches, G92 offsets, repeated modes and arcs."""
+    r = random.Random(seed)
+    lines = ["G21", "G90", "G1 F800"]
+    for _ in range(length):
+        c = r.random()
+        decimals = r.randint(0, 6)
+        x, y = r.uniform(-40, 40), r.uniform(-40, 40)
+        if c < 0.05:
+            lines.append(r.choice(["G90", "G91", "M3", "M5", "G1 F1500", "F600"]))
+        elif c < 0.08:
+            lines.append(f"G92 X{x:.{decimals}f} Y{y:.{decimals}f}")
+        elif c < 0.15:
+            i, j = r.uniform(-5, 5), r.uniform(-5, 5)
+            lines.append(f"G{r.choice((2, 3))} X{x:.3f} Y{y:.3f} I{i:.3f} J{j:.3f}")
+        elif c < 0.25:
+            lines.append(f"X{x:.{decimals}f}")
+        elif c < 0.3:
+            # Short moves, where the corner check's minimum length matters
+            lines.append(f"G1 X{x / 400:.{decimals}f} Y{y / 400:.{decimals}f}")
+        else:
+            code = r.choice(("G0 ", "G1 ", "G1 ", ""))
+            lines.append(f"{code}X{x:.{decimals}f} Y{y:.{decimals}f}")
+    lines.append("M5")
+    return lines
+
+
+# What parser.cpp plans for each line: corner stops, moves as step targets
+# with their feed, and pen changes. Moves that don't step are left out.
+def plan(lines, sim=None):
+    sim = sim or FirmwareSim()
+    out = []
+    for line in lines:
+        pen = sim.pen_is_down
+        sim.parse_line(line.encode())
+        events = [("pen", sim.pen_is_down)] if sim.pen_is_down != pen else []
+        while sim.pending:
+            head = sim.pending.popleft()
+            if head[0] == "corner":
+                events.append(head)
+                continue
+            target = (
+                round_half_away(head[1] * machine.STEPS_PER_MM_X),
+                round_half_away(head[2] * machine.STEPS_PER_MM_Y),
+            )
+            if target != (sim.planner_x, sim.planner_y):
+                events.append((*target, head[3]))
+            sim.planner.clear()
+            sim.plan_move(head[1], head[2], head[3])
+        out.append(events)
+    return out
+
+
+def flatten(per_line):
+    return [event for events in per_line for event in events]
+
+
+def test_random_programs():
+    for seed in range(PROGRAMS):
+        lines = random_program(seed)
+        compacted = list(Compactor()(lines))
+        assert flatten(plan(lines)) == flatten(plan(compacted)), seed
+
+
+def test_examples():
+    for name in ("hello_world.gcode", "work_offset.gcode", "staircase.gcode"):
+        source = pipeline.open_source(os.path.join(EXAMPLES, name))
+        lines = list(pipeline.upload_stream(source))
+        compacted = list(Compactor()(lines))
+        assert flatten(plan(lines)) == flatten(plan(compacted)), name
+
+
+def test_resume():
+    """A compacted job resumed from a checkpoint lands on the steps it would
+    have, though MPos reports the head to 0.01 mm only."""
+    directory = tempfile.mkdtemp()
+    try:
+        for seed in range(20):
+            job = list(Compactor()(random_program(seed)))
+            full = plan(job)
+            stop = random.Random(seed).randrange(10, len(job))
+            sim = FirmwareSim()
+            plan(job[:stop], sim)
+            x = float(f"{sim.planner_x / machine.STEPS_PER_MM_X:.2f}")
+            y = float(f"{sim.planner_y / machine.STEPS_PER_MM_Y:.2f}")
+
+            buffer = CommandBuffer()
+            buffer.fill(job)
+            job_checkpoint = Checkpoint.create(
+                f"t{seed}", "job.gcode", buffer, directory
+            )
+            for index in range(stop):
+                job_checkpoint.acknowledge(index)
+            job_checkpoint.report(x, y)
+            sim = FirmwareSim()  # the Uno resets when the port opens
+            plan(job_checkpoint.restart(), sim)
+            resumed = plan(job[job_checkpoint.resume :], sim)
+            job_checkpoint.close()
+
+            # The firmware's new origin is the head's step
+            sx = round_half_away(x * machine.STEPS_PER_MM_X)
+            sy = round_half_away(y * machine.STEPS_PER_MM_Y)
+            moves = [e for e in flatten(full[job_checkpoint.resume :]) if len(e) == 3]
+            shifted = [
+                (e[0] + sx, e[1] + sy, e[2]) for e in flatten(resumed) if len(e) == 3
+            ]
+            assert shifted == moves, (seed, stop)
+    finally:
+        shutil.rmtree(directory)
+
+
+def run_tests():
+    failed = 0
+    for test in (test_random_programs, test_examples, test_resume):
+        print(f"[TEST] {test.__name__}... ", end="")
+        try:
+            test()
+            print("PASS")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL\n  {e}")
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if run_tests() else 0)
@@ -1,34 +1,36 @@
-import serial
 import time
 import sys
 
+import transport
+
 # --- Configuration ---
 PORT = "/dev/ttyUSB0"  # Check your port!
 BAUD = 115200
 
-# Helper to read a line but skip empty ones (robust against stray \r\n)
+TIMEOUT = 2.0
+
+# The transport already drops empty lines (robust against stray \r\n)
 def read_clean_line(s):
+    return s.readline(timeout=TIMEOUT) or ""
+
+# Collects lines up to and including the first one starting with prefix
+def read_until_line(s, prefix):
+    lines = []
     while True:
-        line = s.readline().decode('utf-8', errors='ignore').strip()
-        if line:  # If not empty, return it
-            return line
-        # If empty, loop and try again (unless timeout handling is needed)
-        # In a test script, blocking slightly is fine.
+        line = read_clean_line(s)
+        lines.append(line)
+        if not line or line.startswith(prefix):
+            return "\n".join(lines)
 
 def run_tests():
     print(f"Connecting to {PORT} at {BAUD}...")
     try:
-        s = serial.Serial(PORT, BAUD, timeout=2)
-    except serial.SerialException:
+        print("Waiting for firmware boot...")
+        s = transport.connect(PORT, BAUD)
+    except OSError:
         print(f"ERROR: Could not open {PORT}. Is the Arduino plugged in?")
         sys.exit(1)
 
-    print("Waiting for firmware boot...")
-    time.sleep(2) 
-    s.reset_input_buffer()
-    s.write(b"\n")
-    s.readline() 
-
     print("------------------------------------------------")
     print("Starting Automated Tests")
     print("------------------------------------------------")
@@ -36,7 +38,7 @@ def run_tests():
     # --- TEST 1: Pen Control ---
     print("\n[TEST 1] Pen Control (M3/M5)... ", end="")
     s.write(b"M3\n")
-    response = s.read_until(b"ok\r\n").decode('utf-8', errors='ignore')
+    response = read_until_line(s, "ok")
     
     if "[DEBUG] Pen DOWN" in response or "[DEBUG] PEN DOWN" in response:
         print("PASS")
@@ -49,28 +51,28 @@ def run_tests():
     s.write(b"G1 X0 F500\n")
     
     start_time = time.time()
-    r1 = s.readline().decode().strip() 
-    r2 = s.readline().decode().strip() 
+    r1 = read_clean_line(s)
+    r2 = read_clean_line(s)
     duration = time.time() - start_time
     
-    if r1 == "ok" and r2 == "ok" and duration < 0.5:
+    # Firmware v0.6 answers "ok T:<ms>"
+    if r1.startswith("ok") and r2.startswith("ok") and duration < 0.5:
         print(f"PASS (Response time: {duration*1000:.1f}ms)")
     else:
         print(f"FAIL\n  Time: {duration:.2f}s\n  Responses: {r1}, {r2}")
 
     time.sleep(5) 
-    s.reset_input_buffer()
+    s.discard_input()
 
     # --- TEST 3: Real-Time Reporting ---
     print("[TEST 3] Status Reporting (?) ... ", end="")
     s.write(b"G1 X100 F200\n")
-    s.readline() # Consume 'ok'
+    read_clean_line(s) # Consume 'ok'
     time.sleep(0.2)
     
     s.write(b"?")
-    # Read until '>' then consume the trailing newline to keep buffer clean
-    status = s.read_until(b">").decode().strip()
-    s.readline() # Consume the \r\n after the >
+    # The status report arrives as one "<...>" line
+    status = read_until_line(s, "<").splitlines()[-1]
     
     if "<Run" in status:
         print(f"PASS\n  Got: {status}")
@@ -88,8 +90,7 @@ def run_tests():
     
     # Check Status (Should be Hold)
     s.write(b"?")
-    status_hold = s.read_until(b">").decode().strip()
-    s.readline() # Consume trailing newline
+    status_hold = read_until_line(s, "<").splitlines()[-1]
     
     if "Paused" in pause_msg and "Hold" in status_hold:
         # Now Resume
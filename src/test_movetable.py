@@ -0,0 +1,123 @@
+import math
+import random
+import sys
+
+import movetable
+from checkpoint import ModalState
+from tokenizer import tokenize
+
+# --- Configuration ---
+PROGRAMS = 300  # random programs per run
+BATCH = 7  # lines per compile_moves() call when compiling in batches
+SLACK = 1e-9  # mm; G91 increments are summed in a different order
+FIELDS = ("x", "y", "offset_x", "offset_y")  # compared with slack
+
+
+def random_program(seed, length=80):
+    """Every modal word the table resolves: motion modes (G92 included),
+    G90/G91, M3/M5, F and Z, with moves that name one axis or none."""
+    r = random.Random(seed)
+    lines = []
+    for _ in range(length):
+        c = r.random()
+        x, y = r.uniform(-30, 30), r.uniform(-30, 30)
+        decimals = r.randint(0, 5)
+        if c < 0.08:
+            lines.append(r.choice(["G90", "G91", "M3", "M5", "F1200", "G1 Z-1", "Z5"]))
+        elif c < 0.12:
+            lines.append(f"G92 X{x:.{decimals}f}" + r.choice(("", f" Y{y:.2f}")))
+        elif c < 0.25:
+            i, j = r.uniform(-5, 5), r.uniform(-5, 5)
+            code = r.choice(("G2 ", "G3 ", ""))
+            lines.append(f"{code}X{x:.3f} Y{y:.3f} I{i:.3f} J{j:.3f}")
+        elif c < 0.35:
+            lines.append(r.choice((f"X{x:.{decimals}f}", f"G1 Y{y:.{decimals}f}")))
+        elif c < 0.38:
+            lines.append("G1 M3")  # a motion mode with no move
+        else:
+            code = r.choice(("G0 ", "G1 ", ""))
+            lines.append(
+                f"{code}X{x:.{decimals}f} Y{y:.{decimals}f} F{r.randint(100, 3000)}"
+            )
+    return lines
+
+
+def close(a, b):
+    return math.isclose(a, b, rel_tol=0.0, abs_tol=SLACK)
+
+
+def same_state(a, b, fields=FIELDS):
+    return all(close(getattr(a, k), getattr(b, k)) for k in fields) and (
+        a.absolute,
+        a.pen,
+        a.feed_rate,
+        a.z,
+        a.motion_mode,
+    ) == (b.absolute, b.pen, b.feed_rate, b.z, b.motion_mode)
+
+
+def test_rows_match_modal_state():
+    for seed in range(PROGRAMS):
+        lines = random_program(seed)
+        table = movetable.compile_moves(lines)
+        rows = {int(row["line"]): row for row in table}
+        s = ModalState()
+        last = (s.target_x, s.target_y)  # where the previous move ended
+        for k, line in enumerate(lines):
+            s.feed(line)
+            row = rows.get(k)
+            if row is None:
+                continue
+            # An arc with no X/Y goes to the position the planner holds
+            block = tokenize(line)
+            moved = block.x is not None or block.y is not None
+            target = (s.target_x, s.target_y) if moved else (s.x, s.y)
+            where = (seed, k, line)
+            assert close(row["x0"], last[0]) and close(row["y0"], last[1]), where
+            assert close(row["x"], target[0]) and close(row["y"], target[1]), where
+            assert close(row["offset_x"], s.offset_x), where
+            assert close(row["offset_y"], s.offset_y), where
+            modes = (row["kind"], row["feed"], row["pen"], row["absolute"], row["z"])
+            assert modes == (s.motion_mode, s.feed_rate, s.pen, s.absolute, s.z), where
+            last = target
+
+
+def test_batches_carry_state():
+    for seed in range(PROGRAMS):
+        lines = random_program(seed)
+        whole = ModalState()
+        table = movetable.compile_moves(lines, whole)
+        state = ModalState()
+        parts = [
+            movetable.compile_moves(lines[k : k + BATCH], state, k)
+            for k in range(0, len(lines), BATCH)
+        ]
+        replayed = ModalState()
+        for line in lines:
+            replayed.feed(line)
+        assert same_state(whole, replayed), seed
+        # ModalState keeps an arc's unrounded target even when the arc had
+        # no X/Y; the batches must agree with the whole table exactly
+        assert same_state(state, whole, FIELDS + ("target_x", "target_y")), seed
+        batched = [row for part in parts for row in part]
+        assert len(batched) == len(table), seed
+        for a, b in zip(batched, table):
+            assert a["line"] == b["line"] and a["kind"] == b["kind"], seed
+            assert close(a["x"], b["x"]) and close(a["y"], b["y"]), seed
+
+
+def run_tests():
+    failed = 0
+    for test in (test_rows_match_modal_state, test_batches_carry_state):
+        print(f"[TEST] {test.__name__}... ", end="")
+        try:
+            test()
+            print("PASS")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL\n  {e}")
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if run_tests() else 0)
@@ -0,0 +1,124 @@
+import math
+import random
+import sys
+
+import machine
+import pipeline
+from simulator import FirmwareSim
+
+# --- Configuration ---
+ARC = "G2 X10 Y0 I5 J0"  # a half circle the firmware draws within ARC_MAX_ERROR
+PROGRAMS = 200  # random programs per run
+RESOLUTION = 0.2  # mm; coarse, so the firmware model has few segments to plan
+PARALLEL_LINES = 3 * pipeline.CHUNK_LINES  # enough for several chunks
+
+
+# A modal half circle back to the origin, padded out to length characters
+def modal_arc(length):
+    tail = " Y0 I-5 J0"
+    return "X0." + "0" * (length - len(tail) - 3) + tail
+
+
+def test_modal_arc_fits_with_prefix():
+    longest = machine.LINE_BUFFER_SIZE - 2 - len("G2 ")
+    for length in (longest, longest + 1, machine.LINE_BUFFER_SIZE - 2):
+        lines = ["G90", "M3", ARC, modal_arc(length), "M5"]
+        out = list(pipeline.linearize(lines, arc_mode="auto"))
+        assert all(len(line) + 1 < machine.LINE_BUFFER_SIZE for line in out), out
+        kept = "G2 " + modal_arc(length) in out
+        assert kept == (length <= longest), (length, out[:5])
+
+
+def random_arcs(seed, length=20):
+    """Arcs and lines in G91, after a G92 half the time."""
+    r = random.Random(seed)
+    lines = ["G90", "G1 X10 Y10", r.choice(("G92 X0 Y0", "G90")), "G91", "M3"]
+    for _ in range(length):
+        dx, dy = r.uniform(-3, 3), r.uniform(-3, 3)
+        if r.random() < 0.6:
+            # An arc that ends on its circle, a start angle away from its start
+            i, j = r.uniform(-2, 2), r.uniform(-2, 2)
+            angle = math.atan2(-j, -i) + r.uniform(-3, 3)
+            dx = i + math.hypot(i, j) * math.cos(angle)
+            dy = j + math.hypot(i, j) * math.sin(angle)
+            code = r.choice((2, 3))
+            lines.append(f"G{code} X{dx:.3f} Y{dy:.3f} I{i:.3f} J{j:.3f}")
+        else:
+            lines.append(f"G1 X{dx:.3f} Y{dy:.3f}")
+    lines.append("M5")
+    return lines
+
+
+# The planner's position in steps after each line
+def positions(lines):
+    sim = FirmwareSim()
+    out = []
+    for line in lines:
+        sim.parse_line(line.encode())
+        while sim.pending:
+            sim.planner.clear()
+            sim.drain_pending()
+        out.append((sim.planner_x, sim.planner_y))
+    return out
+
+
+def test_arcs_end_on_target():
+    for seed in range(PROGRAMS):
+        lines = random_arcs(seed)
+        out = list(pipeline.linearize(lines, RESOLUTION, arc_mode="host"))
+        assert positions(lines)[-1] == positions(out)[-1], seed
+
+
+def random_job(seed):
+    """A long job with strokes started by G0 travels, where chunks are cut,
+    and G91 stretches, G92 offsets and modal arcs running across them."""
+    r = random.Random(seed)
+    lines = ["G90", "G1 F1500"]
+    while len(lines) < PARALLEL_LINES:
+        lines.append(f"G0 X{r.uniform(0, 200):.3f} Y{r.uniform(0, 200):.3f}")
+        lines.append("M3")
+        if r.random() < 0.1:
+            lines.append(f"G92 X{r.uniform(-5, 5):.2f} Y{r.uniform(-5, 5):.2f}")
+        if r.random() < 0.2:
+            lines.append("G91")
+        for _ in range(r.randint(5, 60)):
+            if r.random() < 0.3:
+                i, j = r.uniform(-2, 2), r.uniform(-2, 2)
+                code = r.choice(("G2 ", "G3 ", ""))
+                lines.append(f"{code}X{i * 2:.3f} Y{j * 2:.3f} I{i:.3f} J{j:.3f}")
+            else:
+                lines.append(f"G1 X{r.uniform(-3, 3):.3f} Y{r.uniform(-3, 3):.3f}")
+        lines += ["G90", "M5"]
+    return lines
+
+
+def test_parallel_matches_serial():
+    lines = random_job(0)
+    assert len(list(pipeline.split_chunks(lines))) > 2
+    for arc_mode in pipeline.ARC_MODES:
+        serial = list(pipeline.linearize(lines, RESOLUTION, arc_mode=arc_mode))
+        parallel = list(
+            pipeline.parallel_linearize(lines, RESOLUTION, arc_mode=arc_mode, workers=2)
+        )
+        assert parallel == serial, arc_mode
+
+
+def run_tests():
+    failed = 0
+    for test in (
+        test_modal_arc_fits_with_prefix,
+        test_arcs_end_on_target,
+        test_parallel_matches_serial,
+    ):
+        print(f"[TEST] {test.__name__}... ", end="")
+        try:
+            test()
+            print("PASS")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL\n  {e}")
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if run_tests() else 0)
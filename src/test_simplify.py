@@ -0,0 +1,85 @@
+import math
+import os
+import sys
+
+import pipeline
+from simplify import Simplifier
+from tokenizer import tokenize
+
+# --- Configuration ---
+TOLERANCE = 0.02
+FORMAT_SLACK = 1e-4  # mm; merged points are written with four decimals
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples")
+
+
+# (x, y) after every line of an absolute stream, missing axes filled in
+def points(lines):
+    x = y = 0.0
+    out = []
+    for line in lines:
+        block = tokenize(line)
+        x = block.x if block.x is not None else x
+        y = block.y if block.y is not None else y
+        out.append((x, y))
+    return out
+
+
+def distance_to_segment(p, a, b):
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length = dx * dx + dy * dy
+    t = 0.0
+    if length:
+        t = max(0.0, min(1.0, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length))
+    return math.hypot(p[0] - a[0] - t * dx, p[1] - a[1] - t * dy)
+
+
+# Every original point lies within tolerance of the simplified path
+def within_tolerance(lines, simplified):
+    path = points(simplified)
+    segments = list(zip(path, path[1:])) or [(path[0], path[0])]
+    return all(
+        min(distance_to_segment(p, a, b) for a, b in segments)
+        <= TOLERANCE + FORMAT_SLACK
+        for p in points(lines)
+    )
+
+
+def test_single_axis_run():
+    lines = ["G90", "G1 Z-1", "G1 X0 Y0", "G1 Y0.019", "G1 X10", "G1 Y0.038", "G0 Z5"]
+    simplified = list(Simplifier(TOLERANCE)(lines))
+    assert points(simplified)[-1] == (10.0, 0.038), simplified
+    assert within_tolerance(lines, simplified), simplified
+
+
+def test_modal_g1_merges():
+    lines = ["G90", "M3", "G1 X0 Y0 F400", "X1 Y0.001", "X2 Y0", "X3 Y0.001", "M5"]
+    simplifier = Simplifier(TOLERANCE)
+    simplified = list(simplifier(lines))
+    assert simplifier.removed == 2, simplified
+    assert points(simplified)[-1] == (3.0, 0.001), simplified
+
+
+def test_examples():
+    for name in ("hello_world.gcode", "work_offset.gcode", "staircase.gcode"):
+        source = pipeline.open_source(os.path.join(EXAMPLES, name))
+        lines = list(pipeline.upload_stream(source))
+        simplified = list(Simplifier(TOLERANCE)(lines))
+        assert points(simplified)[-1] == points(lines)[-1], name
+        assert within_tolerance(lines, simplified), name
+
+
+def run_tests():
+    failed = 0
+    for test in (test_single_axis_run, test_modal_g1_merges, test_examples):
+        print(f"[TEST] {test.__name__}... ", end="")
+        try:
+            test()
+            print("PASS")
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL\n  {e}")
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if run_tests() else 0)
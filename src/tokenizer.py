@@ -0,0 +1,59 @@
+import re
+
+# One compiled pattern walked once over the line: a letter and its number
+WORD_RE = re.compile(r"([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))")
+
+
+class Block:
+    """One tokenized G-code line: its G/M codes plus the X/Y/Z/I/J/F words."""
+
+    __slots__ = ("g", "m", "x", "y", "z", "i", "j", "f")
+
+    def __init__(self):
+        self.g = ()
+        self.m = ()
+        self.x = self.y = self.z = None
+        self.i = self.j = self.f = None
+
+    @property
+    def command(self):
+        """First G code on the line, or -1 (same rule the linearizer always used)."""
+        return self.g[0] if self.g else -1
+
+
+def strip_comment(line):
+    """Drops ';' and '(' comments and surrounding whitespace, like parser.cpp."""
+    if ";" in line:
+        line = line.split(";")[0]
+    if "(" in line:
+        line = line.split("(")[0]
+    return line.strip()
+
+
+def tokenize(line):
+    """Splits a line into a Block in a single pass. Comments are ignored."""
+    block = Block()
+    g = []
+    m = []
+    for letter, value in WORD_RE.findall(strip_comment(line).upper()):
+        if letter == "G":
+            g.append(int(float(value)))
+        elif letter == "M":
+            m.append(int(float(value)))
+        elif letter == "X":
+            block.x = float(value)
+        elif letter == "Y":
+            block.y = float(value)
+        elif letter == "Z":
+            block.z = float(value)
+        elif letter == "I":
+            block.i = float(value)
+        elif letter == "J":
+            block.j = float(value)
+        elif letter == "F":
+            block.f = float(value)
+    if g:
+        block.g = tuple(g)
+    if m:
+        block.m = tuple(m)
+    return block
@@ -0,0 +1,194 @@
+import math
+import threading
+from collections import deque
+
+import estimate
+import machine
+from checkpoint import ModalState
+from tokenizer import tokenize
+
+# --- CONFIGURATION ---
+POLL_RUN = 0.5  # s between '?' while the head moves; the predictor fills in
+POLL_IDLE = 2.0  # s between '?' while Idle or in a feed hold
+RTT_FACTOR = 3.0  # never poll more often than once per this many round trips
+RTT_SMOOTHING = 0.2  # weight of a new round trip in the running average
+SNAP_DISTANCE = 0.05  # mm; a report this close to a queued segment is on it
+SEARCH = 64  # segments searched around the predicted one for a report
+
+
+class PollScheduler:
+    """How long to wait before the next '?'.
+
+    Fast while the firmware last said Run or commands went out since its
+    last report, slow while it is Idle or held; never faster than
+    RTT_FACTOR smoothed round trips, so a slow link isn't flooded.
+    """
+
+    def __init__(self):
+        self.state = "Idle"
+        self.busy = False
+        self.rtt = None
+
+    def sent(self):
+        """A command went out: the head is about to move."""
+        self.busy = True
+
+    def report(self, state, rtt=None):
+        self.state = state
+        self.busy = False
+        if rtt is not None:
+            if self.rtt is None:
+                self.rtt = rtt
+            else:
+                self.rtt += RTT_SMOOTHING * (rtt - self.rtt)
+
+    def interval(self):
+        if self.state == "Run" or (self.busy and self.state != "Hold"):
+            interval = POLL_RUN
+        else:
+            interval = POLL_IDLE
+        if self.rtt is not None:
+            interval = max(interval, RTT_FACTOR * self.rtt)
+        return interval
+
+
+class HeadPredictor:
+    """Where the head is between status reports.
+
+    Every command sent is replayed through parser.cpp's modal state into
+    the straight moves the planner will run (arcs cut like handle_arc),
+    each lasting what stepper_plan_move makes it last. A move starts when
+    the one before it ends, but never before its line can have crossed the
+    link and been parsed, so a starved planner is followed too. A report
+    snaps the prediction onto the queued move the head is on. Times are
+    time.perf_counter() seconds.
+    """
+
+    def __init__(self, baud=machine.BAUD_RATE):
+        self.char_time = 10.0 / baud
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self, x=0.0, y=0.0):
+        """The firmware (re)started with the head at x, y."""
+        with self.lock:
+            self.modal = ModalState()
+            self.modal.x, self.modal.y = x, y
+            # [x0, y0, x1, y1, duration, earliest start]; the first is running
+            self.queue = deque()
+            self.behind = deque(maxlen=SEARCH)  # moves predicted finished
+            self.x, self.y = x, y
+            self.started = 0.0  # when queue[0] started, or will
+            self.wire_free = 0.0  # when the last byte sent is through the link
+            self.held = None  # when a feed hold froze the head
+
+    # --- INPUT ---
+    def command(self, line, now):
+        """line was sent to the firmware at now."""
+        block = tokenize(line)
+        with self.lock:
+            self.wire_free = max(now, self.wire_free) + (len(line) + 1) * self.char_time
+            ready = self.wire_free + estimate.PARSE_TIME
+            s = self.modal
+            x0, y0 = s.x, s.y
+            s.apply(block)
+            if (s.x, s.y) == (x0, y0):
+                return
+            feed = machine.MAX_FEED_RATE if s.motion_mode == 0 else s.feed_rate
+            if s.motion_mode in (2, 3):
+                xs, ys = estimate.arc_points(
+                    x0, y0, s.x, s.y, block.i or 0.0, block.j or 0.0, s.motion_mode == 2
+                )
+            else:
+                xs, ys = [s.x], [s.y]
+            self.advance(now)
+            for x1, y1 in zip(xs, ys):
+                duration = estimate.move_time(x0, y0, x1, y1, feed)
+                if duration > 0:
+                    if not self.queue:
+                        self.started = ready
+                    self.queue.append([x0, y0, x1, y1, duration, ready])
+                x0, y0 = x1, y1
+
+    def hold(self, now):
+        """Feed hold ('!'): the head stops where it is."""
+        with self.lock:
+            if self.held is None:
+                self.advance(now)
+                self.held = now
+
+    def resume(self, now):
+        """Cycle start ('~')."""
+        with self.lock:
+            if self.held is not None:
+                self.started += now - self.held
+                self.held = None
+
+    def report(self, x, y, state, at):
+        """The firmware said the head was at x, y in state at time at.
+
+        Returns False when the position lies on none of the queued moves
+        (a jog the host didn't send, a lost line); the prediction then
+        restarts from the report.
+        """
+        with self.lock:
+            self.advance(at)
+            moves = list(self.behind) + list(self.queue)
+            current = len(self.behind)
+            best = None
+            for k in range(max(0, current - SEARCH), min(len(moves), current + SEARCH)):
+                x0, y0, x1, y1 = moves[k][:4]
+                t, distance = project(x, y, x0, y0, x1, y1)
+                if distance <= SNAP_DISTANCE and (
+                    best is None or abs(k - current) < abs(best[0] - current)
+                ):
+                    best = (k, t)
+            self.x, self.y = x, y
+            self.held = at if state == "Hold" else None
+            if best is None:
+                self.behind.clear()
+                self.queue.clear()
+                return False
+            k, t = best
+            if state == "Idle":
+                # Stopped between two moves; the rest are yet to be parsed
+                k, t = (k + 1 if t > 0.5 else k), 0.0
+            self.behind.extend(moves[:k])
+            self.queue = deque(moves[k:])
+            if self.queue:
+                move = self.queue[0]
+                self.started = at - t * move[4] if t else max(at, move[5])
+            return True
+
+    # --- OUTPUT ---
+    def advance(self, now):
+        """Retires the moves finished by now."""
+        if self.held is not None:
+            now = self.held
+        while self.queue and now >= self.started + self.queue[0][4]:
+            move = self.queue.popleft()
+            self.x, self.y = move[2], move[3]
+            self.behind.append(move)
+            if self.queue:
+                self.started = max(self.started + move[4], self.queue[0][5])
+
+    def position(self, now):
+        """Predicted (x, y) of the head at now, in machine mm."""
+        with self.lock:
+            self.advance(now)
+            if not self.queue:
+                return self.x, self.y
+            if self.held is not None:
+                now = self.held
+            x0, y0, x1, y1, duration, _ = self.queue[0]
+            t = min(1.0, max(0.0, (now - self.started) / duration))
+            return x0 + (x1 - x0) * t, y0 + (y1 - y0) * t
+
+
+def project(x, y, x0, y0, x1, y1):
+    """Where (x, y) falls along the segment, 0..1, and its distance from it."""
+    dx, dy = x1 - x0, y1 - y0
+    length2 = dx * dx + dy * dy
+    t = 0.0 if length2 == 0 else ((x - x0) * dx + (y - y0) * dy) / length2
+    t = min(1.0, max(0.0, t))
+    return t, math.hypot(x0 + dx * t - x, y0 + dy * t - y)
@@ -0,0 +1,267 @@
+import asyncio
+import os
+import queue
+import socket
+import threading
+import tty
+
+# --- CONFIGURATION ---
+SETTLE_TIME = 2.0  # seconds the Uno needs to reboot after the port opens
+READ_SIZE = 4096
+
+
+# --- BACKENDS ---
+# A backend only has to open something with a file descriptor; the transport
+# does all reading and writing on that descriptor itself.
+class PySerialBackend:
+    """A real serial port, configured by pyserial."""
+
+    def __init__(self, port, baud):
+        self.port = port
+        self.baud = baud
+        self.serial = None
+
+    def open(self):
+        import serial
+
+        self.serial = serial.Serial(self.port, self.baud, timeout=0)
+        return self.serial.fileno()
+
+    def close(self):
+        if self.serial:
+            self.serial.close()
+
+
+class PtyBackend:
+    """Any tty device node, e.g. the slave side of a simulator's pty."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def open(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(self.fd)
+        return self.fd
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class LoopbackBackend:
+    """In-memory link. Whatever serves `device` plays the plotter."""
+
+    def __init__(self):
+        self.host, self.device = socket.socketpair()
+
+    def open(self):
+        return self.host.fileno()
+
+    def close(self):
+        self.host.close()
+
+
+def make_backend(port, baud):
+    """Picks a backend from the port name: loop://, a pty, or pyserial."""
+    if port == "loop://":
+        return LoopbackBackend()
+    if os.path.realpath(port).startswith("/dev/pts/"):
+        return PtyBackend(port)
+    return PySerialBackend(port, baud)
+
+
+# --- TRANSPORT ---
+class Transport:
+    """Line-oriented serial link driven by an asyncio loop on one thread.
+
+    The reader wakes as soon as the descriptor is readable and hands each
+    complete line to on_line on the loop thread; without a callback, lines
+    are queued for readline(). write() is safe from any thread: data goes
+    through one queue drained by a single writer task, so commands from the
+    UI and the uploader never interleave on the wire.
+    """
+
+    def __init__(self, backend, on_line=None):
+        self.backend = backend
+        self.on_line = on_line
+        self.lines = queue.Queue()
+        self.loop = None
+        self.thread = None
+        self.loop_thread = None
+        self.fd = None
+        self.is_open = False
+        self.ready = threading.Event()
+        self.error = None
+        self._rx = bytearray()
+        self._tx = None
+        self._tasks = []
+
+    # --- LIFECYCLE ---
+    def start(self, settle=SETTLE_TIME, ready_text=None):
+        """Runs the link on a daemon thread and waits until it is ready.
+
+        With ready_text, the wait for the reboot ends as soon as a line
+        containing it (the firmware's banner) arrives, settle at the latest.
+        """
+        self.thread = threading.Thread(
+            target=self.run, args=(settle, ready_text), daemon=True
+        )
+        self.thread.start()
+        self.ready.wait()
+        if self.error:
+            raise self.error
+        return self
+
+    def run(self, settle=SETTLE_TIME, ready_text=None):
+        """Runs the link on the calling thread until close()."""
+        self.loop_thread = threading.current_thread()
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self._main(settle, ready_text))
+        except Exception as e:
+            self.error = e
+        finally:
+            self.is_open = False
+            self.ready.set()
+            self.backend.close()
+            self.loop.close()
+
+    async def _main(self, settle, ready_text):
+        self.fd = self.backend.open()
+        os.set_blocking(self.fd, False)
+        self._tx = asyncio.Queue()
+        self._stop = asyncio.Event()
+        self._booted = asyncio.Event()
+        self._ready_text = ready_text
+        self.loop.add_reader(self.fd, self._on_readable)
+        writer = self.loop.create_task(self._writer())
+
+        # Wake the firmware, let it reboot, then drop the banner
+        self.write(b"\r\n\r\n")
+        if settle and ready_text:
+            try:
+                await asyncio.wait_for(self._booted.wait(), settle)
+            except asyncio.TimeoutError:
+                pass
+        elif settle:
+            await asyncio.sleep(settle)
+        self._rx.clear()
+        self.discard_input()
+        self.is_open = True
+        self.ready.set()
+
+        await self._stop.wait()
+        self.loop.remove_reader(self.fd)
+        writer.cancel()
+        for task in self._tasks:
+            task.cancel()
+
+    def close(self):
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._stop.set)
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+
+    def wait_closed(self):
+        if self.thread:
+            self.thread.join()
+
+    # --- READ ---
+    def _on_readable(self):
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.error = e
+            self._stop.set()
+            return
+        if not data:
+            self._stop.set()
+            return
+        self._rx += data
+        while True:
+            end = self._rx.find(b"\n")
+            if end < 0:
+                break
+            raw = bytes(self._rx[:end])
+            del self._rx[: end + 1]
+            line = raw.decode("utf-8", errors="ignore").strip()
+            if not line:
+                continue
+            if self._ready_text and self._ready_text in line:
+                self._booted.set()
+            if self.on_line:
+                self.on_line(line)
+            else:
+                self.lines.put(line)
+
+    def readline(self, timeout=None):
+        """Next line without the newline, or None on timeout."""
+        try:
+            return self.lines.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def discard_input(self):
+        while not self.lines.empty():
+            self.lines.get_nowait()
+
+    # --- WRITE ---
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        if threading.current_thread() is self.loop_thread:
+            self._tx.put_nowait(data)
+        else:
+            self.loop.call_soon_threadsafe(self._tx.put_nowait, data)
+
+    async def _writer(self):
+        while True:
+            data = await self._tx.get()
+            view = memoryview(data)
+            while view:
+                try:
+                    n = os.write(self.fd, view)
+                    view = view[n:]
+                except BlockingIOError:
+                    writable = self.loop.create_future()
+                    self.loop.add_writer(self.fd, writable.set_result, None)
+                    try:
+                        await writable
+                    finally:
+                        self.loop.remove_writer(self.fd)
+
+    # --- TIMERS ---
+    def every(self, interval, callback):
+        """Calls callback on the loop thread every interval seconds.
+
+        interval may be a function, asked for the next wait after every call.
+        A callback that raises is reported through the loop's exception
+        handler and called again on the next tick.
+        """
+
+        async def ticker():
+            while True:
+                await asyncio.sleep(interval() if callable(interval) else interval)
+                try:
+                    callback()
+                except Exception as e:
+                    self.loop.call_exception_handler(
+                        {
+                            "message": f"every() callback {callback!r} failed",
+                            "exception": e,
+                        }
+                    )
+
+        def schedule():
+            self._tasks.append(self.loop.create_task(ticker()))
+
+        self.loop.call_soon_threadsafe(schedule)
+
+
+def connect(port, baud, on_line=None, settle=SETTLE_TIME, ready_text=None):
+    """Opens port with the matching backend and starts its transport thread."""
+    return Transport(make_backend(port, baud), on_line).start(settle, ready_text)
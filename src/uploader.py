@@ -0,0 +1,377 @@
+import threading
+import time
+from collections import deque
+
+import machine
+import metrics
+import tracking
+import transport
+
+# --- CONFIGURATION ---
+STREAM_MODE = "ping-pong"  # or "char-count" to keep the firmware buffer full
+# Bytes allowed in flight in char-count mode: the firmware RX ring, minus one
+# byte so a realtime '?' always fits
+STREAM_WINDOW = machine.RX_BUFFER_SIZE - 1
+WATCHDOG_THRESHOLD = 1.0  # s Idle with nothing answered before re-sending
+READY_TEXT = "Ready"  # in the firmware's banner, once setup() is done
+WAIT_STEP = 0.1  # s between checks of the link in wait()
+RECONNECT_INTERVAL = 2.0  # s between attempts to reopen a lost port
+ETA_SETTLE_TIME = 5.0  # s of plotting before the ETA follows the real pace
+
+
+class Uploader:
+    """One plotter on one serial port, and the job streaming to it.
+
+    Flow control is the GUI's: ping-pong keeps one command on the wire,
+    char-count keeps the firmware's RX buffer full. '?' polls follow a
+    tracking.PollScheduler, and an Idle report with nothing answered for
+    WATCHDOG_THRESHOLD restarts the stream after a lost "ok". Replies are
+    handled on the transport's loop thread; start() and notify() may be
+    called from any other.
+
+    Everything is per device, so one process can drive several ports; the
+    job buffer is only read, so devices can stream the same one.
+    Subclasses hook in by overriding write_command(), handle_status(),
+    finish() or interrupt().
+    """
+
+    def __init__(
+        self, port, baud=machine.BAUD_RATE, stream_mode=STREAM_MODE, log=print
+    ):
+        self.port = port
+        self.baud = baud
+        self.stream_mode = stream_mode
+        self.window = STREAM_WINDOW  # char-count budget in bytes
+        self.log = log
+        self.stats = metrics.NullMetrics()
+        self.link = None
+        self.lock = threading.RLock()
+
+        self.buffer = None
+        self.checkpoint = None
+        self.uploading = False
+        self.interrupted = False  # the link dropped before the job finished
+        self.paused = False
+        self.start_index = 0  # line a resumed job started from
+        self.current = 0  # next line to send
+        self.acked = 0
+        self.started = 0.0
+        self.first_byte = None  # when the job's first line was written
+        self.last_ack_time = 0.0
+        self.last_send_time = 0.0
+        self.last_status_time = 0.0
+        self.ok_time = None  # when the last job "ok" arrived, until the next send
+        self.finished = threading.Event()
+        self.estimate = None  # estimate.Estimate of the job, for eta()
+
+        # (byte length, job line index or None) of every line sent but not
+        # yet answered with "ok"
+        self.inflight = deque()
+        self.inflight_bytes = 0
+        self.status_inflight = 0
+        self.status_sent = deque()  # send times of unanswered '?'
+
+        self.state = None  # Idle, Run or Hold, from the last report
+        self.x = self.y = 0.0  # last reported MPos
+        self.head = tracking.HeadPredictor(baud)
+        self.scheduler = tracking.PollScheduler()
+
+    # --- LINK ---
+    def connect(self, settle=transport.SETTLE_TIME, ready_text=READY_TEXT):
+        """Opens the port and waits for the firmware's reboot."""
+        self.link = transport.connect(
+            self.port, self.baud, self.handle_line, settle, ready_text
+        )
+        self.reset_inflight()
+        self.head.reset()  # Opening the port resets the Uno
+        self.link.every(self.scheduler.interval, self.poll_status)
+
+    @property
+    def connected(self):
+        return self.link is not None and self.link.is_open
+
+    def close(self):
+        if self.link:
+            self.link.close()
+
+    def keep_connected(self, interval=RECONNECT_INTERVAL, stop=None):
+        """Connects, and reconnects whenever the link drops, until stop is set.
+
+        Meant for a thread of its own; a job the drop interrupted keeps
+        its checkpoint for a resume.
+        """
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                self.connect()
+                self.log(f"Connected to {self.port}")
+                self.link.wait_closed()
+                if stop.is_set():
+                    return  # close() from the owner, not a drop
+                if self.link.error:
+                    raise self.link.error
+                self.log(f"{self.port}: serial link closed")
+            except Exception as e:
+                self.log(f"{self.port}: serial error: {e}")
+            self.interrupt()
+            stop.wait(interval)
+
+    # --- JOB ---
+    def start(self, buffer, start=0, preamble=(), checkpoint=None):
+        """Streams buffer from line start, after the preamble commands."""
+        with self.lock:
+            if self.checkpoint and self.checkpoint is not checkpoint:
+                self.checkpoint.close()
+            self.buffer = buffer
+            self.checkpoint = checkpoint
+            self.start_index = self.current = self.acked = start
+            self.first_byte = self.ok_time = self.estimate = None
+            self.uploading = True
+            self.interrupted = self.paused = False
+            self.finished.clear()
+            self.started = time.perf_counter()
+        for line in preamble:
+            self.send(line)
+        self.pump()
+
+    def notify(self):
+        """Called by the producer thread as lines land in the job buffer."""
+        if self.uploading and not self.paused:
+            self.pump()
+
+    def wait(self, timeout=None):
+        """Blocks until the job is acknowledged to its last line.
+
+        Returns False on timeout; raises ConnectionError if the link drops.
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not self.finished.wait(WAIT_STEP):
+            if not self.connected:
+                raise ConnectionError(f"{self.port}: link lost at line {self.acked}")
+            if deadline is not None and time.perf_counter() > deadline:
+                return False
+        return True
+
+    def pause(self):
+        with self.lock:
+            self.paused = True
+            self.send("!")
+
+    def resume(self):
+        with self.lock:
+            self.paused = False
+            self.send("~")
+        self.pump()
+
+    def interrupt(self):
+        """The link dropped: stop streaming, keeping the job's checkpoint.
+
+        Returns True if a job was cut short.
+        """
+        with self.lock:
+            if self.interrupted or self.buffer is None or self.finished.is_set():
+                return False
+            self.interrupted = True
+            self.uploading = False
+            if self.checkpoint:
+                self.checkpoint.flush()
+            self.log(f"{self.port}: link lost at line {self.acked}")
+            return True
+
+    def rate(self):
+        """Acknowledged lines/sec for the running job."""
+        elapsed = time.perf_counter() - self.started
+        return (self.acked - self.start_index) / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        """Seconds left in the running job, or None before there's an estimate.
+
+        The model's remaining time is stretched by how far the job has run
+        behind (or ahead of) the model so far.
+        """
+        if self.estimate is None:
+            return None
+        remaining = self.estimate.remaining(self.acked)
+        elapsed = time.perf_counter() - self.started
+        modelled = self.estimate.remaining(self.start_index) - remaining
+        if elapsed > ETA_SETTLE_TIME and modelled > 0:
+            remaining *= elapsed / modelled
+        return remaining
+
+    # --- STREAMING ---
+    def pump(self):
+        if not self.uploading or self.paused or not self.connected:
+            return
+        with self.lock:
+            while True:
+                data = self.next_command()
+                if data is None:
+                    if self.exhausted():
+                        self.uploading = False
+                        if self.acked >= self.current:
+                            self.finish()
+                    return
+                if self.stream_mode == "char-count":
+                    # Unanswered '?' bytes sit in the same RX buffer as the lines
+                    used = self.inflight_bytes + self.status_inflight
+                    if self.inflight and used + len(data) > self.window:
+                        return
+                elif self.inflight:
+                    return
+                self.write_command(data)
+
+    def next_command(self):
+        """Next line to stream (a memoryview, not consumed), or None if not there yet."""
+        if self.buffer is not None and self.current < len(self.buffer):
+            return self.buffer[self.current]
+        return None
+
+    def exhausted(self):
+        """True once every line of the job has been sent."""
+        if self.buffer is None or not self.buffer.done(self.current):
+            return False
+        if self.buffer.error:
+            self.log(f"{self.port}: preprocessing failed: {self.buffer.error}")
+        return True
+
+    def write_command(self, data):
+        if len(data) >= machine.LINE_BUFFER_SIZE:
+            self.log(f"[WARN] Line too long for firmware: {bytes(data[:-1]).decode()}")
+        # Zero-copy: the transport writes straight from the job buffer
+        self.link.write(data)
+        now = self.last_send_time = time.perf_counter()
+        if self.first_byte is None:
+            self.first_byte = now
+        if self.ok_time is not None:
+            self.stats.observe("ok_to_send_time", now - self.ok_time)
+            self.ok_time = None
+        self.inflight.append((len(data), self.current))
+        self.inflight_bytes += len(data)
+        self.head.command(bytes(data[:-1]).decode(), now)
+        self.scheduler.sent()
+        self.current += 1
+
+    def send(self, code):
+        """A command from outside the job (console, buttons, a preamble)."""
+        if not self.connected:
+            return
+        data = f"{code}\n".encode()
+        with self.lock:
+            self.link.write(data)
+            # Realtime characters are never answered with "ok"
+            if code not in ("?", "!", "~"):
+                self.inflight.append((len(data), None))
+                self.inflight_bytes += len(data)
+        now = self.last_send_time = time.perf_counter()
+        if code == "!":
+            self.head.hold(now)
+        elif code == "~":
+            self.head.resume(now)
+        elif code != "?":
+            self.head.command(code, now)
+            self.scheduler.sent()
+
+    def finish(self):
+        elapsed = max(1e-9, time.perf_counter() - self.started)
+        sent = self.acked - self.start_index
+        self.log(
+            f"{self.port}: done, {sent} lines in {elapsed:.1f} s"
+            f" ({sent / elapsed:.1f} lines/sec)"
+        )
+        self.finished.set()
+
+    def acknowledge(self):
+        with self.lock:
+            self.last_ack_time = time.perf_counter()
+            if not self.inflight:
+                return
+            size, index = self.inflight.popleft()
+            self.inflight_bytes -= size
+            if index is None:
+                return  # A console command, not a job line
+            self.acked = index + 1
+            self.ok_time = self.last_ack_time if self.uploading else None
+            if self.checkpoint:
+                self.checkpoint.acknowledge(index)
+                if self.buffer.done(self.acked):
+                    self.checkpoint.remove()
+                    self.checkpoint = None
+            if not self.uploading and self.acked >= self.current:
+                self.finish()
+
+    def reset_inflight(self):
+        with self.lock:
+            self.inflight.clear()
+            self.inflight_bytes = 0
+            self.status_inflight = 0
+            self.status_sent.clear()
+
+    # --- TELEMETRY ---
+    def poll_status(self):
+        now = time.perf_counter()
+        # A late tick means the transport thread waited (GIL, a busy callback)
+        if self.last_status_time:
+            self.stats.observe("poll_interval_time", now - self.last_status_time)
+        self.last_status_time = now
+        with self.lock:
+            if self.inflight_bytes + self.status_inflight < self.window:
+                self.link.write(b"?")
+                self.status_inflight += 1
+                self.status_sent.append(now)
+            else:
+                self.stats.count("polls_skipped")
+
+    def handle_line(self, line):
+        """Runs on the transport thread for every line the firmware sends."""
+        try:
+            if line.startswith("<"):
+                self.handle_status(line)
+            elif "ok" in line:
+                self.acknowledge()
+                self.pump()
+        except Exception as e:
+            self.stats.count("line_errors")
+            self.log(f"{self.port}: {type(e).__name__}: {e} in {line!r}")
+
+    def handle_status(self, line):
+        now = time.perf_counter()
+        rtt = None
+        with self.lock:
+            self.status_inflight = max(0, self.status_inflight - 1)
+            if self.status_sent:
+                rtt = now - self.status_sent.popleft()
+                self.stats.observe("status_rtt_time", rtt)
+        content = line.strip("<>").split("|")
+        self.state = content[0]
+        self.scheduler.report(self.state, rtt)
+        for item in content[1:]:
+            if item.startswith("MPos:"):
+                x, y = item[5:].split(",")[:2]
+                self.x, self.y = float(x), float(y)
+                if self.checkpoint and self.uploading:
+                    self.checkpoint.report(self.x, self.y)
+                # The report left the firmware about half a round trip ago
+                if not self.head.report(
+                    self.x, self.y, self.state, now - (rtt or 0.0) / 2
+                ):
+                    self.stats.count("prediction_misses")
+        self.stats.observe("status_parse_time", time.perf_counter() - now)
+
+        with self.lock:
+            quiet = now - max(self.last_ack_time, self.last_send_time)
+            if (
+                self.state == "Idle"
+                and self.inflight
+                and not self.paused
+                and quiet > WATCHDOG_THRESHOLD
+            ):
+                # Idle with nothing answered for a while: an ok was lost
+                self.log(f"[WARN] {self.port}: watchdog, recovering")
+                self.stats.count("watchdog_recoveries")
+                lost = [index for _, index in self.inflight if index is not None]
+                self.reset_inflight()
+                if lost:
+                    self.acked = max(self.acked, lost[-1] + 1)
+                if not self.uploading and self.acked >= self.current:
+                    self.finish()
+        self.pump()